@@ -1,12 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import {
-  getShips,
-  getShipTypeTrends,
-  getFishingSeasonality,
-  getCommercialRatio,
-  getMonthlyShipTotal,
-  getArrivalInsights
-} from '../services/aisApi';
+import { getDashboardBatch } from '../services/aisApi';
 import { Chart as ChartJS, ArcElement, Tooltip, Legend, CategoryScale, LinearScale, BarElement } from 'chart.js';
 import { Pie, Doughnut, Bar } from 'react-chartjs-2';
 
@@ -39,21 +32,22 @@ const ApiDashboard = () => {
     try {
       setStats((prev) => ({ ...prev, loading: true, error: null }));
 
-      const [ships, trends, fishing, ratio, monthlyTotal, arrivals] = await Promise.allSettled([
-        getShips({ limit: 100 }),
-        getShipTypeTrends(),
-        getFishingSeasonality(),
-        getCommercialRatio(),
-        getMonthlyShipTotal(),
-        getArrivalInsights(8)
+      const results = await getDashboardBatch([
+        { id: 'ships', name: 'ships', params: { limit: 100 } },
+        'ship_type_trends',
+        'fishing_seasonality',
+        'commercial_ratio',
+        'monthly_ship_total',
+        { id: 'arrivals_insights', name: 'arrivals_insights', params: { limit: 8 } }
       ]);
+      const value = (id, fallback) => (results[id]?.status === 200 ? results[id].body || fallback : fallback);
 
-      const shipsData = ships.status === 'fulfilled' ? ships.value : [];
-      const shipTypesData = trends.status === 'fulfilled' ? trends.value || [] : [];
-      const fishingData = fishing.status === 'fulfilled' ? fishing.value || [] : [];
-      const ratioData = ratio.status === 'fulfilled' ? ratio.value || [] : [];
-      const monthlyTotalData = monthlyTotal.status === 'fulfilled' ? monthlyTotal.value || {} : {};
-      const arrivalsData = arrivals.status === 'fulfilled' ? arrivals.value || [] : [];
+      const shipsData = value('ships', []);
+      const shipTypesData = value('ship_type_trends', []);
+      const fishingData = value('fishing_seasonality', []);
+      const ratioData = value('commercial_ratio', []);
+      const monthlyTotalData = value('monthly_ship_total', {});
+      const arrivalsData = value('arrivals_insights', []);
 
       const commercialTypes = ['Cargo', 'Tanker', 'Passenger'];
       const commercialShips = {};
@@ -1,13 +1,15 @@
 import { useEffect, useRef, useState, useCallback } from "react";
 import "leaflet/dist/leaflet.css";
 import L from "leaflet";
-import { getShips, getApiHealth } from "../services/aisApi";
+import { getShips, getApiHealth, getDensityGrid } from "../services/aisApi";
 import '../styles/components/Map.css';
 
 export default function Map({ sidebarOpen, setSidebarOpen, setRefreshData, isRefreshing, routeData, shipDetails }) {
   const mapRef = useRef(null);
   const markersRef = useRef(null);
   const gridLayerRef = useRef(null);
+  const densityLayerRef = useRef(null);
+  const densityRequestRef = useRef(0);
   const mountedRef = useRef(true);
   const routeAnimationRef = useRef(null);
 
@@ -17,6 +19,7 @@ export default function Map({ sidebarOpen, setSidebarOpen, setRefreshData, isRef
   const [apiHealth, setApiHealth] = useState(null);
   const [gridStep, setGridStep] = useState(5); // Default 5° grid
   const [showGrid, setShowGrid] = useState(false); // Grid on/off toggle (default OFF)
+  const [showDensity, setShowDensity] = useState(false); // Traffic density layer (default OFF)
 
   // Helper functions for grid
   const isNearMultiple = (value, step) => Math.abs(value - Math.round(value / step) * step) < 1e-6;
@@ -293,6 +296,7 @@ export default function Map({ sidebarOpen, setSidebarOpen, setRefreshData, isRef
         mapRef.current = null;
         markersRef.current = null;
         gridLayerRef.current = null;
+        densityLayerRef.current = null;
       }
     };
   }, [fetchShipData, checkApiHealth, routeData]);
@@ -309,6 +313,72 @@ export default function Map({ sidebarOpen, setSidebarOpen, setRefreshData, isRef
     };
   }, [fetchShipData, setRefreshData]);
 
+  // Density cell size for the current zoom level, in degrees
+  const densityResolution = (zoom) =>
+    zoom <= 3 ? 2 : zoom <= 5 ? 1 : zoom <= 7 ? 0.25 : zoom <= 9 ? 0.1 : 0.05;
+
+  const drawDensity = (grid) => {
+    const layer = densityLayerRef.current;
+    if (!layer) return;
+    layer.clearLayers();
+    const step = grid.resolution;
+    const maxLog = Math.log1p(grid.max_count || 1);
+    grid.cells.forEach(([south, west, count]) => {
+      const intensity = Math.log1p(count) / maxLog;
+      L.rectangle([[south, west], [south + step, west + step]], {
+        stroke: false,
+        fillColor: intensity > 0.66 ? '#ff5252' : intensity > 0.33 ? '#ffb300' : '#00bcd4',
+        fillOpacity: 0.15 + 0.5 * intensity,
+        interactive: false
+      }).addTo(layer);
+    });
+  };
+
+  // Progressive refinement: when nothing is drawn yet, show the whole-world
+  // coarse grid first (cheap, shared by every view), then the grid for the
+  // visible area at this zoom.
+  const loadDensity = useCallback(async () => {
+    const map = mapRef.current;
+    if (!map) return;
+    if (!densityLayerRef.current) {
+      densityLayerRef.current = L.layerGroup().addTo(map);
+    }
+    const request = ++densityRequestRef.current;
+    if (!showDensity) {
+      densityLayerRef.current.clearLayers();
+      return;
+    }
+    const target = densityResolution(map.getZoom());
+    const bounds = map.getBounds();
+    const bbox = [
+      Math.max(bounds.getWest(), -180), Math.max(bounds.getSouth(), -90),
+      Math.min(bounds.getEast(), 180), Math.min(bounds.getNorth(), 90)
+    ].map((v) => v.toFixed(2)).join(',');
+    try {
+      const levels = [{ resolution: target, bbox }];
+      if (densityLayerRef.current.getLayers().length === 0) {
+        levels.unshift({ resolution: 5 });
+      }
+      for (const params of levels) {
+        const grid = await getDensityGrid(params);
+        if (!mountedRef.current || request !== densityRequestRef.current) return;
+        drawDensity(grid);
+      }
+    } catch (error) {
+      console.error("❌ Failed to load density grid:", error);
+    }
+  }, [showDensity]);
+
+  useEffect(() => {
+    const map = mapRef.current;
+    if (!map) return;
+    loadDensity();
+    map.on('moveend', loadDensity);
+    return () => {
+      map.off('moveend', loadDensity);
+    };
+  }, [loadDensity]);
+
   // Update grid when gridStep or showGrid changes
   useEffect(() => {
     buildGlobalGrid();
@@ -617,6 +687,12 @@ export default function Map({ sidebarOpen, setSidebarOpen, setRefreshData, isRef
                         </select>
                       </div>
                     )}
+                    <button
+                      onClick={() => setShowDensity(!showDensity)}
+                      className={`toggle-button-modern ${showDensity ? 'toggle-on' : 'toggle-off'}`}
+                    >
+                      <span className="toggle-text">Density {showDensity ? 'ON' : 'OFF'}</span>
+                    </button>
                   </div>
                 </div>
 
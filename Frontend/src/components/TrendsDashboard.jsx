@@ -1,13 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import {
-  getShipsPerDay,
-  getAvgSpeedPerDay,
-  getShipsPerHour,
-  getAvgSpeedPerHour,
-  getShipTypeTrends,
-  getCommercialRatio,
-  getMonthlyShipTotal,
-  getArrivals,
+  getDashboardBatch,
   getShipTypesAtDestination
 } from '../services/aisApi';
 import {
@@ -60,44 +53,30 @@ export default function TrendsDashboard() {
     const fetchTrends = async () => {
       try {
         setLoading(true);
-        const results = await Promise.allSettled([
-          getShipsPerDay(),
-          getAvgSpeedPerDay(),
-          getShipsPerHour(),
-          getAvgSpeedPerHour(),
-          getShipTypeTrends(),
-          getCommercialRatio(),
-          getMonthlyShipTotal(),
-          getArrivals(),
-        ]);
+        // One streamed request; each chart fills in as its widget arrives.
+        const handlers = {
+          ships_per_day: (data) => setShipsPerDay(data || []),
+          avg_speed_per_day: (data) => setAvgSpeedPerDay(data || []),
+          ships_per_hour: (data) => setShipsPerHour(data || []),
+          avg_speed_per_hour: (data) => setAvgSpeedPerHour(data || []),
+          ship_type_trends: (data) => setShipTypeTrends(data || []),
+          commercial_ratio: (data) => setCommercialRatio(data || []),
+          monthly_ship_total: (data) => setMonthlyShipTotal(data || null),
+          arrivals: (data) => {
+            setArrivals(data || []);
+            const uniqueDestinations = [...new Set((data || []).map((item) => item.destination))]
+              .filter(Boolean)
+              .map((destination) => ({ destination }));
+            setDestinations(uniqueDestinations);
+          },
+        };
 
-        const [
-          shipsPerDayRes,
-          avgSpeedPerDayRes,
-          shipsPerHourRes,
-          avgSpeedPerHourRes,
-          shipTypeTrendsRes,
-          commercialRatioRes,
-          monthlyShipTotalRes,
-          arrivalsRes,
-        ] = results;
+        const results = await getDashboardBatch(Object.keys(handlers), ({ id, status, body }) => {
+          if (status === 200) handlers[id](body);
+        });
 
-        if (shipsPerDayRes.status === 'fulfilled') setShipsPerDay(shipsPerDayRes.value || []);
-        if (avgSpeedPerDayRes.status === 'fulfilled') setAvgSpeedPerDay(avgSpeedPerDayRes.value || []);
-        if (shipsPerHourRes.status === 'fulfilled') setShipsPerHour(shipsPerHourRes.value || []);
-        if (avgSpeedPerHourRes.status === 'fulfilled') setAvgSpeedPerHour(avgSpeedPerHourRes.value || []);
-        if (shipTypeTrendsRes.status === 'fulfilled') setShipTypeTrends(shipTypeTrendsRes.value || []);
-        if (commercialRatioRes.status === 'fulfilled') setCommercialRatio(commercialRatioRes.value || []);
-        if (monthlyShipTotalRes.status === 'fulfilled') setMonthlyShipTotal(monthlyShipTotalRes.value || null);
-        if (arrivalsRes.status === 'fulfilled') {
-          setArrivals(arrivalsRes.value || []);
-          const uniqueDestinations = [...new Set((arrivalsRes.value || []).map((item) => item.destination))]
-            .filter(Boolean)
-            .map((destination) => ({ destination }));
-          setDestinations(uniqueDestinations);
-        }
-
-        if (results.some((res) => res.status === 'rejected')) {
+        const failed = Object.keys(handlers).some((id) => results[id]?.status !== 200);
+        if (failed) {
           setError('Some trend data failed to load. Check backend/API availability.');
         } else {
           setError(null);
@@ -89,9 +89,10 @@ export const getForecastOverview = async (date) => {
   }
 };
 
-export const getTimeWindowIntensity = async (date) => {
+// options: { start, end, destination, ship_type, format: 'heatmap' }
+export const getTimeWindowIntensity = async (date, options = {}) => {
   try {
-    const response = await aisApi.get('/traffic/time_window_intensity', { params: { date } });
+    const response = await aisApi.get('/traffic/time_window_intensity', { params: { date, ...options } });
     return response.data;
   } catch (error) {
     throw new Error(error.response?.data?.error || 'Failed to fetch time window intensity');
@@ -131,6 +132,20 @@ export const getShips = async (params = {}) => {
   }
 };
 
+/**
+ * Get AIS position counts binned into a lat/lon grid (traffic density layer)
+ * @param {Object} params - { resolution, start, end, bbox: "min_lon,min_lat,max_lon,max_lat" }
+ * @returns {Promise<Object>} { resolution, cells: [[south, west, count]], max_count, refine }
+ */
+export const getDensityGrid = async (params = {}) => {
+  try {
+    const response = await aisApi.get('/ships/density', { params });
+    return response.data;
+  } catch (error) {
+    throw new Error(error.response?.data?.error || 'Failed to fetch density grid');
+  }
+};
+
 /**
  * Get details for a single ship by MMSI or Ship Name.
  * @param {Object} params - Query parameters
@@ -248,6 +263,20 @@ export const getArrivals = async () => {
   }
 };
 
+/**
+ * Get port calls per arrival day and port
+ * @param {Object} options - { port, start, end } (dates as YYYY-MM-DD)
+ * @returns {Promise<Array>} Array of { day, port, arrivals }
+ */
+export const getPortArrivals = async (options = {}) => {
+  try {
+    const response = await aisApi.get('/trends/port-arrivals', { params: options });
+    return response.data;
+  } catch (error) {
+    throw new Error(error.response?.data?.error || 'Failed to fetch port arrivals');
+  }
+};
+
 export const getArrivalInsights = async (limit = 8) => {
   try {
     const response = await aisApi.get('/trends/arrivals-insights', { params: { limit } });
@@ -337,6 +366,50 @@ export const getMonthlyShipTotal = async () => {
 
 
 
+// ===== DASHBOARD BATCH ENDPOINT =====
+
+/**
+ * Run several dashboard widget queries in one request. The backend streams
+ * one NDJSON line per widget as it completes; onResult is called for each.
+ * @param {Array<string|Object>} widgets - Widget names, or { id, name, params }
+ * @param {Function} onResult - Called with { id, widget, status, body }
+ * @returns {Promise<Object>} Results by widget id, once all have arrived
+ */
+export const getDashboardBatch = async (widgets, onResult = () => {}) => {
+  // fetch rather than axios: axios can't hand over a streamed body in the browser.
+  const response = await fetch(`${API_BASE_URL}/dashboard/batch`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'Accept': 'application/x-ndjson' },
+    body: JSON.stringify({ widgets }),
+  });
+  if (!response.ok) {
+    const data = await response.json().catch(() => ({}));
+    throw new Error(data.error || `Failed to fetch dashboard batch: ${response.status}`);
+  }
+
+  const results = {};
+  const handleLine = (line) => {
+    if (!line.trim()) return;
+    const result = JSON.parse(line);
+    results[result.id] = result;
+    onResult(result);
+  };
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+    lines.forEach(handleLine);
+  }
+  handleLine(buffer + decoder.decode());
+  return results;
+};
+
 // ===== UTILITY FUNCTIONS =====
 
 /**
@@ -1,8 +1,15 @@
+import os
+
 from config import create_app
 
-# Create and configure the Flask app, ensuring DB and tables exist
+# Create and configure the Flask app. DB/table checks and the initial data
+# load run in the background; see utils/startup.py and /api/health/ready.
 app = create_app()
 
 if __name__ == "__main__":
     print("Starting backend server. Database and tables will be checked/created if missing.")
-    app.run(debug=True, host="0.0.0.0")
+    # The debug reloader's parent process never serves requests.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        from utils.startup import start_background_init
+        start_background_init(app)
+    app.run(debug=True, host="0.0.0.0", port=int(os.getenv("PORT", 5000)))
@@ -0,0 +1,84 @@
+"""
+Cold-start measurement: time from process launch to first byte and to ready.
+
+Run from the backend directory:
+
+    python -m bench.cold_start --server gunicorn --runs 3
+
+Launches the server, polls /api/health/live until the first response and
+/api/health/ready until it returns 200, then prints both timings alongside
+the server's own startup report.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from bench.serving_loadtest import BACKEND_DIR, server_commands
+
+
+def poll(url, want_status, deadline):
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as resp:
+                if resp.status == want_status:
+                    return json.loads(resp.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            if e.code == want_status:
+                return json.loads(e.read() or b"{}")
+        except OSError:
+            pass
+        time.sleep(0.05)
+    return None
+
+
+def measure(server, port, timeout):
+    proc = subprocess.Popen(server_commands(port)[server], cwd=BACKEND_DIR,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    launched = time.time()
+    deadline = launched + timeout
+    base = f"http://127.0.0.1:{port}/api/health"
+    try:
+        live = poll(f"{base}/live", 200, deadline)
+        first_byte = time.time() - launched if live is not None else None
+        report = poll(f"{base}/ready", 200, deadline)
+        ready = time.time() - launched if report is not None else None
+        return first_byte, ready, report
+    finally:
+        proc.terminate()
+        proc.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=["flask-dev", "gunicorn"], default="gunicorn")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=5056)
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    first_bytes, readies = [], []
+    for i in range(args.runs):
+        first_byte, ready, report = measure(args.server, args.port, args.timeout)
+        print(f"run {i + 1}: first byte {first_byte}s, ready {ready}s")
+        if report:
+            print("  server report:", json.dumps(report["seconds_since_process_start"]))
+        if first_byte is not None:
+            first_bytes.append(first_byte)
+        if ready is not None:
+            readies.append(ready)
+
+    if first_bytes:
+        print(f"\n{args.server}: median time to first byte {statistics.median(first_bytes):.3f}s")
+    if readies:
+        print(f"{args.server}: median time to ready {statistics.median(readies):.3f}s")
+    if not first_bytes:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Memory of the in-memory AIS frame with default pandas dtypes vs AIS_SCHEMA.
+
+Run from the backend directory:
+
+    python -m bench.dataset_memory --csv /tmp/ais_1m.csv
+
+Each variant is loaded in a fresh interpreter so the RSS numbers are not
+polluted by the other one. Reports the frame's deep memory usage, the RSS
+growth caused by the load (after handing freed heap back to the OS, as the
+app does) and the load time. Deep memory overstates the default variant
+somewhat, since the CSV parser shares repeated strings; RSS is what counts.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+from bench.serving_loadtest import BACKEND_DIR
+
+_PROBE = r"""
+import json, sys, time
+from utils.startup import current_rss_bytes, trim_heap
+from utils.dataset import frame_memory_bytes, read_ais_csv
+import pandas as pd
+
+trim_heap()
+rss_before = current_rss_bytes()
+start = time.perf_counter()
+frame = pd.read_csv(sys.argv[2]) if sys.argv[1] == "default" else read_ais_csv(sys.argv[2])
+elapsed = time.perf_counter() - start
+trim_heap()
+print(json.dumps({
+    "rows": len(frame),
+    "frame_bytes": frame_memory_bytes(frame),
+    "rss_growth_bytes": current_rss_bytes() - rss_before,
+    "load_s": round(elapsed, 3),
+}))
+"""
+
+
+def measure(variant, csv_path):
+    out = subprocess.run([sys.executable, "-c", _PROBE, variant, csv_path],
+                         cwd=BACKEND_DIR, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", required=True)
+    args = parser.parse_args()
+
+    results = {variant: measure(variant, args.csv) for variant in ("default", "schema")}
+    print(f"{'dtypes':<10}{'rows':>10}{'frame MiB':>12}{'RSS +MiB':>12}{'load s':>10}")
+    for variant, r in results.items():
+        print(f"{variant:<10}{r['rows']:>10}{r['frame_bytes'] / 2**20:>12.1f}"
+              f"{r['rss_growth_bytes'] / 2**20:>12.1f}{r['load_s']:>10.2f}")
+    before, after = results["default"], results["schema"]
+    print(f"\nframe {before['frame_bytes'] / max(after['frame_bytes'], 1):.1f}x smaller, "
+          f"RSS growth {before['rss_growth_bytes'] / max(after['rss_growth_bytes'], 1):.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
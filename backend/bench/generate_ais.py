@@ -0,0 +1,211 @@
+"""
+Deterministic synthetic AIS data generator.
+
+Run from the backend directory:
+
+    python -m bench.generate_ais --rows 1000000 --vessels 5000 --out /tmp/ais_1m.csv
+
+Writes a CSV with the same columns as the ais_data table (models.AISData,
+without id), in time order. Vessels sail between a set of ports whose
+popularity follows a Zipf distribution, so a few busy ports attract most of
+the traffic and dwell periods cluster around them. The same --seed and
+arguments always produce byte-identical output. Rows are produced in chunks,
+so 50M-row files need no more memory than a 10k-row one.
+"""
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = [
+    "mmsi", "nav_status", "rot", "sog", "latitude", "longitude", "cog", "true_heading",
+    "imo", "ship_name", "call_sign", "ship_type", "draught", "destination", "dimbow",
+    "dimstern", "dimport", "dimstarboard", "eta", "beam", "length", "rec_time",
+    "source", "country", "flag_name",
+]
+
+# (name, latitude, longitude, country)
+PORTS = [
+    ("SINGAPORE", 1.26, 103.84, "Singapore"),
+    ("SHANGHAI", 31.23, 121.49, "China"),
+    ("ROTTERDAM", 51.95, 4.14, "Netherlands"),
+    ("BUSAN", 35.10, 129.04, "South Korea"),
+    ("JEBEL ALI", 25.01, 55.06, "United Arab Emirates"),
+    ("HAMBURG", 53.54, 9.97, "Germany"),
+    ("LOS ANGELES", 33.73, -118.26, "United States"),
+    ("ANTWERP", 51.26, 4.39, "Belgium"),
+    ("MUMBAI", 18.95, 72.84, "India"),
+    ("COLOMBO", 6.95, 79.84, "Sri Lanka"),
+    ("PIRAEUS", 37.94, 23.63, "Greece"),
+    ("SANTOS", -23.96, -46.30, "Brazil"),
+    ("DURBAN", -29.87, 31.03, "South Africa"),
+    ("KLANG", 3.00, 101.39, "Malaysia"),
+    ("TANJUNG PELEPAS", 1.36, 103.55, "Malaysia"),
+    ("CHENNAI", 13.10, 80.30, "India"),
+]
+
+SHIP_TYPES = ["Cargo", "Tanker", "Passenger", "Fishing", "Tug", "Pleasure Craft", "High Speed Craft", "Other"]
+SHIP_TYPE_WEIGHTS = [0.38, 0.22, 0.06, 0.14, 0.06, 0.06, 0.03, 0.05]
+FLAGS = ["Panama", "Liberia", "Marshall Islands", "Singapore", "Malta", "India", "Greece", "China"]
+NAME_WORDS = ["OCEAN", "STAR", "PACIFIC", "GLORY", "SPIRIT", "EXPRESS", "QUEEN", "HARMONY",
+              "TRADER", "PIONEER", "NEPTUNE", "AURORA", "HORIZON", "FALCON", "LOTUS", "MERIDIAN"]
+
+DWELL_FRACTION = 0.15  # share of each voyage spent alongside at either end
+CHUNK_ROWS = 500_000   # rows per write; each chunk has its own seeded RNG
+
+
+def build_fleet(rng, n_vessels, n_ports, max_voyages):
+    """Static per-vessel attributes and each vessel's port itinerary."""
+    popularity = 1.0 / np.arange(1, n_ports + 1) ** 1.1
+    popularity /= popularity.sum()
+    itinerary = rng.choice(n_ports, size=(n_vessels, max_voyages + 1), p=popularity)
+    # Never sail from a port to itself.
+    same = itinerary[:, 1:] == itinerary[:, :-1]
+    itinerary[:, 1:][same] = (itinerary[:, 1:][same] + 1) % n_ports
+
+    words = np.array(NAME_WORDS)
+    names = np.char.add(np.char.add(words[rng.integers(0, len(words), n_vessels)], " "),
+                        words[rng.integers(0, len(words), n_vessels)])
+    names = np.char.add(np.char.add(names, " "), (np.arange(n_vessels) % 97 + 1).astype(str))
+
+    length = rng.uniform(20, 380, n_vessels).round(1)
+    beam = (length * rng.uniform(0.12, 0.18, n_vessels)).round(1)
+    dimbow = (length * rng.uniform(0.4, 0.6, n_vessels)).astype(int)
+    dimport = (beam * rng.uniform(0.4, 0.6, n_vessels)).astype(int)
+
+    return {
+        "mmsi": 200_000_000 + np.arange(n_vessels, dtype=np.int64) * 7 + 1,
+        "imo": 9_000_000 + np.arange(n_vessels, dtype=np.int64),
+        "ship_name": names,
+        "call_sign": np.char.add("C", (100_000 + np.arange(n_vessels)).astype(str)),
+        "ship_type": np.array(SHIP_TYPES)[rng.choice(len(SHIP_TYPES), n_vessels, p=SHIP_TYPE_WEIGHTS)],
+        "flag_name": np.array(FLAGS)[rng.integers(0, len(FLAGS), n_vessels)],
+        "length": length,
+        "beam": beam,
+        "dimbow": dimbow,
+        "dimstern": (length - dimbow).astype(int),
+        "dimport": dimport,
+        "dimstarboard": (beam - dimport).astype(int),
+        "draught": rng.uniform(2, 16, n_vessels).round(1),
+        "cruise_speed": rng.uniform(8, 22, n_vessels),
+        "voyage_ticks": rng.integers(40, 400, n_vessels),
+        "phase": rng.integers(0, 400, n_vessels),
+        "offset_s": rng.integers(0, 60, n_vessels),
+        "itinerary": itinerary,
+    }
+
+
+def generate_chunk(rng, fleet, ports, row_start, row_stop, start_ts, tick_seconds):
+    n_vessels = len(fleet["mmsi"])
+    rows = np.arange(row_start, row_stop, dtype=np.int64)
+    v = rows % n_vessels
+    tick = rows // n_vessels
+    n = len(rows)
+
+    period = fleet["voyage_ticks"][v]
+    t = tick + fleet["phase"][v]
+    voyage = t // period
+    progress = (t % period) / period
+
+    origin = fleet["itinerary"][v, voyage]
+    dest = fleet["itinerary"][v, voyage + 1]
+    port_lat, port_lon = ports["lat"], ports["lon"]
+
+    # Alongside at the origin, sailing, then alongside at the destination.
+    sail = np.clip((progress - DWELL_FRACTION) / (1 - 2 * DWELL_FRACTION), 0.0, 1.0)
+    dwelling = (progress < DWELL_FRACTION) | (progress > 1 - DWELL_FRACTION)
+    lat = port_lat[origin] + (port_lat[dest] - port_lat[origin]) * sail
+    lon = port_lon[origin] + (port_lon[dest] - port_lon[origin]) * sail
+    jitter = np.where(dwelling, 0.01, 0.05)
+    lat = np.clip(lat + rng.normal(0, 1, n) * jitter, -89.9, 89.9)
+    lon = np.clip(lon + rng.normal(0, 1, n) * jitter, -179.9, 179.9)
+
+    bearing = np.degrees(np.arctan2(port_lon[dest] - port_lon[origin], port_lat[dest] - port_lat[origin])) % 360
+    cog = np.where(dwelling, rng.uniform(0, 360, n), (bearing + rng.normal(0, 3, n)) % 360)
+    sog = np.where(dwelling, rng.uniform(0, 0.4, n), fleet["cruise_speed"][v] + rng.normal(0, 1, n))
+    sog = np.clip(sog, 0, None)
+
+    rec_ts = start_ts + tick * tick_seconds + fleet["offset_s"][v]
+    rec_time = pd.to_datetime(rec_ts, unit="s")
+    eta = pd.to_datetime(start_ts + (tick + (period - t % period)) * tick_seconds, unit="s")
+
+    names = np.array([p[0] for p in PORTS])
+    frame = pd.DataFrame({
+        "mmsi": fleet["mmsi"][v],
+        "nav_status": np.where(dwelling, "Moored", "Under way using engine"),
+        "rot": np.where(dwelling, 0.0, rng.normal(0, 2, n)).round(1),
+        "sog": sog.round(1),
+        "latitude": lat.round(6),
+        "longitude": lon.round(6),
+        "cog": cog.round(1),
+        "true_heading": np.round(cog).astype(int) % 360,
+        "imo": fleet["imo"][v],
+        "ship_name": fleet["ship_name"][v],
+        "call_sign": fleet["call_sign"][v],
+        "ship_type": fleet["ship_type"][v],
+        "draught": fleet["draught"][v],
+        "destination": names[dest],
+        "dimbow": fleet["dimbow"][v],
+        "dimstern": fleet["dimstern"][v],
+        "dimport": fleet["dimport"][v],
+        "dimstarboard": fleet["dimstarboard"][v],
+        "eta": eta.strftime("%m-%d %H:%M"),
+        "beam": fleet["beam"][v],
+        "length": fleet["length"][v],
+        "rec_time": rec_time.strftime("%Y-%m-%d %H:%M:%S"),
+        "source": "synthetic",
+        "country": np.array([p[3] for p in PORTS])[dest],
+        "flag_name": fleet["flag_name"][v],
+    }, columns=COLUMNS)
+    return frame
+
+
+def generate(out_path, rows, vessels, ports, start, days, seed):
+    rng = np.random.default_rng(seed)
+    ports = max(2, min(ports, len(PORTS)))
+    port_table = {
+        "lat": np.array([p[1] for p in PORTS[:ports]]),
+        "lon": np.array([p[2] for p in PORTS[:ports]]),
+    }
+    ticks = math.ceil(rows / vessels)
+    tick_seconds = max(1, int(days * 86400 / max(ticks, 1)))
+    # Enough itinerary entries for the longest possible run of short voyages.
+    max_voyages = (ticks + 400) // 40 + 2
+    fleet = build_fleet(rng, vessels, ports, max_voyages)
+    start_ts = int(pd.Timestamp(start).timestamp())
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    written = 0
+    with open(out_path, "w", newline="") as f:
+        for index, row_start in enumerate(range(0, rows, CHUNK_ROWS)):
+            row_stop = min(rows, row_start + CHUNK_ROWS)
+            chunk_rng = np.random.default_rng([seed, index])
+            chunk = generate_chunk(chunk_rng, fleet, port_table, row_start, row_stop, start_ts, tick_seconds)
+            chunk.to_csv(f, header=(row_start == 0), index=False)
+            written += len(chunk)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000, help="Total rows (10k to 50M)")
+    parser.add_argument("--vessels", type=int, default=500)
+    parser.add_argument("--ports", type=int, default=len(PORTS), help=f"Busy ports (2-{len(PORTS)})")
+    parser.add_argument("--start", default="2025-01-01")
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="synthetic_ais.csv")
+    args = parser.parse_args()
+
+    began = time.perf_counter()
+    written = generate(args.out, args.rows, min(args.vessels, args.rows), args.ports,
+                       args.start, args.days, args.seed)
+    print(f"Wrote {written} rows for {min(args.vessels, args.rows)} vessels to {args.out} "
+          f"in {time.perf_counter() - began:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Response serialisation benchmark for the map endpoint (/api/ships/).
+
+Run from the backend directory:
+
+    python -m bench.serialization --rows 150000
+
+Builds synthetic result rows shaped like the get_ships query and times
+turning them into a JSON response body two ways: the previous per-row
+dict building + jsonify, and the column-wise utils.serialize path with
+orjson. No database is needed.
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from bench.serving_loadtest import BACKEND_DIR
+
+
+def synthetic_rows(n, seed=42):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        moored = rng.random() < 0.2
+        rows.append((
+            200_000_000 + i,
+            round(rng.uniform(-60, 60), 6),
+            round(rng.uniform(-180, 180), 6),
+            None if rng.random() < 0.02 else f"SHIP {i}",
+            rng.choice(["Cargo", "Tanker", "Fishing", None]),
+            0.0 if moored else round(rng.uniform(5, 20), 1),
+            round(rng.uniform(0, 360), 1),
+            None if rng.random() < 0.1 else rng.randrange(0, 360),
+            rng.choice(["SINGAPORE", "ROTTERDAM", None]),
+            round(rng.uniform(2, 16), 1),
+            round(rng.uniform(20, 380), 1),
+            round(rng.uniform(5, 60), 1),
+            f"2025-01-{1 + i % 28:02d} 12:00:00",
+            "01-30 12:00",
+        ))
+    return rows
+
+
+def legacy(rows):
+    """The per-row conversion used by get_ships before utils.serialize."""
+    from flask import jsonify
+
+    ships = []
+    for row in rows:
+        ships.append({
+            "mmsi": str(row[0]),
+            "name": row[3] or f"Vessel {row[0]}",
+            "lat": float(row[1]) if row[1] else 0.0,
+            "lon": float(row[2]) if row[2] else 0.0,
+            "shipType": row[4] or "Unknown",
+            "sog": float(row[5]) if row[5] else 0.0,
+            "cog": float(row[6]) if row[6] else 0.0,
+            "heading": float(row[7]) if row[7] else float(row[6]) if row[6] else 0.0,
+            "destination": row[8] or "Unknown",
+            "draught": float(row[9]) if row[9] else 0.0,
+            "length": float(row[10]) if row[10] else 0.0,
+            "width": float(row[11]) if row[11] else 0.0,
+            "lastUpdate": str(row[12]) if row[12] else "",
+            "eta": row[13] or ""
+        })
+    return jsonify(ships).get_data()
+
+
+def columnar(rows):
+    from routes.ships import ship_records
+    from utils.serialize import columns_of, json_response
+
+    return json_response(ship_records(columns_of(rows, 14))).get_data()
+
+
+def time_it(fn, rows, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        body = fn(rows)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=150_000)
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from flask import Flask
+
+    rows = synthetic_rows(args.rows)
+    app = Flask(__name__)
+    variants = [("per-row + jsonify", legacy), ("column-wise + orjson", columnar)]
+    with app.app_context():
+        results = [(name, *time_it(fn, rows, args.iterations)) for name, fn in variants]
+
+    print(f"{args.rows} rows, median of {args.iterations}\n")
+    print(f"{'variant':<24}{'ms':>10}{'bytes':>12}{'speedup':>10}")
+    base = results[0][1]
+    for name, seconds, size in results:
+        print(f"{name:<24}{seconds * 1000:>10.1f}{size:>12}{base / seconds:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
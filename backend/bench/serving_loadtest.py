@@ -0,0 +1,123 @@
+"""
+Throughput comparison between the Flask dev server and gunicorn.
+
+Run from the backend directory (needs a reachable DATABASE_URL):
+
+    python -m bench.serving_loadtest --requests 2000 --concurrency 32
+
+Each server is started in turn on its own port, warmed up, then hit with the
+same mix of GET endpoints. Results are printed as a small table.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+DEFAULT_PATHS = [
+    "/api/ships/?limit=500",
+    "/api/ships/suggest?q=a",
+    "/api/trends/ships-per-day",
+    "/api/ship-types/trends",
+    "/api/traffic/forecast_overview?date=2025-01-31",
+]
+
+
+def server_commands(port):
+    return {
+        "flask-dev": [sys.executable, "-m", "flask", "--app", "app", "run",
+                      "--host", "127.0.0.1", "--port", str(port)],
+        "gunicorn": [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+                     "--bind", f"127.0.0.1:{port}", "app:app"],
+    }
+
+
+def wait_for_port(port, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return True
+        time.sleep(0.2)
+    return False
+
+
+def fetch(url):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=120) as resp:
+            resp.read()
+            ok = resp.status < 500
+    except urllib.error.HTTPError as e:
+        ok = e.code < 500
+    except OSError:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def run_load(base_url, paths, total, concurrency):
+    urls = [base_url + paths[i % len(paths)] for i in range(total)]
+    # Warm-up: one pass over every path so caches and lazy loads are excluded.
+    for path in paths:
+        fetch(base_url + path)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fetch, urls))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(r[0] for r in results)
+    errors = sum(1 for r in results if not r[1])
+    return {
+        "requests": total,
+        "seconds": elapsed,
+        "rps": total / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--path", action="append", dest="paths", help="Endpoint path (repeatable)")
+    parser.add_argument("--servers", default="flask-dev,gunicorn")
+    args = parser.parse_args()
+
+    paths = args.paths or DEFAULT_PATHS
+    commands = server_commands(args.port)
+    results = {}
+
+    for name in args.servers.split(","):
+        print(f"Starting {name} on port {args.port}...")
+        proc = subprocess.Popen(commands[name], cwd=BACKEND_DIR,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_for_port(args.port, args.startup_timeout):
+                print(f"{name} did not open port {args.port} in time, skipping.")
+                continue
+            results[name] = run_load(f"http://127.0.0.1:{args.port}", paths, args.requests, args.concurrency)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=60)
+
+    print(f"\n{'server':<12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    for name, r in results.items():
+        print(f"{name:<12}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['errors']:>8}")
+    if {"flask-dev", "gunicorn"} <= results.keys() and results["flask-dev"]["rps"]:
+        print(f"\ngunicorn speed-up: {results['gunicorn']['rps'] / results['flask-dev']['rps']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Per-blueprint import cost, checked against a stored baseline.
+
+Run from the backend directory:
+
+    python -m bench.startup_profile                    # compare with baseline
+    python -m bench.startup_profile --update-baseline  # record a new baseline
+
+Every blueprint module from config.BLUEPRINTS is imported in a fresh
+interpreter (after config/models, which every worker needs anyway) so the
+numbers are independent of import order. The run fails when a blueprint's
+import time or RSS growth exceeds the baseline by more than the tolerance,
+or when it newly pulls in one of the HEAVY_MODULES at import time.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from bench.serving_loadtest import BACKEND_DIR
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "startup_baseline.json")
+
+HEAVY_MODULES = ["pandas", "numpy", "statsmodels", "scipy", "pyarrow"]
+
+PROBE = """
+import json, sys, time
+import config, models
+from utils.startup import current_rss_bytes
+heavy = {heavy!r}
+before = current_rss_bytes()
+start = time.perf_counter()
+__import__({module!r})
+print(json.dumps({{
+    "seconds": time.perf_counter() - start,
+    "rss_delta_mb": (current_rss_bytes() - before) / 1048576,
+    "heavy_imports": sorted(m for m in heavy if m in sys.modules),
+}}))
+"""
+
+
+def probe(module, repeats):
+    runs = []
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    # Best-of-N filters out scheduler and disk-cache noise.
+    return {
+        "seconds": round(min(r["seconds"] for r in runs), 4),
+        "rss_delta_mb": round(min(r["rss_delta_mb"] for r in runs), 2),
+        "heavy_imports": runs[0]["heavy_imports"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="Allowed relative growth over baseline (0.5 = +50%%)")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="Ignore time regressions below this absolute delta")
+    parser.add_argument("--min-mb", type=float, default=5.0,
+                        help="Ignore RSS regressions below this absolute delta")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from config import BLUEPRINTS
+
+    results = {module: probe(module, args.repeats) for module, _, _ in BLUEPRINTS}
+
+    print(f"{'blueprint':<24}{'import s':>10}{'RSS +MB':>10}  heavy modules")
+    for module, r in results.items():
+        print(f"{module:<24}{r['seconds']:>10.4f}{r['rss_delta_mb']:>10.2f}  {', '.join(r['heavy_imports']) or '-'}")
+
+    if args.update_baseline or not os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {BASELINE_PATH}")
+        return
+
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+
+    failures = []
+    for module, r in results.items():
+        base = baseline.get(module)
+        if not base:
+            continue
+        if r["seconds"] - base["seconds"] > max(args.min_seconds, base["seconds"] * args.tolerance):
+            failures.append(f"{module}: import time {base['seconds']}s -> {r['seconds']}s")
+        if r["rss_delta_mb"] - base["rss_delta_mb"] > max(args.min_mb, base["rss_delta_mb"] * args.tolerance):
+            failures.append(f"{module}: RSS +{base['rss_delta_mb']}MB -> +{r['rss_delta_mb']}MB")
+        new_heavy = set(r["heavy_imports"]) - set(base["heavy_imports"])
+        if new_heavy:
+            failures.append(f"{module}: now imports {', '.join(sorted(new_heavy))} at import time")
+
+    if failures:
+        print("\nStartup regressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nNo startup regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
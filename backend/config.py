@@ -1,7 +1,8 @@
+import importlib
 import os
 from dotenv import load_dotenv
 from flask_sqlalchemy import SQLAlchemy
-from flask import Flask
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 
 # Load .env file
@@ -22,6 +23,11 @@ def normalize_database_url(url):
 DATABASE_URL = normalize_database_url(os.getenv("DATABASE_URL"))
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 
+# Admin/diagnostic endpoints accept either X-Admin-Token: <ADMIN_TOKEN> or a
+# Bearer token of a user listed in ADMIN_USERS. With neither set they are off.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+ADMIN_USERS = {u.strip() for u in os.getenv("ADMIN_USERS", "").split(",") if u.strip()}
+
 
 def get_allowed_origins():
     """
@@ -40,8 +46,85 @@ def get_allowed_origins():
 
 db = SQLAlchemy()
 
+# (module, blueprint attribute, url prefix)
+BLUEPRINTS = [
+    ("routes.trends", "trends_bp", "/api/trends"),
+    ("routes.ships", "ships_bp", "/api/ships"),
+    ("routes.ship_types", "ship_types_bp", "/api/ship-types"),
+    ("routes.auth", "auth_bp", "/api/auth"),
+    ("routes.routes", "routes_bp", "/api/routes"),
+    ("routes.traffic", "traffic_bp", "/api/traffic"),
+    ("routes.riskforecast", "riskforecast_bp", "/api/riskforecast"),
+    ("routes.dashboard", "dashboard_bp", "/api/dashboard"),
+    ("routes.health", "health_bp", "/api/health"),
+    ("routes.metrics", "metrics_bp", "/metrics"),
+    ("routes.admin", "admin_bp", "/api/admin"),
+]
+
+# Blueprints served even while the background initialiser is still running.
+ALWAYS_AVAILABLE_BLUEPRINTS = {"health", "metrics"}
+
+# Admission control (utils/admission.py): per-worker concurrency pools. Each
+# pool admits `limit` requests at a time, lets up to `queue` more wait at most
+# `wait` seconds for a slot and answers the rest with 503 + Retry-After.
+# Endpoints not listed are not limited. The heavy and cheap pools default to
+# one slot less than the worker's threads, and a forecast also holds a heavy
+# slot, so each kind of request leaves a thread for the others whenever there
+# are two or more. A waiting request holds a thread too, so a queue longer
+# than the threads left over never fills. Same thread default as
+# gunicorn.conf.py, which exports the value it uses.
+def _worker_threads():
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return int(os.getenv("GUNICORN_THREADS", max(2, min(cpus, 8))))
+
+
+WORKER_THREADS = _worker_threads()
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() == "true"
+ADMISSION_POOLS = {
+    "forecast": {
+        "limit": int(os.getenv("ADMISSION_FORECAST_LIMIT", max(1, (WORKER_THREADS - 1) // 2))),
+        "queue": int(os.getenv("ADMISSION_FORECAST_QUEUE", 1)),
+        "wait": 10.0,
+        "retry_after": 10,
+        "parent": "heavy",
+    },
+    "heavy": {
+        "limit": int(os.getenv("ADMISSION_HEAVY_LIMIT", max(1, WORKER_THREADS - 1))),
+        "queue": int(os.getenv("ADMISSION_HEAVY_QUEUE", 2)),
+        "wait": 5.0,
+        "retry_after": 5,
+    },
+    "cheap": {
+        "limit": int(os.getenv("ADMISSION_CHEAP_LIMIT", max(1, WORKER_THREADS - 1))),
+        "queue": int(os.getenv("ADMISSION_CHEAP_QUEUE", 1)),
+        "wait": 1.0,
+        "retry_after": 1,
+    },
+}
+ADMISSION_ENDPOINTS = {
+    # ARIMA fits
+    "traffic.speed_forecast": "forecast",
+    # Full-dataset pandas scans
+    "traffic.traffic_prediction": "heavy",
+    "traffic.forecast_overview": "heavy",
+    "traffic.speed_risk_summary": "heavy",
+    "ships.get_density": "heavy",
+    "riskforecast.risk_by_datetime": "heavy",
+    "riskforecast.risk_by_ship": "heavy",
+    # Latency-sensitive lookups
+    "ships.suggest_ships": "cheap",
+    "ships.get_ship_details": "cheap",
+    "routes.search_ship": "cheap",
+}
+
 def resolve_csv_path():
     """Resolve the dataset path for both local and docker layouts."""
+    # AIS_CSV_PATH points the app at another dataset (e.g. a synthetic benchmark CSV).
+    if os.getenv("AIS_CSV_PATH"):
+        return os.path.abspath(os.getenv("AIS_CSV_PATH"))
     candidates = [
         os.path.abspath(os.path.join(os.path.dirname(__file__), "ships_with_dynamics_heading.csv")),
         os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "ships_with_dynamics_heading.csv")),
@@ -52,6 +135,13 @@ def resolve_csv_path():
     # Return the first candidate for clearer downstream error messaging
     return candidates[0]
 
+def resolve_snapshot_dir(csv_path=None):
+    """Directory of the Parquet snapshot of the CSV (AIS_SNAPSHOT_DIR, else next to the CSV)."""
+    if os.getenv("AIS_SNAPSHOT_DIR"):
+        return os.path.abspath(os.getenv("AIS_SNAPSHOT_DIR"))
+    csv_path = csv_path or resolve_csv_path()
+    return os.path.splitext(csv_path)[0] + "_parquet"
+
 def create_app():
     app = Flask(__name__)
     app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URL
@@ -69,71 +159,49 @@ def create_app():
 
     db.init_app(app)
 
-    # Ensure tables exist on app startup
-    from utils.db_loader import ensure_database_exists
-    from sqlalchemy import inspect, create_engine, text
-    engine = create_engine(DATABASE_URL)
-    with app.app_context():
-        # Optional DB creation is disabled by default for managed services (Render/Supabase).
-        ensure_database_exists()
-        # Import models so SQLAlchemy knows about them
-        import models
-        inspector = inspect(engine)
-        existing_tables = inspector.get_table_names()
-        print("Existing tables:", existing_tables)
-        
-        # Create ais_data table if it doesn't exist
-        if "ais_data" not in existing_tables:
-            print("Creating ais_data table...")
-            db.create_all()
-        else:
-            print("ais_data table already exists.")
-        
-        # Create users table if it doesn't exist
-        if "users" not in existing_tables:
-            print("Creating users table...")
-            with engine.connect() as conn:
-                conn.execute(text("""
-                    CREATE TABLE users (
-                        id SERIAL PRIMARY KEY,
-                        username VARCHAR(50) UNIQUE NOT NULL,
-                        email VARCHAR(100) UNIQUE NOT NULL,
-                        password_hash VARCHAR(255) NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        last_login TIMESTAMP
-                    );
-                """))
-                conn.commit()
-            print("Users table created successfully.")
-        else:
-            print("Users table already exists.")
-
-        # Check if ais_data table is empty and load data if it is
-        from models import AISData
-        if db.session.query(AISData).count() == 0:
-            print("ais_data table is empty. Loading data...")
-            from utils.db_loader import load_csv_to_db
-            csv_path = resolve_csv_path()
-            load_csv_to_db(csv_path, app=app)
-        else:
-            print("ais_data table already contains data. Skipping data loading.")
-
-    # Register blueprints
-
-    from routes.trends import trends_bp
-    from routes.ships import ships_bp
-    from routes.ship_types import ship_types_bp
-    from routes.auth import auth_bp
-    from routes.routes import routes_bp
-    from routes.traffic import traffic_bp
-    from routes.riskforecast import riskforecast_bp
-
-    app.register_blueprint(trends_bp, url_prefix="/api/trends")
-    app.register_blueprint(ships_bp, url_prefix="/api/ships")
-    app.register_blueprint(ship_types_bp, url_prefix="/api/ship-types")
-    app.register_blueprint(auth_bp, url_prefix="/api/auth")
-    app.register_blueprint(routes_bp, url_prefix='/api/routes')
-    app.register_blueprint(traffic_bp, url_prefix='/api/traffic')
-    app.register_blueprint(riskforecast_bp, url_prefix='/api/riskforecast')
+    # Request/SQL metrics and the slow-query log; registered first so every
+    # request is timed.
+    from utils import metrics, slow_queries
+    metrics.init_app(app)
+
+    # Database checks and the initial CSV load run on a background thread so
+    # the port opens immediately; /api/health/ready reports when they finish.
+    from utils.startup import (
+        is_initialising, mark_app_created, mark_first_byte, print_import_profile,
+        profile_import, start_background_init,
+    )
 
+    @app.before_request
+    def ensure_initialised():
+        start_background_init(app)
+        # Hold data requests while tables are being created/loaded. Health
+        # checks always pass, and a failed init degrades to serving anyway.
+        if (is_initialising() and request.blueprint not in ALWAYS_AVAILABLE_BLUEPRINTS
+                and request.method != "OPTIONS"):
+            response = jsonify({"error": "Service is starting up, please retry shortly"})
+            response.status_code = 503
+            response.headers["Retry-After"] = "5"
+            return response
+
+    @app.after_request
+    def record_first_byte(response):
+        mark_first_byte()
+        return response
+
+    # Opt-in per-request cProfile/tracemalloc (REQUEST_PROFILING=true).
+    from utils import profiling
+    profiling.init_app(app)
+
+    # Register blueprints. Each import is measured when STARTUP_PROFILE=true.
+    for module_name, attr, url_prefix in BLUEPRINTS:
+        with profile_import(module_name):
+            module = importlib.import_module(module_name)
+        app.register_blueprint(getattr(module, attr), url_prefix=url_prefix)
+    print_import_profile()
+
+    # Per-endpoint concurrency pools (@admission_controlled); checks the views.
+    from utils import admission
+    admission.init_app(app)
+
+    mark_app_created()
     return app
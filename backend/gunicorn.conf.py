@@ -0,0 +1,114 @@
+"""
+Gunicorn configuration for production serving.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Every setting can be overridden with the matching GUNICORN_* environment
+variable. The app and the read-only AIS dataset are loaded once in the master
+(preload_app) and shared copy-on-write by the forked workers.
+
+Graceful reload: with preload_app the master holds the application code, so
+SIGHUP only restarts workers. For a code deploy without dropped connections
+send SIGUSR2 (start a new master) followed by SIGWINCH and SIGTERM to the old
+master once the new workers are serving.
+"""
+import gc
+import os
+import shutil
+import tempfile
+
+
+def _cpu_count():
+    """CPUs actually available to this process (respects container cpusets)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+cpu_count = _cpu_count()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+
+# The pandas endpoints are CPU bound and hold the GIL, so parallelism comes
+# from processes; threads mainly cover time spent waiting on PostgreSQL.
+workers = _env_int("GUNICORN_WORKERS", cpu_count * 2 + 1)
+worker_class = "gthread"
+threads = _env_int("GUNICORN_THREADS", max(2, min(cpu_count, 8)))
+# config.py sizes the admission pools from the same value.
+os.environ.setdefault("GUNICORN_THREADS", str(threads))
+
+preload_app = True
+
+timeout = _env_int("GUNICORN_TIMEOUT", 120)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+
+# Recycle workers periodically to bound memory growth from pandas temporaries.
+# The jitter keeps all workers from restarting at the same moment.
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", 100)
+
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-")
+errorlog = os.getenv("GUNICORN_ERRORLOG", "-")
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+
+# Workers write metric snapshots here so /metrics reports server-wide totals.
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), "datasuite-metrics"))
+# One slow-query log for all workers, readable from /api/admin/slow-queries.
+os.environ.setdefault("SLOW_QUERY_LOG_FILE", os.path.join(os.environ["METRICS_DIR"], "slow_queries.jsonl"))
+
+preload_dataset = os.getenv("PRELOAD_DATASET", "true").lower() == "true"
+_dataset_preloaded = False
+
+
+def on_starting(server):
+    """Start every server run with empty metric snapshots."""
+    shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
+
+
+def pre_fork(server, worker):
+    """Load the shared dataset in the master once, before the first fork."""
+    global _dataset_preloaded
+    if _dataset_preloaded or not preload_dataset:
+        return
+    _dataset_preloaded = True
+
+    from utils.dataset import preload_ais_frame
+
+    from utils.metrics import write_snapshot
+
+    if preload_ais_frame():
+        # The master's load metrics go into its own snapshot; workers start empty.
+        write_snapshot()
+        # Move everything allocated so far into the permanent generation so the
+        # workers' garbage collector never writes to (and un-shares) those pages.
+        gc.freeze()
+        server.log.info("AIS dataset preloaded in master (pid %s)", os.getpid())
+
+
+def post_fork(server, worker):
+    """Drop pooled DB connections and metrics inherited from the master and start init."""
+    from app import app
+    from config import db
+    from utils.db_loader import engine as loader_engine
+    from utils.metrics import reset_after_fork
+    from utils.startup import start_background_init
+
+    reset_after_fork()
+    with app.app_context():
+        db.engine.dispose(close=False)
+    loader_engine.dispose(close=False)
+    start_background_init(app)
+    server.log.info("Worker spawned (pid %s)", worker.pid)
+
+
+def worker_exit(server, worker):
+    """Write the exiting worker's last metrics; the next scrape retires them."""
+    from utils.metrics import write_snapshot
+
+    write_snapshot()
@@ -26,6 +26,8 @@ class AISData(db.Model):
     beam = db.Column(db.Float)
     length = db.Column(db.Float)
     rec_time = db.Column(db.String(255))
+    # Parsed rec_time; ais_data is range-partitioned on it (utils/partitions.py).
+    rec_ts = db.Column(db.DateTime)
     source = db.Column(db.String(255))
     country = db.Column(db.String(255))
     flag_name = db.Column(db.String(255))
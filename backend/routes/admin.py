@@ -0,0 +1,63 @@
+from flask import Blueprint, Response, jsonify, request, send_file
+from utils.admin import require_admin
+from utils.metrics import merged_counters
+from utils.profiling import list_profiles, load_profile, profile_stats_path, render_profile_text
+from utils.result_cache import RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL, cache_stats, hit_ratios
+from utils.slow_queries import EXPLAIN_SAMPLE, SLOW_QUERY_MS, recent_slow_queries
+
+admin_bp = Blueprint("admin", __name__)
+
+
+# Recent statements over the slow-query threshold, with sampled EXPLAIN plans
+@admin_bp.route("/slow-queries", methods=["GET"])
+@require_admin
+def slow_queries():
+    limit = request.args.get("limit", default=50, type=int)
+    limit = max(1, min(limit, 500))
+    return jsonify({
+        "threshold_ms": SLOW_QUERY_MS,
+        "explain_sample": EXPLAIN_SAMPLE,
+        "queries": recent_slow_queries(limit),
+    })
+
+
+# Stored per-request profiles (see utils/profiling.py)
+@admin_bp.route("/profiles", methods=["GET"])
+@require_admin
+def profiles():
+    limit = max(1, min(request.args.get("limit", default=50, type=int), 500))
+    return jsonify(list_profiles(limit))
+
+
+# ?format=text renders pstats output; ?format=prof downloads the raw dump
+@admin_bp.route("/profiles/<profile_id>", methods=["GET"])
+@require_admin
+def profile_detail(profile_id):
+    fmt = request.args.get("format", "json")
+    if fmt == "prof":
+        path = profile_stats_path(profile_id)
+        if path:
+            return send_file(path, mimetype="application/octet-stream", as_attachment=True,
+                             download_name=f"{profile_id}.prof")
+    elif fmt == "text":
+        text_report = render_profile_text(profile_id)
+        if text_report is not None:
+            return Response(text_report, mimetype="text/plain")
+    else:
+        data = load_profile(profile_id)
+        if data is not None:
+            return jsonify(data)
+    return jsonify({"error": "Profile not found"}), 404
+
+
+# Shared result cache: entries/bytes and hit ratio per endpoint
+@admin_bp.route("/result-cache", methods=["GET"])
+@require_admin
+def result_cache():
+    ratios = {labels["endpoint"]: ratio for _, labels, ratio in hit_ratios(merged_counters())}
+    return jsonify({
+        "ttl_seconds": RESULT_CACHE_TTL,
+        "max_bytes": RESULT_CACHE_MAX_BYTES,
+        "entries": cache_stats(),
+        "hit_ratio": ratios,
+    })
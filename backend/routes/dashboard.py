@@ -0,0 +1,128 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from flask_cors import CORS
+
+# One round trip for a dashboard's widgets. POST /api/dashboard/batch with
+#
+#   {"widgets": ["ships_per_day", {"id": "top", "name": "arrivals_insights",
+#                                  "params": {"limit": 8}}]}
+#
+# runs each widget's GET endpoint on a thread pool, through the normal
+# request pipeline (result cache, single-flight, admission control and
+# metrics all apply), and streams one NDJSON line per widget as it
+# completes:
+#
+#   {"id": "top", "widget": "arrivals_insights", "status": 200, "body": [...]}
+#
+# The widgets share the worker's connection pool instead of each opening a
+# request of its own.
+dashboard_bp = Blueprint("dashboard", __name__)
+CORS(dashboard_bp)
+
+DASHBOARD_BATCH_WORKERS = int(os.getenv("DASHBOARD_BATCH_WORKERS", 4))
+DASHBOARD_BATCH_MAX = int(os.getenv("DASHBOARD_BATCH_MAX", 20))
+
+# Widget name -> read-only endpoint it runs
+WIDGETS = {
+    "ships": "/api/ships/",
+    "ships_per_day": "/api/trends/ships-per-day",
+    "avg_speed_per_day": "/api/trends/avg-speed-per-day",
+    "ships_per_hour": "/api/trends/ships-per-hour",
+    "avg_speed_per_hour": "/api/trends/avg-speed-per-hour",
+    "arrivals": "/api/trends/arrivals",
+    "arrivals_insights": "/api/trends/arrivals-insights",
+    "ship_type_trends": "/api/ship-types/trends",
+    "ship_types_at_destination": "/api/ship-types/destinations",
+    "fishing_seasonality": "/api/ship-types/fishing-seasonality",
+    "commercial_ratio": "/api/ship-types/ratio",
+    "monthly_ship_total": "/api/ship-types/monthly-total",
+    "fleet_stats": "/api/ship-types/fleet-stats",
+    "traffic_prediction": "/api/traffic/traffic_prediction",
+    "forecast_overview": "/api/traffic/forecast_overview",
+    "time_window_intensity": "/api/traffic/time_window_intensity",
+    "speed_risk_summary": "/api/traffic/speed_risk_summary",
+}
+
+# Headers passed on to every widget request
+FORWARDED_HEADERS = ("Authorization",)
+
+_executor = ThreadPoolExecutor(max_workers=DASHBOARD_BATCH_WORKERS, thread_name_prefix="dashboard")
+
+
+def parse_widgets(payload):
+    """[(id, name, params)] from the request body, or raise ValueError."""
+    widgets = (payload or {}).get("widgets") if isinstance(payload, dict) else None
+    if not isinstance(widgets, list) or not widgets:
+        raise ValueError("widgets must be a non-empty list")
+    if len(widgets) > DASHBOARD_BATCH_MAX:
+        raise ValueError(f"at most {DASHBOARD_BATCH_MAX} widgets per batch")
+    parsed, seen = [], set()
+    for widget in widgets:
+        if isinstance(widget, str):
+            widget = {"name": widget}
+        if not isinstance(widget, dict):
+            raise ValueError("each widget must be a name or an object")
+        name = widget.get("name")
+        if name not in WIDGETS:
+            raise ValueError(f"unknown widget: {name}")
+        widget_id = str(widget.get("id") or name)
+        if widget_id in seen:
+            raise ValueError(f"duplicate widget id: {widget_id}")
+        seen.add(widget_id)
+        params = widget.get("params") or {}
+        if not isinstance(params, dict) or any(isinstance(v, (dict, list)) for v in params.values()):
+            raise ValueError(f"params of {widget_id} must be an object of plain values")
+        parsed.append((widget_id, name, {k: str(v) for k, v in params.items() if v is not None}))
+    return parsed
+
+
+def run_widget(app, path, params, headers):
+    """(status, mimetype, body) of GET path, dispatched inside this app."""
+    try:
+        with app.test_request_context(path, method="GET", query_string=params, headers=headers):
+            response = app.full_dispatch_request()
+            return response.status_code, response.mimetype, response.get_data()
+    except Exception as e:
+        return 500, "application/json", json.dumps({"error": str(e)}).encode()
+
+
+def result_line(widget_id, name, status, mimetype, body):
+    # JSON bodies are spliced in as they are instead of being parsed and
+    # re-encoded.
+    if mimetype != "application/json" or not body:
+        body = json.dumps(body.decode("utf-8", "replace")).encode()
+    head = json.dumps({"id": widget_id, "widget": name, "status": status})
+    return head[:-1].encode() + b', "body": ' + body.strip() + b"}\n"
+
+
+@dashboard_bp.route("/batch", methods=["POST"])
+def batch():
+    try:
+        widgets = parse_widgets(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e), "widgets": sorted(WIDGETS)}), 400
+
+    app = current_app._get_current_object()
+    headers = {h: request.headers[h] for h in FORWARDED_HEADERS if h in request.headers}
+
+    def generate():
+        futures = {
+            _executor.submit(run_widget, app, WIDGETS[name], params, headers): (widget_id, name)
+            for widget_id, name, params in widgets
+        }
+        try:
+            for future in as_completed(futures):
+                widget_id, name = futures[future]
+                yield result_line(widget_id, name, *future.result())
+        finally:
+            # Client went away: skip the widgets that haven't started.
+            for future in futures:
+                future.cancel()
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    response.headers["X-Accel-Buffering"] = "no"
+    response.headers["Cache-Control"] = "no-store"
+    return response
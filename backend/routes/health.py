@@ -0,0 +1,26 @@
+from flask import Blueprint, jsonify
+from utils.admission import pool_status
+from utils.startup import is_ready, startup_report
+
+health_bp = Blueprint("health", __name__)
+
+
+# Liveness: the process is up and serving HTTP, regardless of data state.
+@health_bp.route("/live", methods=["GET"])
+def live():
+    report = startup_report()
+    return jsonify({"status": "alive", "pid": report["pid"], "uptime_seconds": report["uptime_seconds"]})
+
+
+# Readiness: tables exist and the dataset has been loaded. Also reports this
+# worker's admission pools.
+@health_bp.route("/ready", methods=["GET"])
+def ready():
+    report = startup_report()
+    report["admission"] = pool_status()
+    if is_ready():
+        return jsonify(report)
+    response = jsonify(report)
+    response.status_code = 503
+    response.headers["Retry-After"] = "5"
+    return response
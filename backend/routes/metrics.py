@@ -0,0 +1,10 @@
+from flask import Blueprint, Response
+from utils.metrics import render_prometheus
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+# Prometheus scrape target. Served outside /api so nginx does not expose it.
+@metrics_bp.route("", methods=["GET"])
+def metrics():
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
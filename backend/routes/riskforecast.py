@@ -1,23 +1,15 @@
 from flask import Blueprint, request, jsonify
-import pandas as pd
 import math
-import os
 from sqlalchemy import text
 from config import db
+from utils.admission import admission_controlled
+from utils.dataset import REC_TIME_FORMAT, as_float64, json_float, query_ais
+from utils.http_cache import cache_by_dataset_version
 
 riskforecast_bp = Blueprint('riskforecast', __name__)
 
 RISK_RADIUS_KM = 1.0
 
-def resolve_csv_path():
-    candidates = [
-        os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "ships_with_dynamics_heading.csv")),
-        os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "ships_with_dynamics_heading.csv")),
-    ]
-    for path in candidates:
-        if os.path.exists(path):
-            return path
-    return candidates[0]
 
 def haversine(lat1, lon1, lat2, lon2):
     R = 6371
@@ -28,6 +20,17 @@ def haversine(lat1, lon1, lat2, lon2):
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
     return R * c
 
+
+def haversine_many(lat1, lon1, lats, lons):
+    """haversine() from one point to arrays of points, in km."""
+    import numpy as np
+
+    phi1, phi2 = np.radians(lat1), np.radians(lats)
+    dphi = phi2 - phi1
+    dlambda = np.radians(lons - lon1)
+    a = np.sin(dphi/2)**2 + np.cos(phi1)*np.cos(phi2)*np.sin(dlambda/2)**2
+    return 6371 * 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+
 def format_datetime(date_str, time_str):
     """Convert various date/time formats to CSV format (YYYY-MM-DD HH:MM:SS)"""
     try:
@@ -52,6 +55,8 @@ def format_datetime(date_str, time_str):
         return f"{date_str} {time_str}"
 
 @riskforecast_bp.route('/risk_by_datetime', methods=['GET'])
+@cache_by_dataset_version
+@admission_controlled
 def risk_by_datetime():
     ship_name = request.args.get('ship_name')
     date = request.args.get('date')
@@ -59,9 +64,17 @@ def risk_by_datetime():
     if not ship_name or not date or not time:
         return jsonify({'error': 'Missing parameters'}), 400
     
-    df = pd.read_csv(resolve_csv_path())
+    import pandas as pd
+
     dt_str = format_datetime(date, time)
-    ship_row = df[(df['ship_name'] == ship_name) & (df['rec_time'] == dt_str)]
+    when = pd.to_datetime(dt_str, format=REC_TIME_FORMAT, errors="coerce")
+    columns = ['ship_name', 'rec_time', 'latitude', 'longitude']
+    if pd.notna(when):
+        day = when.strftime("%Y-%m-%d")
+        at_time = query_ais(columns, start=day, end=day, filters=[('rec_time', '==', when)])
+    else:
+        at_time = pd.DataFrame(columns=columns)
+    ship_row = at_time[at_time['ship_name'] == ship_name]
     if ship_row.empty:
         return jsonify({
             "ship_name": ship_name,
@@ -69,20 +82,21 @@ def risk_by_datetime():
             "alert": False,
             "message": "Ship or datetime not found."
         })
-    lat1 = ship_row.iloc[0]['latitude']
-    lon1 = ship_row.iloc[0]['longitude']
-    others = df[(df['rec_time'] == dt_str) & (df['ship_name'] != ship_name)]
-    risks = []
-    for _, row in others.iterrows():
-        lat2, lon2 = row['latitude'], row['longitude']
-        dist = haversine(lat1, lon1, lat2, lon2)
-        if dist <= RISK_RADIUS_KM:
-            risks.append({
-                "other_ship": row['ship_name'],
-                "distance_km": round(dist, 3),
-                "latitude": lat2,
-                "longitude": lon2
-            })
+    lat1 = json_float(ship_row.iloc[0]['latitude'], 'latitude')
+    lon1 = json_float(ship_row.iloc[0]['longitude'], 'longitude')
+    others = at_time[at_time['ship_name'] != ship_name]
+    lats, lons = as_float64(others['latitude']), as_float64(others['longitude'])
+    dists = haversine_many(lat1, lon1, lats.to_numpy(), lons.to_numpy())
+    near = dists <= RISK_RADIUS_KM
+    risks = [
+        {
+            "other_ship": name,
+            "distance_km": round(float(dist), 3),
+            "latitude": float(lat2),
+            "longitude": float(lon2)
+        }
+        for name, dist, lat2, lon2 in zip(others['ship_name'][near], dists[near], lats[near], lons[near])
+    ]
     if risks:
         return jsonify({
             "ship_name": ship_name,
@@ -100,6 +114,8 @@ def risk_by_datetime():
         })
 
 @riskforecast_bp.route('/risk_by_ship', methods=['GET'])
+@cache_by_dataset_version
+@admission_controlled
 def risk_by_ship():
     ship_name = request.args.get('ship_name')
     if not ship_name:
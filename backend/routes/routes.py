@@ -1,103 +1,85 @@
 from flask import Blueprint, request, jsonify
 from flask_cors import CORS
-import pandas as pd
-import os
+from utils.admission import admission_controlled
+from utils.dataset import DEFAULT_FLOAT32_DECIMALS, FLOAT32_DECIMALS, REC_TIME_FORMAT, frame_records, parse_int, query_ais
+from utils.http_cache import cache_by_dataset_version
+from utils.serialize import float_column, json_response, records, text_column
 
 routes_bp = Blueprint('routes', __name__)
 
-def resolve_csv_path():
-    candidates = [
-        os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "ships_with_dynamics_heading.csv")),
-        os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "ships_with_dynamics_heading.csv")),
-    ]
-    for path in candidates:
-        if os.path.exists(path):
-            return path
-    return candidates[0]
+ROUTE_COLUMNS = ['latitude', 'longitude', 'rec_time', 'sog', 'cog', 'true_heading', 'destination']
+
+
+def route_points(ship_data):
+    """Route points in the format expected by the frontend, built column-wise."""
+    position, other = FLOAT32_DECIMALS['latitude'], DEFAULT_FLOAT32_DECIMALS
+    return records({
+        'lat': float_column(ship_data['latitude'], default=None, decimals=position),
+        'lon': float_column(ship_data['longitude'], default=None, decimals=position),
+        'timestamp': text_column(ship_data['rec_time'].dt.strftime(REC_TIME_FORMAT), '2025-09-18T10:00:00Z'),
+        'sog': float_column(ship_data['sog'], decimals=other),
+        'cog': float_column(ship_data['cog'], decimals=other),
+        'heading': float_column(ship_data['true_heading']),
+        'destination': text_column(ship_data['destination'], 'Unknown'),
+    })
 
 
 @routes_bp.route('/search_ship', methods=['GET'])
+@cache_by_dataset_version
+@admission_controlled
 def search_ship():
     ship_identifier = request.args.get('identifier')
     if not ship_identifier:
         return jsonify({'error': 'No ship identifier provided'}), 400
 
-    df = pd.read_csv(resolve_csv_path())
-
-    # Search by MMSI or Ship Name
-    result = df[(df['mmsi'].astype(str) == ship_identifier) | (df['ship_name'] == ship_identifier)]
+    # Search by MMSI, then by Ship Name (separate lookups so each can use the
+    # snapshot's row-group statistics)
+    mmsi = parse_int(ship_identifier)
+    result = query_ais(filters=[('mmsi', '==', mmsi)], limit=1) if mmsi is not None else None
+    if result is None or result.empty:
+        result = query_ais(filters=[('ship_name', '==', ship_identifier)], limit=1)
 
     if result.empty:
         return jsonify({'error': 'Ship not found'}), 404
 
-    return jsonify(result.to_dict('records')[0])
+    return jsonify(frame_records(result)[0])
 
 @routes_bp.route('/ship_route', methods=['GET'])
+@cache_by_dataset_version
 def ship_route():
     mmsi = request.args.get('mmsi')
     if not mmsi:
         return jsonify({'error': 'No MMSI provided'}), 400
 
     try:
-        # Read the CSV file to get route data for the specific MMSI
-        df = pd.read_csv(resolve_csv_path())
-        
-        # Filter data for the specific MMSI
-        ship_data = df[df['mmsi'].astype(str) == str(mmsi)]
+        # Route data for the specific MMSI (only the columns we return)
+        ship_data = query_ais(ROUTE_COLUMNS, filters=[('mmsi', '==', parse_int(mmsi) or -1)])
         
         if ship_data.empty:
             return jsonify({'error': 'No route data found for this MMSI'}), 404
         
         # Convert to route format expected by frontend
-        route_data = []
-        for _, row in ship_data.iterrows():
-            route_point = {
-                'lat': float(row['latitude']) if pd.notna(row['latitude']) else None,
-                'lon': float(row['longitude']) if pd.notna(row['longitude']) else None,
-                'timestamp': row['rec_time'] if pd.notna(row['rec_time']) else '2025-09-18T10:00:00Z',
-                'sog': float(row['sog']) if pd.notna(row['sog']) else 0.0,
-                'cog': float(row['cog']) if pd.notna(row['cog']) else 0.0,
-                'heading': float(row['true_heading']) if pd.notna(row['true_heading']) else 0.0,
-                'destination': row['destination'] if pd.notna(row['destination']) else 'Unknown'
-            }
-            route_data.append(route_point)
-        
-        return jsonify(route_data)
+        return json_response(route_points(ship_data))
         
     except Exception as e:
         return jsonify({'error': f'Failed to fetch route data: {str(e)}'}), 500
 
 @routes_bp.route('/ships/<mmsi>/route', methods=['GET'])
+@cache_by_dataset_version
 def ship_route_alt(mmsi):
     """Alternative endpoint to match frontend API expectations"""
     if not mmsi:
         return jsonify({'error': 'No MMSI provided'}), 400
 
     try:
-        # Read the CSV file to get route data for the specific MMSI
-        df = pd.read_csv(resolve_csv_path())
-        
-        # Filter data for the specific MMSI
-        ship_data = df[df['mmsi'].astype(str) == str(mmsi)]
+        # Route data for the specific MMSI (only the columns we return)
+        ship_data = query_ais(ROUTE_COLUMNS, filters=[('mmsi', '==', parse_int(mmsi) or -1)])
         
         if ship_data.empty:
             return jsonify({'error': 'No route data found for this MMSI'}), 404
         
         # Convert to route format expected by frontend
-        route_data = []
-        for _, row in ship_data.iterrows():
-            route_point = {
-                'lat': float(row['latitude']) if pd.notna(row['latitude']) else None,
-                'lon': float(row['longitude']) if pd.notna(row['longitude']) else None,
-                'timestamp': row['rec_time'] if pd.notna(row['rec_time']) else '2025-09-18T10:00:00Z',
-                'sog': float(row['sog']) if pd.notna(row['sog']) else 0.0,
-                'cog': float(row['cog']) if pd.notna(row['cog']) else 0.0,
-                'heading': float(row['true_heading']) if pd.notna(row['true_heading']) else 0.0,
-                'destination': row['destination'] if pd.notna(row['destination']) else 'Unknown'
-            }
-            route_data.append(route_point)
-        
-        return jsonify(route_data)
+        return json_response(route_points(ship_data))
         
     except Exception as e:
         return jsonify({'error': f'Failed to fetch route data: {str(e)}'}), 500
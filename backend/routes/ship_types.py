@@ -2,13 +2,31 @@ from flask import Blueprint, request, jsonify
 from flask_cors import CORS
 from sqlalchemy import text
 from models import db
+from utils.fleet_stats import fleet_overview, monthly_total, total_records
+from utils.http_cache import cache_by_dataset_version
+from utils.result_cache import shared_result_cache
+from utils.single_flight import single_flight
+from utils.sketches import (
+    ALL_TYPES, approx_requested, approx_response, fetch_sketches, merged_counts, with_error,
+)
 
 ship_types_bp = Blueprint("ship_types", __name__)
 CORS(ship_types_bp)
 
+COMMERCIAL_TYPES = ("Cargo", "Tanker", "Passenger")
+
 # 1. Ship types per month
 @ship_types_bp.route("/trends", methods=["GET"])
+@cache_by_dataset_version
 def ship_type_trends():
+    if approx_requested():
+        # Per-type sketches merged by INITCAP(LOWER(...)); '' is a NULL ship_type.
+        counts = merged_counts(fetch_sketches(db.session, "day", initcap=True),
+                               lambda day, ship_type: ship_type)
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        return approx_response([with_error({"ship_type": ship_type or None, "count": count}, "count")
+                                for ship_type, count in ranked])
+
     query = text("""
         SELECT INITCAP(LOWER(ship_type)) AS normalized_ship_type,
                COUNT(DISTINCT mmsi) AS vessel_count
@@ -25,6 +43,7 @@ def ship_type_trends():
 
 # 2. Ship type share at a destination
 @ship_types_bp.route("/destinations", methods=["GET"])
+@cache_by_dataset_version
 def ship_types_at_destination():
     destination = request.args.get("destination")
     if not destination:
@@ -44,12 +63,19 @@ def ship_types_at_destination():
 
 # 3. Fishing vessels seasonality
 @ship_types_bp.route("/fishing-seasonality", methods=["GET"])
+@cache_by_dataset_version
 def fishing_seasonality():
+    if approx_requested():
+        counts = merged_counts(fetch_sketches(db.session, "day", ["Fishing"]),
+                               lambda day, ship_type: day.month)
+        return approx_response([with_error({"month": month, "fishing_vessels": count}, "fishing_vessels")
+                                for month, count in sorted(counts.items())])
+
     query = text("""
-        SELECT EXTRACT(MONTH FROM CAST(rec_time AS TIMESTAMP)) AS month,
+        SELECT EXTRACT(MONTH FROM rec_ts) AS month,
                COUNT(DISTINCT mmsi) AS fishing_vessels
         FROM ais_data
-        WHERE ship_type = 'Fishing' AND rec_time IS NOT NULL AND rec_time != ''
+        WHERE ship_type = 'Fishing' AND rec_ts IS NOT NULL
         GROUP BY month
         ORDER BY month;
     """)
@@ -60,13 +86,30 @@ def fishing_seasonality():
 
 # 4. Commercial vs Non-commercial ratio
 @ship_types_bp.route("/ratio", methods=["GET"])
+@cache_by_dataset_version
 def commercial_vs_noncommercial():
+    if approx_requested():
+        def group(day, ship_type):
+            if not ship_type:
+                return None  # NULL ship_type is in neither group
+            return (day.replace(day=1), ship_type in COMMERCIAL_TYPES)
+
+        counts = merged_counts(fetch_sketches(db.session, "day"), group)
+        months = sorted({month for month, _ in counts})
+        return approx_response([
+            with_error({"month": str(month),
+                        "commercial": counts.get((month, True), 0),
+                        "non_commercial": counts.get((month, False), 0)},
+                       "commercial", "non_commercial")
+            for month in months
+        ])
+
     query = text("""
-        SELECT DATE_TRUNC('month', CAST(rec_time AS TIMESTAMP)) AS month,
+        SELECT DATE_TRUNC('month', rec_ts) AS month,
                COUNT(DISTINCT CASE WHEN ship_type IN ('Cargo', 'Tanker', 'Passenger') THEN mmsi END) AS commercial,
                COUNT(DISTINCT CASE WHEN ship_type NOT IN ('Cargo', 'Tanker', 'Passenger') THEN mmsi END) AS non_commercial
         FROM ais_data
-        WHERE rec_time IS NOT NULL AND rec_time != ''
+        WHERE rec_ts IS NOT NULL
         GROUP BY month
         ORDER BY month;
     """)
@@ -76,29 +119,51 @@ def commercial_vs_noncommercial():
 
 # 4. Total ships in current month and overall database
 @ship_types_bp.route("/monthly-total", methods=["GET"])
+@cache_by_dataset_version
+@single_flight
+@shared_result_cache
 def monthly_ship_total():
     """Get total number of unique ships in the current month and in the entire database"""
     try:
-        # Get total ships in current month
-        monthly_query = text("""
-            SELECT COUNT(DISTINCT mmsi) AS total_ships_this_month
-            FROM ais_data
-            WHERE DATE_TRUNC('month', CAST(rec_time AS TIMESTAMP)) = DATE_TRUNC('month', CURRENT_DATE)
-              AND rec_time IS NOT NULL 
-              AND rec_time != ''
-              AND mmsi IS NOT NULL;
-        """)
-        monthly_result = db.session.execute(monthly_query).fetchone()
+        approx = approx_requested()
+        if not approx:
+            # Counters kept up to date by the ingest: a single small read.
+            data = monthly_total(db.session)
+            if data is not None:
+                return jsonify(data)
+        if approx:
+            # Merged day sketches (all ship types) of this month / of every day
+            bounds = db.session.execute(text("""
+                SELECT DATE_TRUNC('month', LOCALTIMESTAMP),
+                       DATE_TRUNC('month', LOCALTIMESTAMP) + INTERVAL '1 month';
+            """)).fetchone()
+            monthly = merged_counts(fetch_sketches(db.session, "day", [ALL_TYPES], *bounds),
+                                    lambda day, ship_type: "month")
+            total = merged_counts(fetch_sketches(db.session, "day", [ALL_TYPES]),
+                                  lambda day, ship_type: "all")
+            monthly_result = (monthly.get("month", 0),)
+            total_result = (total.get("all", 0),)
+        else:
+            # Get total ships in current month (a rec_ts range, so only this
+            # month's partition is scanned)
+            monthly_query = text("""
+                SELECT COUNT(DISTINCT mmsi) AS total_ships_this_month
+                FROM ais_data
+                WHERE rec_ts >= DATE_TRUNC('month', LOCALTIMESTAMP)
+                  AND rec_ts < DATE_TRUNC('month', LOCALTIMESTAMP) + INTERVAL '1 month'
+                  AND mmsi IS NOT NULL;
+            """)
+            monthly_result = db.session.execute(monthly_query).fetchone()
         
-        # Get total ships in entire database
-        total_query = text("""
-            SELECT COUNT(DISTINCT mmsi) AS total_ships_in_db
-            FROM ais_data
-            WHERE rec_time IS NOT NULL 
-              AND rec_time != ''
-              AND mmsi IS NOT NULL;
-        """)
-        total_result = db.session.execute(total_query).fetchone()
+            # Get total ships in entire database
+            total_query = text("""
+                SELECT COUNT(DISTINCT mmsi) AS total_ships_in_db
+                FROM ais_data
+                WHERE rec_time IS NOT NULL 
+                  AND rec_time != ''
+                  AND mmsi IS NOT NULL;
+            """)
+            total_result = db.session.execute(total_query).fetchone()
         
         # Get the month name for context
         month_query = text("""
@@ -106,14 +171,19 @@ def monthly_ship_total():
         """)
         month_result = db.session.execute(month_query).fetchone()
         
-        # Get total records count for additional context
-        records_query = text("""
-            SELECT COUNT(*) AS total_records
-            FROM ais_data
-            WHERE rec_time IS NOT NULL 
-              AND rec_time != '';
-        """)
-        records_result = db.session.execute(records_query).fetchone()
+        # Get total records count for additional context (kept at ingest; the
+        # exact scan only when the counters haven't been built)
+        records = total_records(db.session) if approx else None
+        if records is not None:
+            records_result = (records,)
+        else:
+            records_query = text("""
+                SELECT COUNT(*) AS total_records
+                FROM ais_data
+                WHERE rec_time IS NOT NULL 
+                  AND rec_time != '';
+            """)
+            records_result = db.session.execute(records_query).fetchone()
         
         data = {
             "ships_this_month": monthly_result[0] if monthly_result else 0,
@@ -122,7 +192,9 @@ def monthly_ship_total():
             "month": month_result[0].strip() if month_result else "Unknown",
             "timestamp": str(db.session.execute(text("SELECT CURRENT_TIMESTAMP")).fetchone()[0])
         }
-        
+
+        if approx:
+            return approx_response(with_error(data, "ships_this_month", "total_ships_in_db"))
         return jsonify(data)
         
     except Exception as e:
@@ -133,3 +205,16 @@ def monthly_ship_total():
             "total_records": 0,
             "month": "Error"
         }), 500
+
+# 5. Fleet counters: totals and vessels/records per month
+@ship_types_bp.route("/fleet-stats", methods=["GET"])
+@cache_by_dataset_version
+def fleet_stats():
+    """Fleet-level KPIs from the snapshot maintained at ingest"""
+    try:
+        data = fleet_overview(db.session)
+        if data is None:
+            return jsonify({"error": "Fleet stats have not been built yet"}), 503
+        return jsonify(data)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
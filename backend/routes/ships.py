@@ -1,13 +1,24 @@
+from datetime import datetime
+
 from flask import Blueprint, jsonify, request
 from flask_cors import CORS
 from sqlalchemy import text
 from models import db
+from utils.admission import admission_controlled
+from utils.density import RESOLUTIONS, density_grid
+from utils.http_cache import cache_by_dataset_version
+from utils.result_cache import shared_result_cache
+from utils.serialize import columns_of, float_column, json_response, records, text_column
+from utils.ship_index import get_ship_index
+from utils.single_flight import single_flight
 
 ships_bp = Blueprint("ships", __name__)
 CORS(ships_bp)
 
 
 @ships_bp.route("/suggest", methods=["GET"])
+@cache_by_dataset_version
+@admission_controlled
 def suggest_ships():
     q = (request.args.get("q") or "").strip()
     limit = request.args.get("limit", default=6, type=int)
@@ -16,6 +27,12 @@ def suggest_ships():
     if len(q) < 1:
         return jsonify([])
 
+    # In-memory index (utils/ship_index.py); the query below is the fallback.
+    index = get_ship_index(db.session)
+    if index is not None:
+        fuzzy = request.args.get("fuzzy", "false").lower() == "true"
+        return jsonify(index.search(q, limit, fuzzy=fuzzy))
+
     like_starts = f"{q}%"
     like_contains = f"%{q}%"
 
@@ -63,6 +80,8 @@ def suggest_ships():
 
 # Get current ship positions for map display
 @ships_bp.route("/", methods=["GET"])
+@cache_by_dataset_version
+@single_flight
 def get_ships():
     # Optional parameters for filtering - Allow large limits for showing all ships
     limit = request.args.get("limit", default=100, type=int)
@@ -103,30 +122,53 @@ def get_ships():
     """)
     
     result = db.session.execute(query, {"limit": limit}).fetchall()
-    
-    ships = []
-    for row in result:
-        ships.append({
-            "mmsi": str(row[0]),
-            "name": row[3] or f"Vessel {row[0]}",
-            "lat": float(row[1]) if row[1] else 0.0,
-            "lon": float(row[2]) if row[2] else 0.0,
-            "shipType": row[4] or "Unknown",
-            "sog": float(row[5]) if row[5] else 0.0,
-            "cog": float(row[6]) if row[6] else 0.0,
-            "heading": float(row[7]) if row[7] else float(row[6]) if row[6] else 0.0,
-            "destination": row[8] or "Unknown",
-            "draught": float(row[9]) if row[9] else 0.0,
-            "length": float(row[10]) if row[10] else 0.0,
-            "width": float(row[11]) if row[11] else 0.0,
-            "lastUpdate": str(row[12]) if row[12] else "",
-            "eta": row[13] or ""
-        })
-    
-    return jsonify(ships)
+    return json_response(ship_records(columns_of(result, 14)))
+
+
+# Output keys of the ship details endpoint for the map keys of ship_records().
+DETAIL_KEYS = {
+    "mmsi": "MMSI", "name": "SHIP_NAME", "lat": "LATITUDE", "lon": "LONGITUDE",
+    "shipType": "SHIP_TYPE", "sog": "SOG", "cog": "COG", "heading": "HEADING",
+    "destination": "DESTINATION", "draught": "DRAUGHT", "length": "LENGTH",
+    "width": "WIDTH", "lastUpdate": "LAST_UPDATE", "eta": "ETA",
+}
+
+
+def ship_records(columns, keys=None):
+    """
+    Records for rows of (mmsi, latitude, longitude, ship_name, ship_type, sog,
+    cog, true_heading, destination, draught, length, width, rec_time, eta),
+    keyed as the map expects, or renamed through ``keys``.
+    """
+    (mmsi, lat, lon, name, ship_type, sog, cog, heading, destination,
+     draught, length, width, rec_time, eta) = columns
+    mmsi = text_column(mmsi)
+    cog = float_column(cog)
+    fields = {
+        "mmsi": mmsi,
+        "name": [n or f"Vessel {m}" for n, m in zip(text_column(name, None), mmsi)],
+        "lat": float_column(lat),
+        "lon": float_column(lon),
+        "shipType": text_column(ship_type, "Unknown"),
+        "sog": float_column(sog),
+        "cog": cog,
+        # No heading reported: fall back to the course over ground.
+        "heading": float_column(heading, default=cog),
+        "destination": text_column(destination, "Unknown"),
+        "draught": float_column(draught),
+        "length": float_column(length),
+        "width": float_column(width),
+        "lastUpdate": text_column(rec_time),
+        "eta": text_column(eta),
+    }
+    if keys:
+        fields = {keys[name]: values for name, values in fields.items()}
+    return records(fields)
 
 # Get details for a single ship by MMSI
 @ships_bp.route("/details", methods=["GET"])
+@cache_by_dataset_version
+@admission_controlled
 def get_ship_details():
     mmsi = request.args.get("mmsi", type=int)
     ship_name = request.args.get("shipName")
@@ -168,37 +210,40 @@ def get_ship_details():
     result = db.session.execute(query, query_params).fetchone()
     
     if result:
-        ship_details = {
-            "MMSI": str(result[0]),
-            "LATITUDE": float(result[1]) if result[1] else 0.0,
-            "LONGITUDE": float(result[2]) if result[2] else 0.0,
-            "SHIP_NAME": result[3] or f"Vessel {result[0]}",
-            "SHIP_TYPE": result[4] or "Unknown",
-            "SOG": float(result[5]) if result[5] else 0.0,
-            "COG": float(result[6]) if result[6] else 0.0,
-            "HEADING": float(result[7]) if result[7] else float(result[6]) if result[6] else 0.0,
-            "DESTINATION": result[8] or "Unknown",
-            "DRAUGHT": float(result[9]) if result[9] else 0.0,
-            "LENGTH": float(result[10]) if result[10] else 0.0,
-            "WIDTH": float(result[11]) if result[11] else 0.0,
-            "LAST_UPDATE": str(result[12]) if result[12] else "",
-            "ETA": result[13] or ""
-        }
-        return jsonify(ship_details)
+        ship_details = ship_records(columns_of([result], 14), DETAIL_KEYS)[0]
+        return json_response(ship_details)
     else:
         return jsonify({"message": "Ship not found"}), 404
 
 # Get ship history (route) by MMSI
 @ships_bp.route("/<int:mmsi>/route", methods=["GET"])
+@cache_by_dataset_version
 def get_ship_route(mmsi):
+    # ?segment=<segment_no> limits the route to one voyage or stay of the
+    # voyages table (by its time window, so only those partitions are read).
+    params = {"mmsi": mmsi}
+    window = ""
+    if request.args.get("segment"):
+        try:
+            segment_no = int(request.args["segment"])
+        except ValueError:
+            return jsonify({"error": "segment must be an integer"}), 400
+        bounds = db.session.execute(text("""
+            SELECT start_time, end_time FROM voyages WHERE mmsi = :mmsi AND segment_no = :segment_no
+        """), {"mmsi": mmsi, "segment_no": segment_no}).fetchone()
+        if bounds is None:
+            return jsonify({"error": "Segment not found"}), 404
+        params.update(start=bounds[0], end=bounds[1])
+        window = "AND rec_ts BETWEEN :start AND :end"
+
     # Get total count of records for this ship
-    count_query = text("""
+    count_query = text(f"""
         SELECT COUNT(*) as total
         FROM ais_data 
-        WHERE mmsi = :mmsi
+        WHERE mmsi = :mmsi {window}
     """)
     
-    count_result = db.session.execute(count_query, {"mmsi": mmsi}).fetchone()
+    count_result = db.session.execute(count_query, params).fetchone()
     total_records = count_result[0] if count_result else 0
     
     if total_records == 0:
@@ -206,28 +251,28 @@ def get_ship_route(mmsi):
     
     if total_records <= 500:
         # If we have 500 or fewer records, return all of them
-        query = text("""
+        query = text(f"""
             SELECT rec_time, latitude, longitude, sog, destination
             FROM ais_data 
-            WHERE mmsi = :mmsi
+            WHERE mmsi = :mmsi {window}
             ORDER BY rec_time ASC
         """)
-        result = db.session.execute(query, {"mmsi": mmsi}).fetchall()
+        result = db.session.execute(query, params).fetchall()
     else:
         # Get first record (start point)
-        first_query = text("""
+        first_query = text(f"""
             SELECT rec_time, latitude, longitude, sog, destination
             FROM ais_data 
-            WHERE mmsi = :mmsi
+            WHERE mmsi = :mmsi {window}
             ORDER BY rec_time ASC
             LIMIT 1
         """)
         
         # Get last record (end point)
-        last_query = text("""
+        last_query = text(f"""
             SELECT rec_time, latitude, longitude, sog, destination
             FROM ais_data 
-            WHERE mmsi = :mmsi
+            WHERE mmsi = :mmsi {window}
             ORDER BY rec_time DESC
             LIMIT 1
         """)
@@ -236,12 +281,12 @@ def get_ship_route(mmsi):
         # Calculate step size to get evenly distributed points
         step_size = max(1, (total_records - 2) // 498)  # -2 because we exclude first and last
         
-        middle_query = text("""
+        middle_query = text(f"""
             WITH numbered_data AS (
                 SELECT rec_time, latitude, longitude, sog, destination,
                        ROW_NUMBER() OVER (ORDER BY rec_time ASC) as row_num
                 FROM ais_data 
-                WHERE mmsi = :mmsi
+                WHERE mmsi = :mmsi {window}
             )
             SELECT rec_time, latitude, longitude, sog, destination
             FROM numbered_data
@@ -252,10 +297,10 @@ def get_ship_route(mmsi):
         """)
         
         # Execute all queries
-        first_result = db.session.execute(first_query, {"mmsi": mmsi}).fetchall()
-        last_result = db.session.execute(last_query, {"mmsi": mmsi}).fetchall()
+        first_result = db.session.execute(first_query, params).fetchall()
+        last_result = db.session.execute(last_query, params).fetchall()
         middle_result = db.session.execute(middle_query, {
-            "mmsi": mmsi, 
+            **params,
             "total_records": total_records,
             "step_size": step_size
         }).fetchall()
@@ -263,14 +308,83 @@ def get_ship_route(mmsi):
         # Combine results: first + middle + last
         result = first_result + middle_result + last_result
     
-    route_data = []
-    for row in result:
-        route_data.append({
-            "timestamp": str(row[0]),
-            "lat": float(row[1]) if row[1] else 0.0,
-            "lon": float(row[2]) if row[2] else 0.0,
-            "sog": float(row[3]) if row[3] else 0.0,
-            "destination": row[4] or "Unknown"
-        })
+    rec_time, lat, lon, sog, destination = columns_of(result, 5)
+    route_data = records({
+        "timestamp": [str(t) for t in rec_time],
+        "lat": float_column(lat),
+        "lon": float_column(lon),
+        "sog": float_column(sog),
+        "destination": text_column(destination, "Unknown"),
+    })
     
-    return jsonify(route_data)
+    return json_response(route_data)
+
+
+# Voyages and port stays of a ship (from the voyages table)
+@ships_bp.route("/<int:mmsi>/voyages", methods=["GET"])
+@cache_by_dataset_version
+def get_ship_voyages(mmsi):
+    kind = request.args.get("kind")
+    if kind not in (None, "voyage", "stay"):
+        return jsonify({"error": "kind must be voyage or stay"}), 400
+    try:
+        result = db.session.execute(text("""
+            SELECT segment_no, kind, start_time, end_time, start_lat, start_lon, end_lat, end_lon,
+                   distance_nm, duration_hours, points, avg_sog, destination
+            FROM voyages
+            WHERE mmsi = :mmsi AND (CAST(:kind AS VARCHAR) IS NULL OR kind = :kind)
+            ORDER BY segment_no
+        """), {"mmsi": mmsi, "kind": kind}).mappings().fetchall()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return json_response([
+        {**row, "start_time": str(row["start_time"]), "end_time": str(row["end_time"])}
+        for row in result
+    ])
+
+
+def parse_bbox(value):
+    """?bbox=min_lon,min_lat,max_lon,max_lat as a tuple of floats (ValueError if malformed)."""
+    bbox = tuple(float(v) for v in value.split(","))
+    if len(bbox) != 4 or bbox[0] >= bbox[2] or bbox[1] >= bbox[3]:
+        raise ValueError(value)
+    return bbox
+
+
+# Traffic density layer: position counts per grid cell
+@ships_bp.route("/density", methods=["GET"])
+@cache_by_dataset_version
+@single_flight
+@shared_result_cache
+@admission_controlled
+def get_density():
+    """
+    AIS positions binned into square cells of ?resolution= degrees (one of
+    RESOLUTIONS, default 1) for the rec_time days ?start=..?end= (inclusive,
+    default everything), optionally limited to a ?bbox=. Clients refine
+    progressively: draw a coarse grid first, then request ``refine``.
+    """
+    try:
+        resolution = float(request.args.get("resolution", 1.0))
+    except ValueError:
+        resolution = None
+    if resolution not in RESOLUTIONS:
+        return jsonify({"error": "resolution must be one of " + ", ".join(f"{r:g}" for r in RESOLUTIONS)}), 400
+    start, end = request.args.get("start") or None, request.args.get("end") or None
+    try:
+        for day in (start, end):
+            if day:
+                datetime.strptime(day, "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"error": "start and end must be dates in YYYY-MM-DD format"}), 400
+    try:
+        bbox = parse_bbox(request.args["bbox"]) if request.args.get("bbox") else None
+    except ValueError:
+        return jsonify({"error": "bbox must be min_lon,min_lat,max_lon,max_lat"}), 400
+
+    try:
+        return json_response(density_grid(resolution, start, end, bbox))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
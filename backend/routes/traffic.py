@@ -1,36 +1,44 @@
+from datetime import datetime, timedelta
 from flask import Blueprint, request, jsonify
-import pandas as pd
-from statsmodels.tsa.arima.model import ARIMA
-import numpy as np
-import os
 from sqlalchemy import text
 from config import db
+from utils.activity_cube import activity_cells
+from utils.admission import admission_controlled
+from utils.dataset import as_float64, parse_int, query_ais
+from utils.http_cache import cache_by_dataset_version
+from utils.result_cache import shared_result_cache
+from utils.sampling import pick_random_seed
+from utils.single_flight import single_flight
+from utils.voyages import STAY, VOYAGE
 
+# pandas and statsmodels are imported inside the views that need them so that
+# workers serving only the lightweight endpoints never pay for them.
 traffic_bp = Blueprint("traffic", __name__)
 
-def resolve_csv_path():
-    candidates = [
-        os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "ships_with_dynamics_heading.csv")),
-        os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "ships_with_dynamics_heading.csv")),
-    ]
-    for path in candidates:
-        if os.path.exists(path):
-            return path
-    return candidates[0]
+MAX_INTENSITY_DAYS = 366
 
-def get_ship_data():
-    """Load CSV data - helper function to avoid import-time loading"""
-    DATA_PATH = resolve_csv_path()
-    if not os.path.exists(DATA_PATH):
-        raise FileNotFoundError(f"CSV file not found at: {DATA_PATH}")
-    return pd.read_csv(DATA_PATH)
+def vessel_rows(columns, mmsi=None, imo=None, ship_name=None):
+    """
+    AIS rows of one vessel, looked up by mmsi, imo or ship name (in that
+    order of preference). Returns None when no identifier is given.
+    """
+    if mmsi:
+        return query_ais(columns, filters=[("mmsi", "==", parse_int(mmsi) or -1)])
+    if imo:
+        return query_ais(columns, filters=[("imo", "==", parse_int(imo) or -1)])
+    if ship_name:
+        df = query_ais(["ship_name"] + columns)
+        return df[df["ship_name"].str.upper() == str(ship_name).upper()]
+    return None
 
 
 @traffic_bp.route("/random_seed", methods=["GET"])
 def random_seed():
     """Return a random valid ship seed from ais_data for quick form fill actions."""
     try:
-        row = db.session.execute(text("""
+        # Two index lookups in the ingest-time sample; the full-table
+        # ORDER BY RANDOM() is only the fallback while no sample exists.
+        row = pick_random_seed(db.session) or db.session.execute(text("""
             SELECT
                 CAST(mmsi AS TEXT) AS mmsi,
                 ship_name,
@@ -53,11 +61,10 @@ def random_seed():
         time_part = ""
 
         try:
-            parsed = pd.to_datetime(rec_time_value, format="%Y-%m-%d %H:%M:%S", errors="coerce")
-            if pd.notna(parsed):
-                date_part = parsed.strftime("%Y-%m-%d")
-                time_part = parsed.strftime("%H:%M")
-        except Exception:
+            parsed = datetime.strptime(rec_time_value, "%Y-%m-%d %H:%M:%S")
+            date_part = parsed.strftime("%Y-%m-%d")
+            time_part = parsed.strftime("%H:%M")
+        except ValueError:
             pass
 
         return jsonify({
@@ -70,12 +77,44 @@ def random_seed():
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
+def voyage_arrivals(cutoff):
+    """
+    traffic_prediction's payload from the voyages table: a vessel whose
+    latest segment by ``cutoff`` is a stay has reached that port, one still
+    on a voyage is in transit.
+    """
+    result = db.session.execute(text("""
+        WITH latest AS (
+            SELECT DISTINCT ON (mmsi) mmsi, kind, destination
+            FROM voyages
+            WHERE start_time <= :cutoff
+            ORDER BY mmsi, start_time DESC
+        )
+        SELECT kind, destination, COUNT(*)
+        FROM latest
+        GROUP BY kind, destination
+        ORDER BY COUNT(*) DESC, destination
+    """), {"cutoff": cutoff}).fetchall()
+    forecast = {dest: {"reached": count} for kind, dest, count in result if kind == STAY and dest}
+    return {
+        "date": cutoff.strftime("%Y-%m-%d"),
+        "totals": {
+            "reached": sum(v["reached"] for v in forecast.values()),
+            "in_transit": sum(count for kind, _, count in result if kind == VOYAGE)
+        },
+        "ships_at_ports": forecast,
+        "method": "voyages"
+    }
+
 @traffic_bp.route("/traffic_prediction", methods=["GET"])
+@cache_by_dataset_version
+@single_flight
+@shared_result_cache
+@admission_controlled
 def traffic_prediction():
+    import pandas as pd
+
     try:
-        df = get_ship_data()
-        df["rec_time"] = pd.to_datetime(df["rec_time"], format="%Y-%m-%d %H:%M:%S")
-        
         def clean_destination(dest):
             if pd.isna(dest) or dest in ["UNKNOWN", "0", "TBA", "", "PORT_REACHED"]:
                 return None
@@ -83,8 +122,7 @@ def traffic_prediction():
             if dest in ["IN TRANSIT", "WAITING"]:
                 return "IN_TRANSIT"
             return dest
-            
-        df["destination_clean"] = df["destination"].apply(clean_destination)
+
         target_date_str = request.args.get("date")
         if not target_date_str:
             return jsonify({"error": "Please provide a date parameter in format YYYY-MM-DD"}), 400
@@ -92,20 +130,18 @@ def traffic_prediction():
             target_date = pd.to_datetime(target_date_str)
         except Exception:
             return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
-        df_filtered = df[df["rec_time"] <= target_date]
+        if request.args.get("method") == "voyages":
+            return jsonify(voyage_arrivals(target_date.to_pydatetime()))
+        df_filtered = query_ais(["mmsi", "rec_time", "destination"], end=target_date.strftime("%Y-%m-%d"),
+                                filters=[("rec_time", "<=", target_date)])
         latest_records = df_filtered.sort_values("rec_time").groupby("mmsi").tail(1)
-        forecast = {}
-        total_reached = 0
-        total_in_transit = 0
-        for _, row in latest_records.iterrows():
-            dest = row["destination_clean"]
-            if not dest:
-                continue
-            if dest == "IN_TRANSIT":
-                total_in_transit += 1
-            else:
-                forecast[dest] = {"reached": forecast.get(dest, {"reached": 0})["reached"] + 1}
-                total_reached += 1
+        # Only the latest record per vessel is cleaned, not the whole frame.
+        destinations = latest_records["destination"].astype(object).map(clean_destination)
+        destinations = destinations[destinations.notna() & destinations.ne("")]
+        total_in_transit = int(destinations.eq("IN_TRANSIT").sum())
+        reached = destinations[destinations.ne("IN_TRANSIT")].value_counts()
+        forecast = {dest: {"reached": int(count)} for dest, count in reached.items()}
+        total_reached = int(reached.sum())
         return jsonify({
             "date": target_date.strftime("%Y-%m-%d"),
             "totals": {
@@ -120,30 +156,21 @@ def traffic_prediction():
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 @traffic_bp.route("/speed_forecast", methods=["POST"])
+@admission_controlled
 def speed_forecast():
     try:
-        df = get_ship_data()
-        df["rec_time"] = pd.to_datetime(df["rec_time"], format="%Y-%m-%d %H:%M:%S")
         data = request.get_json()
         mmsi = data.get("mmsi")
         imo = data.get("imo")
         ship_name = data.get("ship_name")
         days_ahead = int(data.get("days_ahead", 1))
-        df["mmsi"] = df["mmsi"].astype(str)
-        df["imo"] = df["imo"].astype(str)
-        df["ship_name"] = df["ship_name"].astype(str)
-        if mmsi:
-            ship_data = df[df["mmsi"] == str(mmsi)]
-        elif imo:
-            ship_data = df[df["imo"] == str(imo)]
-        elif ship_name:
-            ship_data = df[df["ship_name"].str.upper() == ship_name.upper()]
-        else:
+        ship_data = vessel_rows(["rec_time", "sog"], mmsi, imo, ship_name)
+        if ship_data is None:
             return jsonify({"error": "Provide at least one identifier: mmsi, imo, or ship_name"}), 400
         if ship_data.empty:
             return jsonify({"error": "Ship not found"}), 404
         ship_data = ship_data.sort_values("rec_time")
-        sog_series = ship_data["sog"].values
+        sog_series = as_float64(ship_data["sog"]).values
         if len(sog_series) < 2:
             # If not enough data for ARIMA, return the last known speed for all days
             last_speed = float(sog_series[-1])
@@ -155,6 +182,7 @@ def speed_forecast():
                 "summary": f"Predicted speed for next {days_ahead} days: {last_speed:.2f} knots (based on last known speed)"
             })
         try:
+            from statsmodels.tsa.arima.model import ARIMA
             model = ARIMA(sog_series, order=(1, 1, 0))
             model_fit = model.fit()
             forecast = model_fit.forecast(steps=days_ahead)
@@ -174,11 +202,15 @@ def speed_forecast():
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 @traffic_bp.route("/forecast_overview", methods=["GET"])
+@cache_by_dataset_version
+@single_flight
+@shared_result_cache
+@admission_controlled
 def forecast_overview():
     """High-level forecast insight metrics for a selected date."""
+    import pandas as pd
+
     try:
-        df = get_ship_data()
-        df["rec_time"] = pd.to_datetime(df["rec_time"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
         date_str = request.args.get("date")
         if not date_str:
             return jsonify({"error": "date parameter is required in YYYY-MM-DD format"}), 400
@@ -186,7 +218,8 @@ def forecast_overview():
         if pd.isna(target_date):
             return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
 
-        df = df[df["rec_time"].notna() & (df["rec_time"] <= target_date)]
+        df = query_ais(["mmsi", "rec_time", "destination"], end=target_date.strftime("%Y-%m-%d"),
+                       filters=[("rec_time", "<=", target_date)])
         if df.empty:
             return jsonify({
                 "date": target_date.strftime("%Y-%m-%d"),
@@ -197,7 +230,7 @@ def forecast_overview():
             })
 
         latest_records = df.sort_values("rec_time").groupby("mmsi").tail(1)
-        latest_records["destination_norm"] = latest_records["destination"].fillna("UNKNOWN").astype(str).str.strip()
+        latest_records["destination_norm"] = latest_records["destination"].astype(object).fillna("UNKNOWN").astype(str).str.strip()
         latest_records = latest_records[latest_records["destination_norm"].ne("")]
 
         destination_counts = latest_records["destination_norm"].value_counts()
@@ -217,43 +250,102 @@ def forecast_overview():
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
+def frame_activity_cells(first_day, last_day, destination=None, ship_type=None):
+    """activity_cells() computed from the AIS frame, for when there is no cube."""
+    columns = ["mmsi", "rec_time"]
+    columns += [c for c, value in (("destination", destination), ("ship_type", ship_type)) if value is not None]
+    df = query_ais(columns, start=first_day.isoformat(), end=last_day.isoformat())
+    # '' selects the rows without a value, as in the cube
+    for column, value in (("destination", destination), ("ship_type", ship_type)):
+        if value is not None:
+            df = df[df[column].isna() if value == "" else df[column] == value]
+    counts = df.groupby([df["rec_time"].dt.date, df["rec_time"].dt.hour])["mmsi"].nunique()
+    return [(day, int(hour), int(vessels)) for (day, hour), vessels in counts.items() if vessels]
+
+
+def intensity_heatmap(cells, first_day, last_day):
+    """Day x hour matrix of active vessels, one row per day of the range."""
+    days = [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+    row_of = {day: i for i, day in enumerate(days)}
+    matrix = [[0] * 24 for _ in days]
+    for day, hour, vessels in cells:
+        matrix[row_of[day]][hour] = vessels
+    return {
+        "start": first_day.isoformat(),
+        "end": last_day.isoformat(),
+        "hours": list(range(24)),
+        "dates": [day.isoformat() for day in days],
+        "matrix": matrix,
+        "max_active_vessels": max((vessels for _, _, vessels in cells), default=0),
+    }
+
+
 @traffic_bp.route("/time_window_intensity", methods=["GET"])
+@cache_by_dataset_version
+@single_flight
+@shared_result_cache
 def time_window_intensity():
-    """Returns activity intensity by hour and the best operating window."""
+    """
+    Returns activity intensity by hour and the best operating window, for
+    ?date= or a ?start=&end= range, optionally for one ?destination= and/or
+    ?ship_type=. Over a range, active_vessels sums each day's distinct
+    vessels. ?format=heatmap returns the day x hour matrix instead.
+    """
     try:
-        df = get_ship_data()
-        df["rec_time"] = pd.to_datetime(df["rec_time"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
         date_str = request.args.get("date")
-        if not date_str:
-            return jsonify({"error": "date parameter is required in YYYY-MM-DD format"}), 400
-        target_date = pd.to_datetime(date_str, errors="coerce")
-        if pd.isna(target_date):
+        start_str = request.args.get("start") or date_str
+        end_str = request.args.get("end") or start_str
+        if not start_str:
+            return jsonify({"error": "date (or start and end) parameter is required in YYYY-MM-DD format"}), 400
+        try:
+            first_day = datetime.strptime(start_str.strip(), "%Y-%m-%d").date()
+            last_day = datetime.strptime(end_str.strip(), "%Y-%m-%d").date()
+        except ValueError:
             return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+        if last_day < first_day:
+            return jsonify({"error": "end must not be before start"}), 400
+        if (last_day - first_day).days >= MAX_INTENSITY_DAYS:
+            return jsonify({"error": f"at most {MAX_INTENSITY_DAYS} days per request"}), 400
+        destination = request.args.get("destination")
+        ship_type = request.args.get("ship_type")
+
+        # A few hundred rows of the ingest-time cube; the frame scan only
+        # runs until the cube exists.
+        cells = activity_cells(db.session, first_day, last_day, destination, ship_type)
+        if cells is None:
+            cells = frame_activity_cells(first_day, last_day, destination, ship_type)
 
-        day_df = df[df["rec_time"].dt.date == target_date.date()].copy()
-        if day_df.empty:
+        if request.args.get("format") == "heatmap":
+            return jsonify(intensity_heatmap(cells, first_day, last_day))
+
+        if first_day == last_day:
+            period = {"date": first_day.isoformat()}
+        else:
+            period = {"start": first_day.isoformat(), "end": last_day.isoformat()}
+        hourly = {}
+        for _, hour, vessels in cells:
+            hourly[hour] = hourly.get(hour, 0) + vessels
+        if not hourly:
             return jsonify({
-                "date": target_date.strftime("%Y-%m-%d"),
+                **period,
                 "best_hour_utc": None,
                 "top_hours": [],
                 "hourly_activity": []
             })
 
-        day_df["hour"] = day_df["rec_time"].dt.hour
-        hourly_counts = day_df.groupby("hour")["mmsi"].nunique().sort_values(ascending=False)
+        busiest = sorted(hourly.items(), key=lambda item: (-item[1], item[0]))
         top_hours = [
             {"hour_utc": int(hour), "active_vessels": int(count)}
-            for hour, count in hourly_counts.head(3).items()
+            for hour, count in busiest[:3]
         ]
-        best_hour = int(hourly_counts.index[0]) if len(hourly_counts) else None
         activity_series = [
             {"hour_utc": int(hour), "active_vessels": int(count)}
-            for hour, count in hourly_counts.sort_index().items()
+            for hour, count in sorted(hourly.items())
         ]
 
         return jsonify({
-            "date": target_date.strftime("%Y-%m-%d"),
-            "best_hour_utc": best_hour,
+            **period,
+            "best_hour_utc": int(busiest[0][0]),
             "top_hours": top_hours,
             "hourly_activity": activity_series
         })
@@ -261,30 +353,24 @@ def time_window_intensity():
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 @traffic_bp.route("/speed_risk_summary", methods=["GET"])
+@cache_by_dataset_version
+@admission_controlled
 def speed_risk_summary():
     """Speed volatility and risk-band insights for a selected vessel."""
     try:
-        df = get_ship_data()
-        df["rec_time"] = pd.to_datetime(df["rec_time"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
         mmsi = request.args.get("mmsi")
         ship_name = request.args.get("ship_name")
         if not mmsi and not ship_name:
             return jsonify({"error": "Provide mmsi or ship_name"}), 400
 
-        df["mmsi"] = df["mmsi"].astype(str)
-        df["ship_name"] = df["ship_name"].astype(str)
-        if mmsi:
-            ship_df = df[df["mmsi"] == str(mmsi)]
-            identifier = str(mmsi)
-        else:
-            ship_df = df[df["ship_name"].str.upper() == str(ship_name).upper()]
-            identifier = str(ship_name)
+        ship_df = vessel_rows(["rec_time", "sog"], mmsi=mmsi, ship_name=ship_name)
+        identifier = str(mmsi) if mmsi else str(ship_name)
 
         if ship_df.empty:
             return jsonify({"error": "Ship not found"}), 404
 
         ship_df = ship_df.sort_values("rec_time")
-        sog = pd.to_numeric(ship_df["sog"], errors="coerce").dropna()
+        sog = as_float64(ship_df["sog"]).dropna()
         if sog.empty:
             return jsonify({"error": "No valid speed data found for this ship"}), 404
 
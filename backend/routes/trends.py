@@ -1,34 +1,147 @@
 from flask import Blueprint, jsonify, request
 from flask_cors import CORS
+from datetime import datetime, timedelta
 from models import db, AISData
-from sqlalchemy import func, TIMESTAMP, text
+from sqlalchemy import func, text
+from utils.http_cache import cache_by_dataset_version
+from utils.port_calls import arrivals_by_port, daily_port_arrivals
+from utils.result_cache import shared_result_cache
+from utils.sampling import mean_error, requested_fraction, sampled_source
+from utils.single_flight import single_flight
+from utils.sketches import (
+    ALL_TYPES, approx_requested, approx_response, fetch_sketches, merged_counts, with_error,
+)
 
 trends_bp = Blueprint('trends', __name__)
 CORS(trends_bp)
 
+
+def requested_dates():
+    """
+    The optional ?start= / ?end= days (YYYY-MM-DD, inclusive) as
+    (start, exclusive end, error message); missing bounds are None.
+    """
+    try:
+        start = end = None
+        if request.args.get("start"):
+            start = datetime.strptime(request.args["start"], "%Y-%m-%d")
+        if request.args.get("end"):
+            end = datetime.strptime(request.args["end"], "%Y-%m-%d") + timedelta(days=1)
+    except ValueError:
+        return None, None, "start and end must be dates in YYYY-MM-DD format"
+    return start, end, None
+
+
+def date_range(query):
+    """
+    Limit ``query`` to the requested days. Bounds on rec_ts only scan the
+    matching partitions. Returns (query, error message).
+    """
+    start, end, error = requested_dates()
+    if error:
+        return None, error
+    if start is not None:
+        query = query.filter(AISData.rec_ts >= start)
+    if end is not None:
+        query = query.filter(AISData.rec_ts < end)
+    return query, None
+
+
+def approx_ships(granularity, label):
+    """?approx=true: distinct vessels per day/hour from the stored sketches."""
+    start, end, error = requested_dates()
+    if error:
+        return jsonify({"error": error}), 400
+    counts = merged_counts(
+        fetch_sketches(db.session, granularity, [ALL_TYPES], start, end),
+        lambda bucket, ship_type: bucket)
+    return approx_response([
+        with_error({granularity: label(bucket), "ships": count}, "ships")
+        for bucket, count in counts.items()
+    ])
+
+
+def sampled_avg_speed(fraction, bucket_sql, key, label):
+    """?sample=<fraction>: average speed per bucket over a random sample,
+    with the 95% confidence half-width of each average."""
+    start, end, error = requested_dates()
+    if error:
+        return jsonify({"error": error}), 400
+    conditions, params = [], {}
+    if start is not None:
+        conditions.append("rec_ts >= :start")
+        params["start"] = start
+    if end is not None:
+        conditions.append("rec_ts < :end")
+        params["end"] = end
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = db.session.execute(text(f"""
+        SELECT {bucket_sql} AS bucket,
+               AVG(sog) AS avg_sog,
+               STDDEV_SAMP(sog) AS stddev_sog,
+               COUNT(sog) AS sampled
+        FROM {sampled_source(db.session, fraction)}
+        {where}
+        GROUP BY bucket
+    """), params).fetchall()
+
+    response = jsonify([{
+        key: label(r.bucket),
+        "avg_speed": float(r.avg_sog) if r.avg_sog is not None else None,
+        "avg_speed_error": mean_error(r.stddev_sog, r.sampled, fraction),
+        "sampled_rows": r.sampled,
+    } for r in rows])
+    response.headers["X-Sample-Fraction"] = str(fraction)
+    return response
+
+
 # 1. Ships active per day
 @trends_bp.route("/ships-per-day")
+@cache_by_dataset_version
 def ships_per_day():
-    result = db.session.query(
-        func.date(AISData.rec_time).label("day"),
+    if approx_requested():
+        return approx_ships("day", lambda bucket: str(bucket.date()))
+    query, error = date_range(db.session.query(
+        func.date(AISData.rec_ts).label("day"),
         func.count(func.distinct(AISData.mmsi)).label("unique_ships")
-    ).group_by(func.date(AISData.rec_time)).all()
+    ))
+    if error:
+        return jsonify({"error": error}), 400
+    result = query.group_by(func.date(AISData.rec_ts)).all()
 
     return jsonify([{"day": str(r.day), "ships": r.unique_ships} for r in result])
 
 # 2. Average speed per day
 @trends_bp.route("/avg-speed-per-day")
+@cache_by_dataset_version
 def avg_speed_per_day():
-    result = db.session.query(
-        func.date(AISData.rec_time).label("day"),
+    fraction, error = requested_fraction()
+    if error:
+        return jsonify({"error": error}), 400
+    if fraction is not None:
+        return sampled_avg_speed(fraction, "DATE(rec_ts)", "day", str)
+    query, error = date_range(db.session.query(
+        func.date(AISData.rec_ts).label("day"),
         func.avg(AISData.sog).label("avg_sog")
-    ).group_by(func.date(AISData.rec_time)).all()
+    ))
+    if error:
+        return jsonify({"error": error}), 400
+    result = query.group_by(func.date(AISData.rec_ts)).all()
 
     return jsonify([{"day": str(r.day), "avg_speed": float(r.avg_sog)} for r in result])
 
-# 3. Port arrivals per day
+# 3. Port arrivals per port, from the detected port calls
 @trends_bp.route("/arrivals")
+@cache_by_dataset_version
 def arrivals():
+    start, end, error = requested_dates()
+    if error:
+        return jsonify({"error": error}), 400
+    calls = arrivals_by_port(db.session, start, end)
+    if calls is not None:
+        return jsonify([{"destination": r.port, "arrivals": r.arrivals} for r in calls])
+
+    # Port calls not built yet: reports per announced destination
     result = db.session.query(
         AISData.destination,
         func.count(AISData.id).label("arrivals")
@@ -38,7 +151,27 @@ def arrivals():
     return jsonify([{"destination": r.destination, "arrivals": r.arrivals} for r in result])
 
 
+@trends_bp.route("/port-arrivals")
+@cache_by_dataset_version
+def port_arrivals():
+    """Port calls per arrival day and port (?port=, ?start=, ?end=)."""
+    start, end, error = requested_dates()
+    if error:
+        return jsonify({"error": error}), 400
+    port = request.args.get("port", "").strip().upper() or None
+    try:
+        rows = daily_port_arrivals(db.session, start, end, port)
+        if rows is None:
+            return jsonify({"error": "Port calls have not been built yet"}), 503
+        return jsonify([{"day": str(r.day), "port": r.port, "arrivals": r.arrivals} for r in rows])
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @trends_bp.route("/arrivals-insights")
+@cache_by_dataset_version
+@single_flight
+@shared_result_cache
 def arrivals_insights():
     limit = 8
     try:
@@ -52,12 +185,12 @@ def arrivals_insights():
             SELECT
                 mmsi,
                 TRIM(destination) AS destination,
-                CAST(rec_time AS TIMESTAMP) AS rec_ts
+                rec_ts
             FROM ais_data
             WHERE destination IS NOT NULL
               AND TRIM(destination) <> ''
               AND UPPER(TRIM(destination)) NOT IN ('UNKNOWN', 'TBA', '0', 'IN TRANSIT', 'WAITING', 'PORT_REACHED')
-              AND rec_time IS NOT NULL
+              AND rec_ts IS NOT NULL
         ),
         latest AS (
             SELECT DISTINCT ON (mmsi)
@@ -103,20 +236,39 @@ def arrivals_insights():
 
 # 4. Ships active per hour
 @trends_bp.route("/ships-per-hour")
+@cache_by_dataset_version
+@single_flight
+@shared_result_cache
 def ships_per_hour():
-    result = db.session.query(
-        func.date_trunc('hour', AISData.rec_time.cast(TIMESTAMP)).label("hour"),
+    if approx_requested():
+        return approx_ships("hour", str)
+    query, error = date_range(db.session.query(
+        func.date_trunc('hour', AISData.rec_ts).label("hour"),
         func.count(func.distinct(AISData.mmsi)).label("unique_ships")
-    ).group_by("hour").all()
+    ))
+    if error:
+        return jsonify({"error": error}), 400
+    result = query.group_by("hour").all()
 
     return jsonify([{"hour": str(r.hour), "ships": r.unique_ships} for r in result])
 
 # 5. Average speed per hour
 @trends_bp.route("/avg-speed-per-hour")
+@cache_by_dataset_version
+@single_flight
+@shared_result_cache
 def avg_speed_per_hour():
-    result = db.session.query(
-        func.date_trunc('hour', AISData.rec_time.cast(TIMESTAMP)).label("hour"),
+    fraction, error = requested_fraction()
+    if error:
+        return jsonify({"error": error}), 400
+    if fraction is not None:
+        return sampled_avg_speed(fraction, "DATE_TRUNC('hour', rec_ts)", "hour", str)
+    query, error = date_range(db.session.query(
+        func.date_trunc('hour', AISData.rec_ts).label("hour"),
         func.avg(AISData.sog).label("avg_sog")
-    ).group_by("hour").all()
+    ))
+    if error:
+        return jsonify({"error": error}), 400
+    result = query.group_by("hour").all()
 
     return jsonify([{"hour": str(r.hour), "avg_speed": float(r.avg_sog)} for r in result])
@@ -0,0 +1,107 @@
+import time
+
+from sqlalchemy import text
+
+# Distinct vessels (and position reports) per day, hour of day, destination
+# and ship type, rebuilt from ais_data after each load. Distinct counts do
+# not add up across cells, so the cube also stores the roll-ups: rolled_up
+# is GROUPING(destination, ship_type), so ROLLED_UP_DESTINATION set means the
+# count is over all destinations (stored as ''), likewise for the ship type.
+# '' in a column that is not rolled up stands for rows without a value. Any
+# day range, with or without a destination / ship type, is then answered by
+# reading the (day, hour) cells of one combination.
+ROLLED_UP_DESTINATION = 2
+ROLLED_UP_SHIP_TYPE = 1
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS activity_cube (
+        day DATE NOT NULL,
+        hour SMALLINT NOT NULL,
+        rolled_up SMALLINT NOT NULL,
+        destination VARCHAR(255) NOT NULL,
+        ship_type VARCHAR(255) NOT NULL,
+        vessels INTEGER NOT NULL,
+        records INTEGER NOT NULL,
+        PRIMARY KEY (day, hour, rolled_up, destination, ship_type)
+    )
+"""
+
+BUILD_SQL = """
+    INSERT INTO activity_cube (day, hour, rolled_up, destination, ship_type, vessels, records)
+    SELECT day,
+           hour,
+           GROUPING(destination, ship_type),
+           CASE WHEN GROUPING(destination) = 1 THEN '' ELSE destination END,
+           CASE WHEN GROUPING(ship_type) = 1 THEN '' ELSE ship_type END,
+           COUNT(DISTINCT mmsi),
+           COUNT(*)
+    FROM (
+        SELECT CAST(rec_ts AS DATE) AS day,
+               CAST(EXTRACT(HOUR FROM rec_ts) AS SMALLINT) AS hour,
+               COALESCE(destination, '') AS destination,
+               COALESCE(ship_type, '') AS ship_type,
+               mmsi
+        FROM ais_data
+        WHERE rec_ts IS NOT NULL
+    ) AS rows
+    GROUP BY GROUPING SETS (
+        (day, hour, destination, ship_type),
+        (day, hour, destination),
+        (day, hour, ship_type),
+        (day, hour)
+    )
+"""
+
+
+def ensure_activity_cube_table(conn):
+    # An older cube marked roll-ups with '*' in the value columns. It only
+    # holds derived data: drop it, and startup rebuilds the empty table.
+    legacy = conn.execute(text("""
+        SELECT EXISTS (SELECT 1 FROM information_schema.tables
+                       WHERE table_schema = current_schema() AND table_name = 'activity_cube')
+           AND NOT EXISTS (SELECT 1 FROM information_schema.columns
+                           WHERE table_schema = current_schema() AND table_name = 'activity_cube'
+                             AND column_name = 'rolled_up')
+    """)).scalar()
+    if legacy:
+        conn.execute(text("DROP TABLE activity_cube"))
+    conn.execute(text(CREATE_TABLE_SQL))
+
+
+def build_activity_cube(engine):
+    """Rebuild activity_cube from ais_data. Readers keep the old cube until
+    the new one is committed."""
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        ensure_activity_cube_table(conn)
+        conn.execute(text("DELETE FROM activity_cube"))
+        cells = conn.execute(text(BUILD_SQL)).rowcount
+    print(f"Activity cube: {cells} cells in {time.perf_counter() - start:.2f}s")
+    return cells
+
+
+def activity_cells(session, first_day, last_day, destination=None, ship_type=None):
+    """
+    [(day, hour, vessels)] for the days first_day..last_day (inclusive),
+    optionally for one destination and/or ship type. None while the cube
+    has not been built.
+    """
+    if not session.execute(text("SELECT EXISTS (SELECT 1 FROM activity_cube)")).scalar():
+        return None
+    rows = session.execute(text("""
+        SELECT day, hour, vessels
+        FROM activity_cube
+        WHERE day BETWEEN :first_day AND :last_day
+          AND rolled_up = :rolled_up
+          AND destination = :destination
+          AND ship_type = :ship_type
+        ORDER BY day, hour
+    """), {
+        "first_day": first_day,
+        "last_day": last_day,
+        "rolled_up": ((ROLLED_UP_DESTINATION if destination is None else 0)
+                      | (ROLLED_UP_SHIP_TYPE if ship_type is None else 0)),
+        "destination": "" if destination is None else destination,
+        "ship_type": "" if ship_type is None else ship_type,
+    }).fetchall()
+    return [(day, hour, vessels) for day, hour, vessels in rows]
@@ -0,0 +1,29 @@
+import hmac
+from functools import wraps
+
+from flask import jsonify, request
+
+from config import ADMIN_TOKEN, ADMIN_USERS
+
+
+def is_admin_request():
+    """True if the current request carries admin credentials."""
+    token = request.headers.get("X-Admin-Token", "")
+    if ADMIN_TOKEN and token and hmac.compare_digest(token, ADMIN_TOKEN):
+        return True
+
+    auth_header = request.headers.get("Authorization", "")
+    if ADMIN_USERS and auth_header.startswith("Bearer "):
+        from user_model import User
+        user = User.verify_token(auth_header.split(" ", 1)[1])
+        return bool(user) and user["username"] in ADMIN_USERS
+    return False
+
+
+def require_admin(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_admin_request():
+            return jsonify({"error": "Admin credentials required"}), 403
+        return view(*args, **kwargs)
+    return wrapper
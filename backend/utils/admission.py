@@ -0,0 +1,112 @@
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify, request
+
+from config import ADMISSION_CONTROL, ADMISSION_ENDPOINTS, ADMISSION_POOLS
+from utils.metrics import describe, inc, observe
+
+# Admission control and load shedding. A view listed in
+# config.ADMISSION_ENDPOINTS is decorated with @admission_controlled as its
+# innermost decorator, so 304s, result-cache hits and single-flight
+# followers are answered without a slot; only a request that actually
+# computes takes one, for as long as the view runs. When the pool is full
+# the request queues (bounded); when the queue is full too, or the wait runs
+# out, it gets 503 + Retry-After at once instead of piling up on the
+# worker's threads. A pool with a parent also holds a slot in the parent.
+
+describe("admission_rejected_total", "counter", "Requests shed by admission control")
+describe("admission_wait_seconds", "histogram", "Time admitted requests waited for a slot")
+
+
+class Pool:
+    def __init__(self, name, limit, queue, wait, retry_after, parent=None):
+        self.name = name
+        self.parent = parent
+        self.limit = limit
+        self.queue = queue
+        self.wait = wait
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """None when admitted, else the reason for rejecting ("queue_full" / "timeout")."""
+        with self._cond:
+            if self.active < self.limit:
+                self.active += 1
+                return None
+            if self.waiting >= self.queue:
+                return "queue_full"
+            self.waiting += 1
+            try:
+                admitted = self._cond.wait_for(lambda: self.active < self.limit, timeout=self.wait)
+            finally:
+                self.waiting -= 1
+            if not admitted:
+                return "timeout"
+            self.active += 1
+            return None
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+
+POOLS = {name: Pool(name, **settings) for name, settings in ADMISSION_POOLS.items()}
+
+
+def pool_status():
+    """Current slots in use / queued per pool (this worker)."""
+    return {name: {"limit": p.limit, "active": p.active, "queue": p.queue, "waiting": p.waiting}
+            for name, p in POOLS.items()}
+
+
+def _pool_chain(pool):
+    chain = []
+    while pool is not None:
+        chain.append(pool)
+        pool = POOLS.get(pool.parent)
+    return chain
+
+
+def admission_controlled(view):
+    """Run the view inside a slot of its endpoint's pool (innermost decorator)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        pool = POOLS.get(ADMISSION_ENDPOINTS.get(request.endpoint)) if ADMISSION_CONTROL else None
+        if pool is None or request.method == "OPTIONS":
+            return view(*args, **kwargs)
+        start = time.perf_counter()
+        held = []
+        try:
+            for slot in _pool_chain(pool):
+                rejected = slot.acquire()
+                if rejected:
+                    inc("admission_rejected_total",
+                        {"pool": slot.name, "endpoint": request.endpoint, "reason": rejected})
+                    response = jsonify({"error": "Server is busy, please retry shortly"})
+                    response.status_code = 503
+                    response.headers["Retry-After"] = str(slot.retry_after)
+                    return response
+                held.append(slot)
+            observe("admission_wait_seconds", time.perf_counter() - start, {"pool": pool.name})
+            return view(*args, **kwargs)
+        finally:
+            for slot in reversed(held):
+                slot.release()
+    wrapper.admission_controlled = True
+    return wrapper
+
+
+def init_app(app):
+    """Warn about listed endpoints whose view lacks @admission_controlled."""
+    if not ADMISSION_CONTROL:
+        return
+    for endpoint in ADMISSION_ENDPOINTS:
+        view = app.view_functions.get(endpoint)
+        if view is not None and not getattr(view, "admission_controlled", False):
+            print(f"Admission control: {endpoint} is not decorated with @admission_controlled")
@@ -0,0 +1,242 @@
+import os
+import threading
+import time
+
+from config import resolve_csv_path
+from utils.metrics import observe_dataset_load
+
+# The AIS frame is loaded at most once per process and treated as read-only.
+# Under gunicorn with preload_app the master loads it before forking, so the
+# workers share the same memory pages copy-on-write instead of each parsing
+# the CSV again on every request.
+_frame = None
+_lock = threading.Lock()
+
+REC_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Column dtypes of the in-memory frame. Repetitive strings are categoricals,
+# positions and speeds float32 (about 7 significant digits, well under a
+# metre for coordinates), headings and dimensions nullable Int32, and
+# rec_time is parsed once into datetime64. Unlisted columns keep the pandas
+# default.
+AIS_SCHEMA = {
+    "mmsi": "Int64",
+    "imo": "Int64",
+    "nav_status": "category",
+    "ship_name": "category",
+    "call_sign": "category",
+    "ship_type": "category",
+    "destination": "category",
+    "eta": "category",
+    "source": "category",
+    "country": "category",
+    "flag_name": "category",
+    "latitude": "float32",
+    "longitude": "float32",
+    "sog": "float32",
+    "cog": "float32",
+    "rot": "float32",
+    "draught": "float32",
+    "beam": "float32",
+    "length": "float32",
+    "true_heading": "Int32",
+    "dimbow": "Int32",
+    "dimstern": "Int32",
+    "dimport": "Int32",
+    "dimstarboard": "Int32",
+    "rec_time": "datetime64[ns]",
+}
+
+# float32 columns widened back to float64 are rounded to what float32 can
+# actually hold, so 12.7 is reported as 12.7 rather than 12.699999809265137.
+# Five decimals of a degree is about a metre; speeds, courses and dimensions
+# are reported by AIS with one decimal.
+FLOAT32_DECIMALS = {"latitude": 5, "longitude": 5}
+DEFAULT_FLOAT32_DECIMALS = 3
+
+
+def _coerce_column(series, dtype):
+    import numpy as np
+    import pandas as pd
+
+    if dtype == "category":
+        return series.astype("category")
+    if dtype.startswith("datetime64"):
+        return pd.to_datetime(series, format=REC_TIME_FORMAT, errors="coerce")
+    values = series if pd.api.types.is_numeric_dtype(series) else pd.to_numeric(series, errors="coerce")
+    if dtype.startswith("float"):
+        return values.astype(dtype)
+    # Nullable integers: junk, fractions and out-of-range values become <NA>.
+    info = np.iinfo(dtype.lower())
+    values = values.where(values.between(info.min, info.max) & (values % 1 == 0))
+    return values.astype(dtype)
+
+
+def read_ais_csv(csv_path, **kwargs):
+    """Read an AIS CSV into the AIS_SCHEMA dtypes."""
+    import pandas as pd
+
+    # Strings go straight to categoricals so the parser never materialises a
+    # full column of Python strings. Numbers are parsed with the fast default
+    # dtypes and downcast afterwards; asking read_csv for nullable ints
+    # directly is several times slower.
+    categories = {col: dtype for col, dtype in AIS_SCHEMA.items() if dtype == "category"}
+    reader = pd.read_csv(csv_path, dtype=categories, **kwargs)
+    if kwargs.get("chunksize"):
+        return (coerce_ais_frame(chunk) for chunk in reader)
+    return coerce_ais_frame(reader)
+
+
+def coerce_ais_frame(frame):
+    """Convert the non-categorical AIS_SCHEMA columns of a parsed frame in place."""
+    for col, dtype in AIS_SCHEMA.items():
+        if col in frame.columns and dtype != "category":
+            frame[col] = _coerce_column(frame[col], dtype)
+    return frame
+
+
+def frame_memory_bytes(frame):
+    return int(frame.memory_usage(deep=True).sum())
+
+
+def load_ais_frame():
+    """Load the AIS CSV into the process-wide frame (no-op if already loaded)."""
+    global _frame
+    if _frame is not None:
+        return _frame
+    with _lock:
+        if _frame is None:
+            from utils.startup import current_rss_bytes, trim_heap
+
+            csv_path = resolve_csv_path()
+            if not os.path.exists(csv_path):
+                raise FileNotFoundError(f"CSV file not found at: {csv_path}")
+            rss_before = current_rss_bytes()
+            start = time.perf_counter()
+            _frame = read_ais_csv(csv_path)
+            observe_dataset_load("csv", time.perf_counter() - start, len(_frame))
+            # The parser's scratch buffers are freed but stay in the heap
+            # otherwise, and would be inherited by every forked worker.
+            trim_heap()
+            print(f"AIS dataset loaded: {len(_frame)} rows from {csv_path} "
+                  f"({frame_memory_bytes(_frame) / 2**20:.1f} MiB in memory, "
+                  f"RSS +{(current_rss_bytes() - rss_before) / 2**20:.1f} MiB)")
+    return _frame
+
+
+def get_ais_frame():
+    """
+    Return the shared AIS frame (dtypes per AIS_SCHEMA). Callers must not
+    modify it in place; take ``frame.copy(deep=False)`` before assigning
+    new columns.
+    """
+    return load_ais_frame()
+
+
+def preload_ais_frame():
+    """Best-effort preload used by the WSGI master before forking workers."""
+    from utils.snapshot import snapshot_is_fresh
+
+    if snapshot_is_fresh():
+        print("Parquet snapshot is current; readers memory-map it instead of preloading the CSV.")
+        return False
+    try:
+        load_ais_frame()
+        return True
+    except FileNotFoundError as e:
+        print(f"Skipping AIS dataset preload: {e}")
+        return False
+
+
+def as_float64(series):
+    """Widen a float32 column for arithmetic or output, dropping float32 noise."""
+    return series.astype("float64").round(FLOAT32_DECIMALS.get(series.name, DEFAULT_FLOAT32_DECIMALS))
+
+
+def json_float(value, column=None):
+    """One value of a float32 column as a plain JSON float (None for NaN)."""
+    if value is None or value != value:
+        return None
+    return round(float(value), FLOAT32_DECIMALS.get(column, DEFAULT_FLOAT32_DECIMALS))
+
+
+def frame_records(frame):
+    """Rows of a (small) AIS frame as JSON-serialisable dicts."""
+    import pandas as pd
+
+    out = {}
+    for col in frame.columns:
+        series = frame[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            series = series.dt.strftime(REC_TIME_FORMAT)
+        elif pd.api.types.is_float_dtype(series):
+            series = as_float64(series)
+        out[col] = series.astype(object).where(series.notna(), None)
+    return pd.DataFrame(out, index=frame.index).to_dict("records")
+
+
+_OPS = {
+    "==": lambda s, v: s == v,
+    "!=": lambda s, v: s != v,
+    "<": lambda s, v: s < v,
+    "<=": lambda s, v: s <= v,
+    ">": lambda s, v: s > v,
+    ">=": lambda s, v: s >= v,
+    "in": lambda s, v: s.isin(v),
+}
+
+
+def _filter_mask(frame, filters):
+    if filters and isinstance(filters[0], tuple):
+        filters = [filters]
+    mask = None
+    for conjunction in filters:
+        part = None
+        for col, op, value in conjunction:
+            term = _OPS[op](frame[col], value)
+            part = term if part is None else part & term
+        mask = part if mask is None else mask | part
+    return mask.fillna(False).astype(bool)
+
+
+def query_ais(columns=None, start=None, end=None, filters=None, limit=None):
+    """
+    Rows and columns of the AIS dataset, as a new frame the caller may modify.
+
+    ``start``/``end`` bound rec_time by day (inclusive, YYYY-MM-DD); ``filters``
+    are (column, op, value) tuples ANDed together, or a list of such lists
+    ORed together; ``limit`` keeps only the first rows. Served from the in-memory CSV frame if this process
+    already holds it, else from the memory-mapped Parquet snapshot when there
+    is a fresh one (only the needed partitions, columns and row groups are
+    read), else by loading the CSV frame.
+    """
+    import pandas as pd
+    from utils.snapshot import read_snapshot
+
+    if _frame is None:
+        frame = read_snapshot(columns, start, end, filters, limit)
+        if frame is not None:
+            return frame
+
+    frame = get_ais_frame()
+    mask = pd.Series(True, index=frame.index)
+    if start is not None:
+        mask &= frame["rec_time"] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= frame["rec_time"] < pd.Timestamp(end) + pd.Timedelta(days=1)
+    if filters:
+        mask &= _filter_mask(frame, filters)
+    frame = frame if columns is None else frame[columns]
+    frame = frame[mask]
+    if limit is not None:
+        frame = frame.head(limit)
+    return frame.reset_index(drop=True)
+
+
+def parse_int(value):
+    """An identifier such as an mmsi from a request, as int (None if not numeric)."""
+    try:
+        number = int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    return number if -2**63 <= number < 2**63 else None
@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+# Generation counter of the AIS data. Ingest bumps it after the table (and
+# the Parquet snapshot) has been rewritten; everything derived from the data
+# (HTTP ETags, result caches) is keyed on it instead of on wall-clock time.
+#
+# Each process re-reads the counter at most every DATASET_VERSION_TTL
+# seconds, so a request normally costs no SQL to learn the version. Other
+# workers see a bump within that window.
+DATASET_VERSION_TTL = float(os.getenv("DATASET_VERSION_TTL", 2.0))
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS dataset_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version BIGINT NOT NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    INSERT INTO dataset_version (id, version) VALUES (1, 1) ON CONFLICT (id) DO NOTHING;
+"""
+
+_lock = threading.Lock()
+_cached = {"version": None, "checked_at": 0.0}
+
+
+def ensure_version_table(conn):
+    """Create the counter row if missing (idempotent)."""
+    conn.execute(text(CREATE_TABLE_SQL))
+
+
+def bump_dataset_version(engine):
+    """Increment the generation after an ingest and return the new value."""
+    with engine.begin() as conn:
+        ensure_version_table(conn)
+        version = conn.execute(text("""
+            UPDATE dataset_version
+            SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE id = 1
+            RETURNING version
+        """)).scalar()
+    with _lock:
+        _cached.update(version=version, checked_at=time.monotonic())
+    print(f"Dataset version is now {version}")
+    return version
+
+
+def current_dataset_version():
+    """
+    The current generation (cached for DATASET_VERSION_TTL seconds), or None
+    when it cannot be read, e.g. before the table has been created.
+    """
+    now = time.monotonic()
+    if _cached["version"] is not None and now - _cached["checked_at"] < DATASET_VERSION_TTL:
+        return _cached["version"]
+    from config import db
+
+    try:
+        with db.engine.connect() as conn:
+            version = conn.execute(text("SELECT version FROM dataset_version WHERE id = 1")).scalar()
+    except Exception:
+        return None
+    with _lock:
+        _cached.update(version=version, checked_at=now)
+    return version
@@ -1,13 +1,21 @@
 
 import sys
 import os
+import time
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-import pandas as pd
 from sqlalchemy import create_engine, text
-from sqlalchemy.exc import OperationalError
 from config import DATABASE_URL
-from models import AISData, db
+from utils.activity_cube import build_activity_cube
+from utils.dataset_version import bump_dataset_version
+from utils.fleet_stats import FleetStats, build_fleet_stats
+from utils.metrics import observe_dataset_load
+from utils.partitions import drop_expired_partitions, ensure_ais_table, ensure_partitions, parse_rec_ts
+from utils.port_calls import build_port_calls
+from utils.sampling import build_sample
+from utils.sketches import build_sketches
+from utils.snapshot import ensure_snapshot
+from utils.voyages import build_voyages
 
 
 # Parse database name from DATABASE_URL
@@ -36,7 +44,32 @@ def ensure_database_exists():
 
 engine = create_engine(DATABASE_URL)
 
+# Tables computed from ais_data after a load, and by startup when one is
+# still empty. A failure only disables the feature that reads the table.
+DERIVED_TABLES = [
+    # (table, label, builder)
+    ("vessel_sketches", "Vessel sketches", build_sketches),  # ?approx=true counts
+    ("ais_sample", "Sample", build_sample),                  # ?sample= queries, random_seed
+    ("fleet_stats", "Fleet stats", build_fleet_stats),       # KPI tiles
+    ("activity_cube", "Activity cube", build_activity_cube), # time_window_intensity
+    ("voyages", "Voyages", build_voyages),                   # per-voyage routes and arrivals
+    ("port_calls", "Port calls", build_port_calls),          # arrivals per port
+]
+
+
+def build_derived_tables(engine, tables=None):
+    """Rebuild the derived tables (all, or the ones named in ``tables``)."""
+    for table, label, build in DERIVED_TABLES:
+        if tables is not None and table not in tables:
+            continue
+        try:
+            build(engine)
+        except Exception as e:
+            print(f"{label} failed: {e}")
+
+
 def load_csv_to_db(csv_path, app=None):
+    import pandas as pd
     from sqlalchemy import inspect
     from flask import current_app
     # Use passed app or current_app context
@@ -48,29 +81,56 @@ def load_csv_to_db(csv_path, app=None):
     try:
         inspector = inspect(engine)
         print("Existing tables before loading:", inspector.get_table_names())
-        if "ais_data" not in inspector.get_table_names():
-            print("Creating ais_data table...")
-            db.create_all()
-        else:
-            print("ais_data table already exists.")
+        with engine.begin() as conn:
+            ensure_ais_table(conn)
 
-        # Clear ais_data table before loading new data
+        # Clear ais_data table before loading new data (all partitions at once)
         print("Deleting existing rows from ais_data table...")
-        db.session.query(AISData).delete()
-        db.session.commit()
+        with engine.begin() as conn:
+            conn.execute(text("TRUNCATE ais_data"))
         print("Existing rows deleted.")
 
         print(f"Loading CSV from: {csv_path}")
         try:
             chunksize = 100000
             total_rows = 0
+            fleet_stats = FleetStats()
+            start = time.perf_counter()
             for chunk in pd.read_csv(csv_path, chunksize=chunksize):
                 print(f"Loaded chunk with {len(chunk)} rows. Columns: {list(chunk.columns)}")
-                chunk.to_sql("ais_data", engine, if_exists="append", index=False)
+                chunk["rec_ts"] = parse_rec_ts(chunk["rec_time"])
+                with engine.begin() as conn:
+                    if chunk["rec_ts"].notna().any():
+                        ensure_partitions(conn, chunk["rec_ts"].min(), chunk["rec_ts"].max())
+                    chunk.to_sql("ais_data", conn, if_exists="append", index=False)
+                fleet_stats.add(chunk)
                 total_rows += len(chunk)
+            observe_dataset_load("ingest", time.perf_counter() - start, total_rows)
             print(f"Data Loaded Successfully. Total rows loaded: {total_rows}")
         except Exception as e:
             print(f"Error loading CSV: {e}")
+            # ais_data was truncated and is now empty or partly loaded: the
+            # derived tables and every cached response describe old data.
+            build_derived_tables(engine)
+            bump_dataset_version(engine)
+            return
+
+        with engine.begin() as conn:
+            expired = drop_expired_partitions(conn)
+            conn.execute(text("ANALYZE ais_data"))
+            # Counted during the load, unless retention just dropped some of it.
+            if not expired:
+                fleet_stats.save(conn)
+        build_derived_tables(engine, None if expired else [t for t, _, _ in DERIVED_TABLES if t != "fleet_stats"])
+
+        # Columnar copy for the pandas endpoints; the table load doesn't depend on it.
+        try:
+            ensure_snapshot(csv_path)
+        except Exception as e:
+            print(f"Error writing Parquet snapshot: {e}")
+
+        # New generation: ETags and cached results of the old data are now stale.
+        bump_dataset_version(engine)
     finally:
         if ctx is not None:
             ctx.pop()
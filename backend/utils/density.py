@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.dataset import as_float64, query_ais
+from utils.dataset_version import current_dataset_version
+
+# Traffic density: AIS positions binned into a grid of square lat/lon cells.
+# Each day window is binned once, at DENSITY_BASE_DEG, into a sparse
+# histogram (occupied cell id -> position count). The resolutions served are
+# whole multiples of that base cell, so a coarser grid is a sum over blocks
+# of fine cells: once a window has been binned, every further zoom level
+# costs a pass over its occupied cells instead of over the positions. The
+# fine histograms of the last DENSITY_CACHE_WINDOWS windows are kept per
+# dataset version.
+DENSITY_BASE_DEG = 0.05
+RESOLUTIONS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)  # degrees, coarse levels last
+DENSITY_CACHE_WINDOWS = int(os.getenv("DENSITY_CACHE_WINDOWS", 4))
+DENSITY_MAX_CELLS = int(os.getenv("DENSITY_MAX_CELLS", 100_000))
+
+COORD_UNITS = 100_000
+BASE_UNITS = int(round(DENSITY_BASE_DEG * COORD_UNITS))
+BASE_ROWS = int(round(180 / DENSITY_BASE_DEG))
+BASE_COLS = int(round(360 / DENSITY_BASE_DEG))
+
+_lock = threading.Lock()
+_fine_grids = OrderedDict()  # (version, start, end) -> (cell ids, counts)
+
+
+def bin_positions(lat, lon):
+    """(sorted fine cell ids, position counts) of float64 lat/lon arrays."""
+    import numpy as np
+    # Same filter as the ship map: valid coordinates, no 0/0 placeholders.
+    valid = ((lat >= -90) & (lat <= 90) & (lon >= -180) & (lon <= 180)
+             & (lat != 0) & (lon != 0))
+    # Binned in integer units of 1e-5 degrees (the precision positions are
+    # stored with), so points on a cell edge land in the same cell every time.
+    lat_units = np.rint((lat[valid] + 90) * COORD_UNITS).astype(np.int64)
+    lon_units = np.rint((lon[valid] + 180) * COORD_UNITS).astype(np.int64)
+    rows = np.minimum(lat_units // BASE_UNITS, BASE_ROWS - 1)
+    cols = np.minimum(lon_units // BASE_UNITS, BASE_COLS - 1)
+    ids, counts = np.unique(rows * BASE_COLS + cols, return_counts=True)
+    return ids, counts.astype(np.int64)
+
+
+def fine_grid(start=None, end=None):
+    """The base-resolution histogram of rec_time days start..end (inclusive)."""
+    key = (current_dataset_version(), start, end)
+    with _lock:
+        if key in _fine_grids:
+            _fine_grids.move_to_end(key)
+            return _fine_grids[key]
+    began = time.perf_counter()
+    df = query_ais(["latitude", "longitude"], start=start, end=end)
+    grid = bin_positions(as_float64(df["latitude"]).to_numpy(), as_float64(df["longitude"]).to_numpy())
+    print(f"Density grid {start}..{end}: {len(grid[0])} cells from {len(df)} positions "
+          f"in {time.perf_counter() - began:.2f}s")
+    with _lock:
+        _fine_grids[key] = grid
+        while len(_fine_grids) > DENSITY_CACHE_WINDOWS:
+            _fine_grids.popitem(last=False)
+    return grid
+
+
+def coarsen(ids, counts, resolution):
+    """(rows, cols, counts) of the grid at ``resolution`` from a fine histogram."""
+    import numpy as np
+    factor = int(round(resolution / DENSITY_BASE_DEG))
+    rows, cols = np.divmod(ids, BASE_COLS)
+    if factor == 1:
+        return rows, cols, counts
+    cols_per_row = -(-BASE_COLS // factor)
+    coarse, inverse = np.unique((rows // factor) * cols_per_row + cols // factor, return_inverse=True)
+    sums = np.bincount(inverse, weights=counts).astype(np.int64)
+    return coarse // cols_per_row, coarse % cols_per_row, sums
+
+
+def density_grid(resolution, start=None, end=None, bbox=None):
+    """
+    Density cells at ``resolution`` as [[south, west, positions], ...] plus
+    totals. ``bbox`` (min_lon, min_lat, max_lon, max_lat) keeps the cells
+    that overlap it. Raises ValueError when more than DENSITY_MAX_CELLS
+    cells would be returned.
+    """
+    rows, cols, counts = coarsen(*fine_grid(start, end), resolution)
+    south = (rows * resolution - 90).round(6)
+    west = (cols * resolution - 180).round(6)
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        inside = ((south < max_lat) & (south + resolution > min_lat)
+                  & (west < max_lon) & (west + resolution > min_lon))
+        south, west, counts = south[inside], west[inside], counts[inside]
+    if len(counts) > DENSITY_MAX_CELLS:
+        raise ValueError(f"{len(counts)} cells at {resolution} degrees; "
+                         f"use a coarser resolution or a smaller bbox")
+    finer = [r for r in RESOLUTIONS if r < resolution]
+    return {
+        "resolution": resolution,
+        "start": start,
+        "end": end,
+        "bbox": list(bbox) if bbox is not None else None,
+        "cells": [list(cell) for cell in zip(south.tolist(), west.tolist(), counts.tolist())],
+        "total_positions": int(counts.sum()),
+        "max_count": int(counts.max()) if len(counts) else 0,
+        # Next level for progressive refinement, None at the finest
+        "refine": finer[-1] if finer else None,
+    }
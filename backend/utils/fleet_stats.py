@@ -0,0 +1,135 @@
+import time
+
+from sqlalchemy import text
+
+# Fleet-level counters for KPI tiles, kept in two small tables:
+#
+#   fleet_stats     one row: distinct vessels and records with a rec_time
+#   fleet_monthly   per month of rec_ts: distinct vessels and records
+#
+# The loader feeds every CSV chunk to FleetStats as it inserts it, so the
+# counters come out of the ingest pass itself; build_fleet_stats()
+# recomputes them from ais_data when there was no load (startup on an
+# existing table, retention). Readers get everything in one statement.
+CREATE_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS fleet_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total_vessels BIGINT NOT NULL,
+        total_records BIGINT NOT NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS fleet_monthly (
+        month DATE PRIMARY KEY,
+        vessels BIGINT NOT NULL,
+        records BIGINT NOT NULL
+    );
+"""
+
+SAVE_TOTALS_SQL = """
+    INSERT INTO fleet_stats (id, total_vessels, total_records) VALUES (1, :vessels, :records)
+    ON CONFLICT (id) DO UPDATE
+    SET total_vessels = EXCLUDED.total_vessels, total_records = EXCLUDED.total_records,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+
+class FleetStats:
+    """Counters accumulated chunk by chunk while a CSV is loaded."""
+
+    def __init__(self):
+        import numpy as np
+        self.vessels = np.empty(0, dtype=np.int64)  # sorted distinct mmsi
+        self.records = 0
+        self.monthly = {}  # first day of month -> [sorted distinct mmsi, records]
+
+    def add(self, chunk):
+        """Count a chunk with rec_time and a parsed rec_ts column."""
+        import numpy as np
+        timed = chunk[chunk["rec_time"].notna() & (chunk["rec_time"].astype(str) != "")]
+        self.records += len(timed)
+        self.vessels = np.union1d(self.vessels, timed["mmsi"].dropna().to_numpy(dtype=np.int64))
+
+        dated = chunk[chunk["rec_ts"].notna()]
+        for month, group in dated.groupby(dated["rec_ts"].dt.to_period("M")):
+            entry = self.monthly.setdefault(month.start_time.date(), [np.empty(0, dtype=np.int64), 0])
+            entry[0] = np.union1d(entry[0], group["mmsi"].dropna().to_numpy(dtype=np.int64))
+            entry[1] += len(group)
+
+    def save(self, conn):
+        ensure_fleet_stats_tables(conn)
+        conn.execute(text(SAVE_TOTALS_SQL), {"vessels": len(self.vessels), "records": self.records})
+        conn.execute(text("DELETE FROM fleet_monthly"))
+        if self.monthly:
+            conn.execute(text("INSERT INTO fleet_monthly (month, vessels, records) VALUES (:month, :vessels, :records)"),
+                         [{"month": month, "vessels": len(mmsi), "records": records}
+                          for month, (mmsi, records) in sorted(self.monthly.items())])
+        print(f"Fleet stats: {len(self.vessels)} vessels, {self.records} records, {len(self.monthly)} months")
+
+
+def ensure_fleet_stats_tables(conn):
+    conn.execute(text(CREATE_TABLES_SQL))
+
+
+def build_fleet_stats(engine):
+    """Recompute the counters from ais_data (one pass each)."""
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        ensure_fleet_stats_tables(conn)
+        totals = conn.execute(text("""
+            SELECT COUNT(DISTINCT mmsi), COUNT(*)
+            FROM ais_data
+            WHERE rec_time IS NOT NULL AND rec_time != ''
+        """)).fetchone()
+        conn.execute(text(SAVE_TOTALS_SQL), {"vessels": totals[0], "records": totals[1]})
+        conn.execute(text("DELETE FROM fleet_monthly"))
+        conn.execute(text("""
+            INSERT INTO fleet_monthly (month, vessels, records)
+            SELECT CAST(DATE_TRUNC('month', rec_ts) AS DATE), COUNT(DISTINCT mmsi), COUNT(*)
+            FROM ais_data
+            WHERE rec_ts IS NOT NULL
+            GROUP BY 1
+        """))
+    print(f"Fleet stats rebuilt in {time.perf_counter() - start:.2f}s")
+
+
+def monthly_total(session):
+    """monthly_ship_total's payload in one statement, or None without a snapshot."""
+    row = session.execute(text("""
+        SELECT s.total_vessels,
+               s.total_records,
+               COALESCE(m.vessels, 0) AS ships_this_month,
+               TO_CHAR(CURRENT_DATE, 'Month YYYY') AS current_month,
+               CURRENT_TIMESTAMP AS now
+        FROM fleet_stats s
+        LEFT JOIN fleet_monthly m ON m.month = CAST(DATE_TRUNC('month', LOCALTIMESTAMP) AS DATE)
+        WHERE s.id = 1
+    """)).mappings().first()
+    if row is None:
+        return None
+    return {
+        "ships_this_month": row["ships_this_month"],
+        "total_ships_in_db": row["total_vessels"],
+        "total_records": row["total_records"],
+        "month": row["current_month"].strip(),
+        "timestamp": str(row["now"]),
+    }
+
+
+def total_records(session):
+    """Records with a rec_time from the counters, or None without a snapshot."""
+    return session.execute(text("SELECT total_records FROM fleet_stats WHERE id = 1")).scalar()
+
+
+def fleet_overview(session):
+    """Totals and the per-month series, or None without a snapshot."""
+    totals = session.execute(text(
+        "SELECT total_vessels, total_records, updated_at FROM fleet_stats WHERE id = 1")).fetchone()
+    if totals is None:
+        return None
+    monthly = session.execute(text("SELECT month, vessels, records FROM fleet_monthly ORDER BY month")).fetchall()
+    return {
+        "total_vessels": totals[0],
+        "total_records": totals[1],
+        "updated_at": str(totals[2]),
+        "monthly": [{"month": f"{m:%Y-%m}", "vessels": v, "records": r} for m, v, r in monthly],
+    }
@@ -0,0 +1,55 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import make_response, request
+
+from utils.dataset_version import current_dataset_version
+from utils.metrics import describe, inc
+
+# Conditional GETs for read-only endpoints. A response's ETag is the dataset
+# version, the current UTC date and a hash of the URL, so it changes when
+# ingest runs (and daily, for the endpoints that report "this month").
+# A request whose If-None-Match still matches gets a 304 before the view runs
+# (no SQL, no pandas). Cache-Control lets browsers and the nginx proxy cache
+# reuse a response for HTTP_CACHE_MAX_AGE seconds and then revalidate.
+#
+# The version is read before the view runs, so a response computed while an
+# ingest finishes can carry the older tag (and is refetched next time), but
+# never the other way round.
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE", "true").lower() == "true"
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", 60))
+
+describe("http_not_modified_total", "counter", "Conditional GETs answered with 304")
+
+
+def request_etag(version):
+    """Tag (and result-cache key) of the current request's response."""
+    digest = hashlib.sha1(request.full_path.encode()).hexdigest()[:16]
+    return f"{version}-{datetime.now(timezone.utc):%Y%m%d}-{digest}"
+
+
+def cache_by_dataset_version(view):
+    """Serve ETag/Cache-Control for a GET whose result only depends on the URL and the data."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not HTTP_CACHE_ENABLED or request.method not in ("GET", "HEAD"):
+            return view(*args, **kwargs)
+        version = current_dataset_version()
+        if version is None:
+            return view(*args, **kwargs)
+
+        etag = request_etag(version)
+        if request.if_none_match.contains(etag):
+            response = make_response("", 304)
+            inc("http_not_modified_total", {"endpoint": request.endpoint})
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = HTTP_CACHE_MAX_AGE
+        return response
+    return wrapper
@@ -0,0 +1,332 @@
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# In-process metrics registry rendered in Prometheus text format on /metrics.
+#
+# With several gunicorn workers each process only sees its own requests. When
+# METRICS_DIR is set, every process periodically writes a snapshot of its
+# registry there and /metrics merges all snapshots, so a scrape of any worker
+# reports totals for the whole server (like prometheus_client's multiprocess
+# mode, without the dependency). A forked worker starts from an empty
+# registry (reset_after_fork); the master writes its own snapshot once, for
+# what it recorded while preloading. Snapshots of exited processes are folded
+# into a single retired.json, so recycled workers keep their counts without
+# the directory growing.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+METRICS_DIR = os.getenv("METRICS_DIR")
+SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", 1.0))
+
+_HELP = {
+    "http_request_duration_seconds": ("histogram", "Request latency by endpoint"),
+    "http_response_size_bytes": ("histogram", "Response body size by endpoint"),
+    "http_request_sql_queries": ("histogram", "SQL statements executed per request"),
+    "http_request_sql_seconds": ("histogram", "Time spent in SQL per request"),
+    "sql_queries_total": ("counter", "SQL statements executed"),
+    "sql_query_seconds_total": ("counter", "Time spent executing SQL"),
+    "dataset_load_seconds": ("histogram", "Time to load AIS data with pandas"),
+    "dataset_load_rows_total": ("counter", "Rows loaded with pandas"),
+}
+
+_lock = threading.Lock()
+_collectors = []  # fn(merged counters) -> [(name, labels dict, value)], rendered as gauges
+_counters = {}    # (name, labels) -> float
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_buckets = {}     # name -> bucket bounds
+_last_snapshot = 0.0
+
+
+def describe(name, kind, text):
+    """Register HELP/TYPE metadata for a metric defined in another module."""
+    _HELP[name] = (kind, text)
+
+
+def add_collector(fn):
+    """Register ``fn(counters)`` computing gauges (e.g. ratios) from the merged counters at scrape time."""
+    _collectors.append(fn)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, labels=None, value=1.0):
+    key = _key(name, labels or {})
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def observe(name, value, labels=None, buckets=LATENCY_BUCKETS):
+    key = _key(name, labels or {})
+    with _lock:
+        _buckets.setdefault(name, buckets)
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        series[bisect_left(buckets, value)] += 1
+        series[-1] += value
+
+
+def observe_dataset_load(source, seconds, rows):
+    """Record a pandas load (CSV read, chunked ingest, ...)."""
+    observe("dataset_load_seconds", seconds, {"source": source})
+    inc("dataset_load_rows_total", {"source": source}, rows)
+
+
+# ---- SQL timing (every engine in the process) ----
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    # Read by listeners registered after this one (e.g. the slow-query log).
+    conn.info["last_query_seconds"] = elapsed
+    endpoint = "-"
+    if has_request_context():
+        endpoint = request.endpoint or "-"
+        g.sql_queries = g.get("sql_queries", 0) + 1
+        g.sql_seconds = g.get("sql_seconds", 0.0) + elapsed
+    inc("sql_queries_total", {"endpoint": endpoint})
+    inc("sql_query_seconds_total", {"endpoint": endpoint}, elapsed)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # after_cursor_execute is skipped for failed statements; drop their start time.
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+# ---- Flask request hooks ----
+
+def _record_request(status, size):
+    elapsed = time.perf_counter() - g.metrics_start
+    labels = {
+        "blueprint": request.blueprint or "-",
+        "endpoint": request.endpoint or "-",
+        "method": request.method,
+        "status": str(status),
+    }
+    observe("http_request_duration_seconds", elapsed, labels)
+    endpoint_labels = {"endpoint": labels["endpoint"]}
+    if size is not None:
+        observe("http_response_size_bytes", size, endpoint_labels, SIZE_BUCKETS)
+    observe("http_request_sql_queries", g.get("sql_queries", 0), endpoint_labels, COUNT_BUCKETS)
+    observe("http_request_sql_seconds", g.get("sql_seconds", 0.0), endpoint_labels)
+    _maybe_write_snapshot()
+
+
+def init_app(app):
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_response(response):
+        if "metrics_start" in g:
+            # Streamed responses have no length up front; they are timed but not sized.
+            # (calculate_content_length() would buffer a generator body.)
+            size = None if response.is_streamed else response.calculate_content_length()
+            _record_request(response.status_code, size)
+            g.metrics_recorded = True
+        return response
+
+    @app.teardown_request
+    def record_exception(exc):
+        # Unhandled exceptions skip after_request; count them as 500s.
+        if "metrics_start" in g and not g.get("metrics_recorded"):
+            _record_request(500, None)
+
+
+# ---- Snapshots and exposition ----
+
+def _snapshot():
+    with _lock:
+        return {
+            "counters": [[n, list(l), v] for (n, l), v in _counters.items()],
+            "histograms": [[n, list(l), list(s)] for (n, l), s in _histograms.items()],
+            "buckets": {n: list(b) for n, b in _buckets.items()},
+        }
+
+
+def _maybe_write_snapshot(force=False):
+    global _last_snapshot
+    if not METRICS_DIR:
+        return
+    now = time.time()
+    if not force and now - _last_snapshot < SNAPSHOT_INTERVAL:
+        return
+    _last_snapshot = now
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(_snapshot(), f)
+    os.replace(tmp_path, path)
+
+
+def write_snapshot():
+    """Write this process's snapshot now (the gunicorn master, after preloading)."""
+    _maybe_write_snapshot(force=True)
+
+
+def reset_after_fork():
+    """
+    Start a forked worker with an empty registry: whatever the parent had
+    recorded is in the parent's own snapshot. A leftover snapshot under this
+    worker's pid belongs to an exited process and is retired first.
+    """
+    global _last_snapshot
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _last_snapshot = 0.0
+    if METRICS_DIR:
+        _retire_snapshots(own=True)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _retire_snapshots(own=False):
+    """Fold the snapshots of exited processes into retired.json."""
+    import fcntl
+
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    with open(os.path.join(METRICS_DIR, "retire.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead = []
+        for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+            name = os.path.basename(path)[:-len(".json")]
+            if name.isdigit() and ((own and int(name) == os.getpid()) or not _pid_alive(int(name))):
+                dead.append(path)
+        if not dead:
+            return
+        retired_path = os.path.join(METRICS_DIR, "retired.json")
+        snapshots = [s for s in map(_read_snapshot, [retired_path] + dead) if s is not None]
+        tmp_path = f"{retired_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(_combine(snapshots), f)
+        os.replace(tmp_path, retired_path)
+        for path in dead:
+            os.remove(path)
+
+
+def _merged():
+    if not METRICS_DIR:
+        return [_snapshot()]
+    _maybe_write_snapshot(force=True)
+    _retire_snapshots()
+    return [s for s in map(_read_snapshot, glob.glob(os.path.join(METRICS_DIR, "*.json"))) if s is not None]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _sum_series(snapshots):
+    counters, histograms, buckets = {}, {}, {}
+    for snap in snapshots:
+        buckets.update(snap["buckets"])
+        for name, labels, value in snap["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0.0) + value
+        for name, labels, series in snap["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            if key in histograms:
+                histograms[key] = [a + b for a, b in zip(histograms[key], series)]
+            else:
+                histograms[key] = list(series)
+    return counters, histograms, buckets
+
+
+def _combine(snapshots):
+    """One snapshot holding the sums of ``snapshots``."""
+    counters, histograms, buckets = _sum_series(snapshots)
+    return {
+        "counters": [[n, [list(p) for p in l], v] for (n, l), v in counters.items()],
+        "histograms": [[n, [list(p) for p in l], s] for (n, l), s in histograms.items()],
+        "buckets": buckets,
+    }
+
+
+def _merged_series():
+    return _sum_series(_merged())
+
+
+def merged_counters():
+    """Server-wide counters as {(name, labels tuple): value}."""
+    return _merged_series()[0]
+
+
+def render_prometheus():
+    counters, histograms, buckets = _merged_series()
+    lines = []
+    described = set()
+
+    def header(name):
+        if name not in described:
+            described.add(name)
+            kind, text = _HELP.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name)
+        lines.append(f"{name}{_fmt_labels(labels)} {value}")
+
+    for collector in _collectors:
+        for name, labels, value in collector(counters):
+            header(name)
+            lines.append(f"{name}{_fmt_labels(sorted(labels.items()))} {value}")
+
+    for (name, labels), series in sorted(histograms.items()):
+        header(name)
+        cumulative = 0
+        for bound, count in zip(buckets[name], series):
+            cumulative += count
+            lines.append(f"{name}_bucket{_fmt_labels(labels, ('le', bound))} {cumulative}")
+        total = cumulative + series[-2]
+        lines.append(f"{name}_bucket{_fmt_labels(labels, ('le', '+Inf'))} {total}")
+        lines.append(f"{name}_sum{_fmt_labels(labels)} {series[-1]}")
+        lines.append(f"{name}_count{_fmt_labels(labels)} {total}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,259 @@
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+# ais_data is range-partitioned on rec_ts, a TIMESTAMP copy of the rec_time
+# text column filled at ingest. Partitions cover one AIS_PARTITION_INTERVAL
+# each (day / week / month / year) and are named after their first day, e.g.
+# ais_data_p20250101. Rows without a parseable rec_time go to
+# ais_data_default.
+#
+# Ingest creates the partitions a chunk needs before inserting it. Queries
+# bounded on rec_ts only touch the matching partitions, and retention
+# (AIS_RETENTION_DAYS, off by default) drops whole partitions instead of
+# deleting rows.
+PARTITION_INTERVAL = os.getenv("AIS_PARTITION_INTERVAL", "month").lower()
+RETENTION_DAYS = int(os.getenv("AIS_RETENTION_DAYS", 0))
+PARENT = "ais_data"
+DEFAULT_PARTITION = "ais_data_default"
+
+# Columns of models.AISData, in table order.
+COLUMNS_SQL = """
+    id BIGSERIAL,
+    mmsi BIGINT,
+    nav_status VARCHAR(255),
+    rot DOUBLE PRECISION,
+    sog DOUBLE PRECISION,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    cog DOUBLE PRECISION,
+    true_heading INTEGER,
+    imo BIGINT,
+    ship_name VARCHAR(255),
+    call_sign VARCHAR(255),
+    ship_type VARCHAR(255),
+    draught DOUBLE PRECISION,
+    destination VARCHAR(255),
+    dimbow INTEGER,
+    dimstern INTEGER,
+    dimport INTEGER,
+    dimstarboard INTEGER,
+    eta VARCHAR(255),
+    beam DOUBLE PRECISION,
+    length DOUBLE PRECISION,
+    rec_time VARCHAR(255),
+    source VARCHAR(255),
+    country VARCHAR(255),
+    flag_name VARCHAR(255),
+    rec_ts TIMESTAMP
+"""
+
+# rec_time text -> rec_ts. ISO dates and timestamps ('YYYY-MM-DD[ T]HH:MM[:SS[.f]]')
+# are read as they are; with a UTC offset ('Z', '+02:00') they are converted
+# to naive UTC. Anything else is NULL, including well-formed but impossible
+# values ('2024-02-30', '25:00') and instants pandas cannot represent. The
+# loader (parse_rec_ts) and the migration of an older table (ais_rec_ts(),
+# created by REC_TS_FUNCTION_SQL) apply the same rule.
+_DATE = r"[0-9]{4}-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[01])"
+_TIME = r"([01][0-9]|2[0-3]):[0-5][0-9](:[0-5][0-9](\.[0-9]+)?)?"
+_OFFSET = r"(Z|[+-](0[0-9]|1[0-5])(:?[0-5][0-9])?)"
+_REC_TS_NAIVE = f"{_DATE}([ T]{_TIME})?"
+_REC_TS_AWARE = f"{_DATE}[ T]{_TIME}{_OFFSET}"
+# pd.Timestamp.min/max, to the microsecond
+_REC_TS_MIN, _REC_TS_MAX = "1677-09-21 00:12:43.145225", "2262-04-11 23:47:16.854775"
+REC_TS_FUNCTION_SQL = f"""
+    CREATE OR REPLACE FUNCTION ais_rec_ts(value TEXT) RETURNS TIMESTAMP
+    LANGUAGE plpgsql STABLE AS $$
+    DECLARE
+        ts TIMESTAMP;
+    BEGIN
+        IF value ~ '^{_REC_TS_NAIVE}$' THEN
+            ts := CAST(value AS TIMESTAMP);
+        ELSIF value ~ '^{_REC_TS_AWARE}$' THEN
+            ts := CAST(value AS TIMESTAMPTZ) AT TIME ZONE 'UTC';
+        END IF;
+        IF ts BETWEEN '{_REC_TS_MIN}' AND '{_REC_TS_MAX}' THEN
+            RETURN ts;
+        END IF;
+        RETURN NULL;
+    EXCEPTION WHEN data_exception THEN
+        RETURN NULL;  -- e.g. '2024-02-30'
+    END
+    $$
+"""
+REC_TS_SQL = "ais_rec_ts(rec_time)"
+
+
+def parse_rec_ts(rec_time):
+    """A rec_time column as naive (UTC) timestamps, NaT where REC_TS_SQL gives NULL."""
+    import pandas as pd
+    values = rec_time.astype("string")
+    naive = values.str.fullmatch(_REC_TS_NAIVE).fillna(False)
+    # Naive and offset values are parsed apart: in one ISO8601 pass pandas
+    # carries an offset over to the naive values that follow it.
+    parsed = pd.to_datetime(values.where(naive), format="ISO8601", errors="coerce")
+    rest = values[~naive].dropna()
+    aware = rest[rest.str.fullmatch(_REC_TS_AWARE)]
+    if not aware.empty:
+        parsed[aware.index] = pd.to_datetime(aware, format="ISO8601", errors="coerce",
+                                             utc=True).dt.tz_localize(None)
+    return parsed
+
+
+_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def partition_start(ts):
+    """First instant of the partition containing ``ts``."""
+    day = datetime(ts.year, ts.month, ts.day)
+    if PARTITION_INTERVAL == "day":
+        return day
+    if PARTITION_INTERVAL == "week":
+        return day - timedelta(days=day.weekday())
+    if PARTITION_INTERVAL == "year":
+        return datetime(ts.year, 1, 1)
+    return datetime(ts.year, ts.month, 1)
+
+
+def next_partition_start(start):
+    if PARTITION_INTERVAL == "day":
+        return start + timedelta(days=1)
+    if PARTITION_INTERVAL == "week":
+        return start + timedelta(days=7)
+    if PARTITION_INTERVAL == "year":
+        return datetime(start.year + 1, 1, 1)
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+
+def table_kind(conn):
+    """'p' (partitioned), 'r' (plain table) or None (missing) for ais_data."""
+    return conn.execute(text("""
+        SELECT c.relkind FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relname = :name AND n.nspname = current_schema()
+    """), {"name": PARENT}).scalar()
+
+
+def list_partitions(conn):
+    """[(name, lower, upper)] of the range partitions, oldest first (default partition excluded)."""
+    rows = conn.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:parent AS regclass)
+    """), {"parent": PARENT}).fetchall()
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND_RE.search(bound or "")
+        if match:
+            partitions.append((name, datetime.fromisoformat(match.group(1)), datetime.fromisoformat(match.group(2))))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def create_partitioned_table(conn):
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {PARENT} ({COLUMNS_SQL}) PARTITION BY RANGE (rec_ts)"))
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT"))
+
+
+def ensure_partitions(conn, first, last):
+    """Create the partitions covering ``first``..``last`` that don't exist yet."""
+    existing = [(lower, upper) for _, lower, upper in list_partitions(conn)]
+    created = []
+    start = partition_start(first)
+    while start <= last:
+        end = next_partition_start(start)
+        # Partitions from an earlier interval setting keep their bounds; only
+        # fill what they leave uncovered.
+        lower = start
+        for ex_lower, ex_upper in sorted(existing):
+            if ex_upper <= lower or ex_lower >= end:
+                continue
+            if ex_lower > lower:
+                created.append(_create_partition(conn, lower, ex_lower))
+            lower = max(lower, ex_upper)
+        if lower < end:
+            created.append(_create_partition(conn, lower, end))
+        start = end
+    return created
+
+
+def _create_partition(conn, lower, upper):
+    name = f"{PARENT}_p{lower:%Y%m%d}"
+    if lower.hour or lower.minute or lower.second:
+        name += f"{lower:%H%M%S}"
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT}
+        FOR VALUES FROM ('{lower.isoformat(" ")}') TO ('{upper.isoformat(" ")}')
+    """))
+    print(f"Created partition {name} [{lower:%Y-%m-%d}, {upper:%Y-%m-%d})")
+    return name
+
+
+def migrate_plain_table(conn):
+    """Move a pre-partitioning ais_data (plain heap) into the partitioned layout."""
+    legacy = f"{PARENT}_unpartitioned"
+    print("Migrating ais_data to a partitioned table...")
+    conn.execute(text(f"ALTER TABLE {PARENT} RENAME TO {legacy}"))
+    create_partitioned_table(conn)
+    conn.execute(text(REC_TS_FUNCTION_SQL))
+    bounds = conn.execute(text(f"SELECT MIN({REC_TS_SQL}), MAX({REC_TS_SQL}) FROM {legacy}")).fetchone()
+    if bounds[0] is not None:
+        ensure_partitions(conn, bounds[0], bounds[1])
+    columns = [line.split()[0] for line in COLUMNS_SQL.strip().splitlines()][:-1]
+    column_list = ", ".join(columns)
+    moved = conn.execute(text(f"""
+        INSERT INTO {PARENT} ({column_list}, rec_ts)
+        SELECT {column_list}, {REC_TS_SQL} FROM {legacy}
+    """)).rowcount
+    conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{PARENT}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {PARENT}"))
+    conn.execute(text(f"DROP TABLE {legacy}"))
+    print(f"Migrated {moved} rows into partitions.")
+
+
+def ensure_ais_table(conn):
+    """Create ais_data partitioned, or migrate an older unpartitioned one."""
+    kind = table_kind(conn)
+    if kind is None:
+        print("Creating partitioned ais_data table...")
+        create_partitioned_table(conn)
+    elif kind == "r":
+        migrate_plain_table(conn)
+    else:
+        create_partitioned_table(conn)  # default partition, if missing
+
+
+def drop_expired_partitions(conn, retention_days=None, now=None):
+    """Drop partitions entirely older than the retention window. Returns their names."""
+    retention_days = RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return []
+    cutoff = (now or datetime.now()) - timedelta(days=retention_days)
+    dropped = []
+    for name, _, upper in list_partitions(conn):
+        if upper <= cutoff:
+            conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    if dropped:
+        print(f"Retention ({retention_days} days): dropped {', '.join(dropped)}")
+    return dropped
+
+
+if __name__ == "__main__":
+    # python -m utils.partitions            list partitions
+    # python -m utils.partitions --retention  apply AIS_RETENTION_DAYS now
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    from utils.db_loader import build_derived_tables, engine
+    from utils.dataset_version import bump_dataset_version
+
+    with engine.begin() as conn:
+        ensure_ais_table(conn)
+        dropped = drop_expired_partitions(conn) if "--retention" in sys.argv else []
+        for name, lower, upper in list_partitions(conn):
+            print(f"{name:<28}{lower:%Y-%m-%d}  {upper:%Y-%m-%d}")
+    if dropped:
+        build_derived_tables(engine)
+        bump_dataset_version(engine)
@@ -0,0 +1,354 @@
+import math
+import os
+import sys
+import time
+from datetime import timedelta
+
+from sqlalchemy import text
+
+from utils.voyages import (
+    EARTH_RADIUS_NM, VOYAGE_MAX_GAP_HOURS, VOYAGE_MIN_STAY_HOURS, normalise_destination,
+    stationary_runs, vessel_batches,
+)
+
+# Port calls: dwell periods (the stays of utils/voyages.py: reports below
+# VOYAGE_STOP_SOG for at least VOYAGE_MIN_STAY_HOURS) matched to the nearest
+# port whose centroid lies within the port's radius. Dwells away from any
+# port (anchorages at sea, drifting) are not calls.
+#
+#   ports            name, centroid, radius_nm. Loaded from AIS_PORTS_CSV
+#                    (name,lat,lon[,radius_nm]) when set; otherwise derived
+#                    on each full build by clustering dwell positions within
+#                    PORT_RADIUS_NM, keeping clusters of at least
+#                    PORT_MIN_DWELLS dwells, each named after the destination
+#                    most often reported at the start of its dwells.
+#   port_calls       one row per call, indexed on (port, arrival) and arrival
+#   port_call_state  the latest rec_ts processed (watermark)
+#
+# build_port_calls() rebuilds everything after a load. update_port_calls()
+# (python -m utils.port_calls) only reads positions from shortly before the
+# watermark on: calls still open at that point, and dwells that were not yet
+# long enough to count, are detected again with the new reports.
+# Both use a grid index over the ports, so matching a dwell looks at the
+# ports of its own and the adjacent cells only.
+AIS_PORTS_CSV = os.getenv("AIS_PORTS_CSV")
+PORT_RADIUS_NM = float(os.getenv("PORT_RADIUS_NM", 10.0))
+PORT_MIN_DWELLS = int(os.getenv("PORT_MIN_DWELLS", 3))
+PORT_INDEX_CELL_DEG = 1.0
+
+CREATE_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS ports (
+        name VARCHAR(255) PRIMARY KEY,
+        lat DOUBLE PRECISION NOT NULL,
+        lon DOUBLE PRECISION NOT NULL,
+        radius_nm DOUBLE PRECISION NOT NULL,
+        source VARCHAR(8) NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS port_calls (
+        mmsi BIGINT NOT NULL,
+        arrival TIMESTAMP NOT NULL,
+        departure TIMESTAMP NOT NULL,
+        port VARCHAR(255) NOT NULL,
+        duration_hours DOUBLE PRECISION NOT NULL,
+        lat DOUBLE PRECISION NOT NULL,
+        lon DOUBLE PRECISION NOT NULL,
+        distance_nm DOUBLE PRECISION NOT NULL,
+        points INTEGER NOT NULL,
+        PRIMARY KEY (mmsi, arrival)
+    );
+    CREATE INDEX IF NOT EXISTS port_calls_port_arrival ON port_calls (port, arrival);
+    CREATE INDEX IF NOT EXISTS port_calls_arrival ON port_calls (arrival);
+    CREATE TABLE IF NOT EXISTS port_call_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        watermark TIMESTAMP,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+SAVE_WATERMARK_SQL = """
+    INSERT INTO port_call_state (id, watermark) VALUES (1, :watermark)
+    ON CONFLICT (id) DO UPDATE
+    SET watermark = EXCLUDED.watermark, updated_at = CURRENT_TIMESTAMP
+"""
+
+CALL_COLUMNS = ("mmsi", "arrival", "departure", "port", "duration_hours", "lat", "lon", "distance_nm", "points")
+
+
+def distance_nm(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_NM * math.asin(math.sqrt(min(1.0, a)))
+
+
+class PortIndex:
+    """Ports (name, lat, lon, radius_nm) in a grid of PORT_INDEX_CELL_DEG cells."""
+
+    COLS = int(round(360 / PORT_INDEX_CELL_DEG))
+
+    def __init__(self, ports=()):
+        self.ports = []
+        self.cells = {}  # (row, col) -> indices into self.ports
+        self.max_radius = 0.0
+        for port in ports:
+            self.add(*port)
+
+    @staticmethod
+    def cell(lat, lon):
+        return (int(math.floor((lat + 90) / PORT_INDEX_CELL_DEG)),
+                int(math.floor((lon + 180) / PORT_INDEX_CELL_DEG)) % PortIndex.COLS)
+
+    def add(self, name, lat, lon, radius_nm):
+        self.cells.setdefault(self.cell(lat, lon), []).append(len(self.ports))
+        self.ports.append((name, lat, lon, radius_nm))
+        self.max_radius = max(self.max_radius, radius_nm)
+        return len(self.ports) - 1
+
+    def nearest(self, lat, lon):
+        """(index, distance_nm) of the nearest port within its radius, or None."""
+        if not self.ports:
+            return None
+        row, col = self.cell(lat, lon)
+        # Cells to search either way: one degree of latitude is 60 nm, one of
+        # longitude 60 * cos(lat) nm.
+        span_lat = math.ceil(self.max_radius / 60 / PORT_INDEX_CELL_DEG)
+        cos_lat = max(math.cos(math.radians(min(abs(lat) + span_lat * PORT_INDEX_CELL_DEG, 90))), 1e-6)
+        span_lon = min(math.ceil(self.max_radius / (60 * cos_lat) / PORT_INDEX_CELL_DEG), self.COLS // 2)
+        best = None
+        for r in range(row - span_lat, row + span_lat + 1):
+            for c in {(col + d) % self.COLS for d in range(-span_lon, span_lon + 1)}:
+                for i in self.cells.get((r, c), ()):
+                    _, port_lat, port_lon, radius = self.ports[i]
+                    d = distance_nm(lat, lon, port_lat, port_lon)
+                    if d <= radius and (best is None or d < best[1]):
+                        best = (i, d)
+        return best
+
+
+def vessel_dwells(mmsi, times, lat, lon, sog, destinations):
+    """
+    [(mmsi, arrival, departure, duration_hours, lat, lon, points, destination)]
+    for the stays of one vessel's positions (arrays ordered by time). The
+    position is the median of the stay's reports, the destination the first
+    one named during the stay.
+    """
+    import numpy as np
+    hours, _, starts, ends, is_stay = stationary_runs(times, sog)
+    dwells = []
+    for first, last in zip(starts[is_stay], ends[is_stay]):
+        la, lo = lat[first:last + 1], lon[first:last + 1]
+        valid = np.isfinite(la) & np.isfinite(lo) & ((la != 0) | (lo != 0))
+        if not valid.any():
+            continue
+        named = next((d for d in map(normalise_destination, destinations[first:last + 1]) if d), None)
+        dwells.append((
+            int(mmsi),
+            times[first].astype("datetime64[us]").item(), times[last].astype("datetime64[us]").item(),
+            round(float(hours[last] - hours[first]), 4),
+            float(np.median(la[valid])), float(np.median(lo[valid])),
+            int(last - first + 1), named,
+        ))
+    return dwells
+
+
+def detect_dwells(conn, where="rec_ts IS NOT NULL", params=None):
+    """(dwells of the vessels in the ais_data rows matching ``where``, latest rec_ts read)."""
+    dwells, latest = [], None
+    for vessels in vessel_batches(conn, where, params):
+        for vessel in vessels:
+            dwells.extend(vessel_dwells(*vessel))
+            last = vessel[1][-1].astype("datetime64[us]").item()
+            latest = last if latest is None else max(latest, last)
+    return dwells, latest
+
+
+def derive_ports(dwells):
+    """Cluster dwell positions into ports [(name, lat, lon, radius_nm)]."""
+    import numpy as np
+    from collections import Counter
+
+    leaders, members = PortIndex(), []
+    for dwell in dwells:
+        match = leaders.nearest(dwell[4], dwell[5])
+        if match is None:
+            leaders.add(None, dwell[4], dwell[5], PORT_RADIUS_NM)
+            members.append([dwell])
+        else:
+            members[match[0]].append(dwell)
+
+    ports, taken = [], set()
+    for cluster in sorted((m for m in members if len(m) >= PORT_MIN_DWELLS), key=len, reverse=True):
+        lat = float(np.median([d[4] for d in cluster]))
+        lon = float(np.median([d[5] for d in cluster]))
+        names = Counter(d[7] for d in cluster if d[7] and d[7] not in taken)
+        name = names.most_common(1)[0][0] if names else f"PORT {lat:.2f},{lon:.2f}"
+        taken.add(name)
+        ports.append((name, round(lat, 5), round(lon, 5), PORT_RADIUS_NM))
+    return ports
+
+
+def load_ports_csv(path):
+    """[(name, lat, lon, radius_nm)] from a CSV with name, lat/latitude, lon/longitude[, radius_nm]."""
+    import pandas as pd
+    frame = pd.read_csv(path).rename(columns=lambda c: c.strip().lower())
+    frame = frame.rename(columns={"latitude": "lat", "longitude": "lon"})
+    if "radius_nm" not in frame:
+        frame["radius_nm"] = PORT_RADIUS_NM
+    frame = frame.dropna(subset=["name", "lat", "lon"]).drop_duplicates("name")
+    return [(str(r.name).strip().upper(), float(r.lat), float(r.lon),
+             float(r.radius_nm) if r.radius_nm == r.radius_nm else PORT_RADIUS_NM)
+            for r in frame.itertuples(index=False)]
+
+
+def match_dwells(dwells, index):
+    """port_calls rows (dicts) for the dwells within a port's radius."""
+    calls = []
+    for mmsi, arrival, departure, hours, lat, lon, points, _ in dwells:
+        match = index.nearest(lat, lon)
+        if match is None:
+            continue
+        calls.append(dict(zip(CALL_COLUMNS, (
+            mmsi, arrival, departure, index.ports[match[0]][0], hours, lat, lon, round(match[1], 3), points,
+        ))))
+    return calls
+
+
+def _insert_calls(conn, calls):
+    if calls:
+        conn.execute(text(f"""
+            INSERT INTO port_calls ({', '.join(CALL_COLUMNS)})
+            VALUES ({', '.join(':' + c for c in CALL_COLUMNS)})
+        """), calls)
+
+
+def ensure_port_call_tables(conn):
+    conn.execute(text(CREATE_TABLES_SQL))
+
+
+def build_port_calls(engine):
+    """Rebuild ports (unless read from AIS_PORTS_CSV) and all port calls."""
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        ensure_port_call_tables(conn)
+        conn.commit()
+        dwells, latest = detect_dwells(conn)
+    ports = load_ports_csv(AIS_PORTS_CSV) if AIS_PORTS_CSV else derive_ports(dwells)
+    calls = match_dwells(dwells, PortIndex(ports))
+
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM ports"))
+        if ports:
+            conn.execute(text("INSERT INTO ports (name, lat, lon, radius_nm, source) "
+                              "VALUES (:name, :lat, :lon, :radius_nm, :source)"),
+                         [{"name": n, "lat": la, "lon": lo, "radius_nm": r,
+                           "source": "csv" if AIS_PORTS_CSV else "derived"} for n, la, lo, r in ports])
+        conn.execute(text("DELETE FROM port_calls"))
+        _insert_calls(conn, calls)
+        conn.execute(text(SAVE_WATERMARK_SQL), {"watermark": latest})
+        conn.execute(text("ANALYZE ports"))
+        conn.execute(text("ANALYZE port_calls"))
+    print(f"Port calls: {len(calls)} of {len(dwells)} dwells at {len(ports)} ports "
+          f"in {time.perf_counter() - start:.2f}s")
+    return len(calls)
+
+
+def update_port_calls(engine):
+    """
+    Detect port calls in the positions added since the last run, against
+    the current ports. Falls back to build_port_calls() when nothing has
+    been built yet. Returns the number of calls written.
+    """
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        ensure_port_call_tables(conn)
+        conn.commit()
+        watermark = conn.execute(text("SELECT watermark FROM port_call_state WHERE id = 1")).scalar()
+        ports = conn.execute(text("SELECT name, lat, lon, radius_nm FROM ports")).fetchall()
+        if watermark is not None and ports:
+            # A dwell not yet long enough at the watermark started at most
+            # VOYAGE_MIN_STAY_HOURS before a report at most
+            # VOYAGE_MAX_GAP_HOURS before it. A call still open at that
+            # point is detected again from its arrival, reading that
+            # vessel's earlier reports only.
+            since = watermark - timedelta(hours=VOYAGE_MIN_STAY_HOURS + VOYAGE_MAX_GAP_HOURS)
+            open_since = conn.execute(text("SELECT MIN(arrival) FROM port_calls WHERE departure >= :since"),
+                                      {"since": since}).scalar()
+            params = {"since": since, "open_since": min(since, open_since or since)}
+            dwells, latest = detect_dwells(conn, """
+                rec_ts >= :open_since
+                AND (rec_ts >= :since OR EXISTS (
+                    SELECT 1 FROM port_calls c
+                    WHERE c.mmsi = ais_data.mmsi AND c.departure >= :since AND ais_data.rec_ts >= c.arrival
+                ))
+            """, params)
+    if watermark is None or not ports:
+        return build_port_calls(engine)
+
+    calls = match_dwells(dwells, PortIndex(tuple(p) for p in ports))
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM port_calls WHERE departure >= :since"), {"since": since})
+        _insert_calls(conn, calls)
+        conn.execute(text(SAVE_WATERMARK_SQL), {"watermark": max(watermark, latest or watermark)})
+    print(f"Port calls: {len(calls)} calls from {len(dwells)} dwells since {since} "
+          f"(watermark {watermark}) in {time.perf_counter() - start:.2f}s")
+    return len(calls)
+
+
+def port_calls_built(session):
+    return session.execute(text("SELECT EXISTS (SELECT 1 FROM port_call_state WHERE id = 1)")).scalar()
+
+
+def _arrival_range(start, end, port=None):
+    conditions, params = [], {}
+    if start is not None:
+        conditions.append("arrival >= :start")
+        params["start"] = start
+    if end is not None:
+        conditions.append("arrival < :end")
+        params["end"] = end
+    if port is not None:
+        conditions.append("port = :port")
+        params["port"] = port
+    return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), params
+
+
+def arrivals_by_port(session, start=None, end=None):
+    """[(port, arrivals)] between start and end (exclusive), or None before the first build."""
+    if not port_calls_built(session):
+        return None
+    where, params = _arrival_range(start, end)
+    return session.execute(text(f"""
+        SELECT port, COUNT(*) AS arrivals
+        FROM port_calls
+        {where}
+        GROUP BY port
+        ORDER BY arrivals DESC, port
+    """), params).fetchall()
+
+
+def daily_port_arrivals(session, start=None, end=None, port=None):
+    """[(day, port, arrivals)], optionally for one port, or None before the first build."""
+    if not port_calls_built(session):
+        return None
+    where, params = _arrival_range(start, end, port)
+    return session.execute(text(f"""
+        SELECT CAST(arrival AS DATE) AS day, port, COUNT(*) AS arrivals
+        FROM port_calls
+        {where}
+        GROUP BY day, port
+        ORDER BY day, port
+    """), params).fetchall()
+
+
+if __name__ == "__main__":
+    # python -m utils.port_calls          process positions added since the last run
+    # python -m utils.port_calls --full   rebuild ports and port calls
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    from utils.db_loader import engine
+    from utils.dataset_version import bump_dataset_version
+
+    if "--full" in sys.argv:
+        build_port_calls(engine)
+    else:
+        update_port_calls(engine)
+    bump_dataset_version(engine)
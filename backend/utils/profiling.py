@@ -0,0 +1,164 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from flask import g, request
+
+from utils.admin import is_admin_request
+
+# On-demand profiling of single requests. Nothing is registered unless
+# REQUEST_PROFILING=true, so there is no per-request cost when it is off.
+#
+# An admin-authorised request opts in with "X-Profile: cpu" (or "cpu,mem"),
+# or the query parameter __profile=cpu / __profile=cpu,mem. The view runs
+# under cProfile (and tracemalloc for "mem"); the artefact is stored under
+# PROFILE_DIR and its id is returned in the X-Profile-Id response header.
+# tracemalloc is process-wide, so allocations from concurrent requests on
+# other threads may show up in a "mem" profile.
+REQUEST_PROFILING = os.getenv("REQUEST_PROFILING", "false").lower() == "true"
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "datasuite-profiles"))
+TOP_N = int(os.getenv("PROFILE_TOP_N", 30))
+
+
+def _requested_modes():
+    raw = request.headers.get("X-Profile") or request.args.get("__profile") or ""
+    return {m.strip().lower() for m in raw.split(",") if m.strip()}
+
+
+def _top_functions(profiler):
+    stats = pstats.Stats(profiler).sort_stats("cumulative")
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, callers) in stats.stats.items():
+        rows.append({
+            "function": f"{func} ({os.path.basename(filename)}:{line})",
+            "calls": nc,
+            "total_s": round(tt, 6),
+            "cumulative_s": round(ct, 6),
+        })
+    rows.sort(key=lambda r: r["cumulative_s"], reverse=True)
+    return rows[:TOP_N]
+
+
+def _top_allocations(snapshot):
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, cProfile.__file__),
+        tracemalloc.Filter(False, pstats.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+    return [
+        {"site": str(stat.traceback[0]), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+        for stat in snapshot.statistics("lineno")[:TOP_N]
+    ]
+
+
+def _finish(status):
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return None
+    profiler.disable()
+    allocations = None
+    if g.get("profile_tracemalloc"):
+        # Snapshot before building the report so its own allocations are excluded.
+        current, peak = tracemalloc.get_traced_memory()
+        allocations = (peak, tracemalloc.take_snapshot())
+        tracemalloc.stop()
+
+    artefact = {
+        "id": g.profile_id,
+        "method": request.method,
+        "path": request.full_path.rstrip("?"),
+        "endpoint": request.endpoint,
+        "status": status,
+        "wall_s": round(time.perf_counter() - g.profile_start, 6),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "top_cumulative": _top_functions(profiler),
+    }
+    if allocations:
+        peak, snapshot = allocations
+        artefact["peak_traced_kb"] = round(peak / 1024, 1)
+        artefact["top_allocations"] = _top_allocations(snapshot)
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profiler.dump_stats(os.path.join(PROFILE_DIR, f"{g.profile_id}.prof"))
+    with open(os.path.join(PROFILE_DIR, f"{g.profile_id}.json"), "w") as f:
+        json.dump(artefact, f, indent=2)
+    return artefact
+
+
+def init_app(app):
+    if not REQUEST_PROFILING:
+        return
+
+    @app.before_request
+    def start_profile():
+        modes = _requested_modes()
+        if not modes or not is_admin_request():
+            return
+        g.profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        g.profile_start = time.perf_counter()
+        if "mem" in modes and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            g.profile_tracemalloc = True
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+    @app.after_request
+    def finish_profile(response):
+        if "profiler" in g:
+            _finish(response.status_code)
+            response.headers["X-Profile-Id"] = g.profile_id
+        return response
+
+    @app.teardown_request
+    def abandon_profile(exc):
+        # Unhandled exception: still write what was collected.
+        if "profiler" in g:
+            _finish(500)
+
+
+def _safe_path(profile_id, ext):
+    if not profile_id or os.path.basename(profile_id) != profile_id:
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}{ext}")
+    return path if os.path.exists(path) else None
+
+
+def list_profiles(limit=50):
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    names = sorted((n for n in os.listdir(PROFILE_DIR) if n.endswith(".json")), reverse=True)[:limit]
+    profiles = []
+    for name in names:
+        with open(os.path.join(PROFILE_DIR, name)) as f:
+            data = json.load(f)
+        profiles.append({k: data[k] for k in ("id", "method", "path", "status", "wall_s", "timestamp")})
+    return profiles
+
+
+def load_profile(profile_id):
+    path = _safe_path(profile_id, ".json")
+    if not path:
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def profile_stats_path(profile_id):
+    """Raw pstats dump (for snakeviz / pstats) if it exists."""
+    return _safe_path(profile_id, ".prof")
+
+
+def render_profile_text(profile_id, limit=TOP_N):
+    path = profile_stats_path(profile_id)
+    if not path:
+        return None
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,220 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from functools import wraps
+
+from flask import Response, make_response, request
+
+from utils.dataset_version import current_dataset_version
+from utils.http_cache import request_etag
+from utils.metrics import add_collector, describe, inc
+
+# Response bodies of expensive GET endpoints, shared by every worker on the
+# host through one SQLite file (WAL mode, so readers don't block each other).
+# Entries are keyed like the HTTP ETag (dataset version + date + URL), so an
+# ingest invalidates everything; RESULT_CACHE_TTL bounds the age of an entry
+# and RESULT_CACHE_MAX_BYTES the total size, evicting least recently used
+# entries first. Any SQLite error just bypasses the cache.
+#
+# On a miss the worker takes a lease on the key; other workers missing the
+# same key meanwhile poll for the leader's entry (for up to
+# RESULT_CACHE_LEASE_SECONDS) instead of computing it too.
+#
+# An entry keeps the headers the view set (X-Approximate, X-Sample-Fraction,
+# ...) and a hit replays them; the decorators around the view add ETag and
+# caching headers again on every response.
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE", "true").lower() == "true"
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "datasuite-result-cache"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", 600))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+RESULT_CACHE_LEASE_SECONDS = float(os.getenv("RESULT_CACHE_LEASE_SECONDS", 30))
+LEASE_POLL_SECONDS = 0.05
+
+# Set from the body or by the server, not by the view
+UNCACHED_HEADERS = {"content-type", "content-length"}
+
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS results (
+        key TEXT PRIMARY KEY,
+        endpoint TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        mimetype TEXT NOT NULL,
+        body BLOB NOT NULL,
+        headers TEXT NOT NULL DEFAULT '[]',
+        size INTEGER NOT NULL,
+        expires_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at);
+    CREATE TABLE IF NOT EXISTS leases (
+        key TEXT PRIMARY KEY,
+        expires_at REAL NOT NULL
+    );
+"""
+
+describe("result_cache_requests_total", "counter", "Shared result cache lookups by outcome")
+describe("result_cache_hit_ratio", "gauge", "Shared result cache hits / lookups")
+
+_local = threading.local()
+
+
+def _connection():
+    # One connection per thread and process (connections must not cross a fork).
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(RESULT_CACHE_DIR, "results.sqlite3"), timeout=5,
+                               isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA_SQL)
+        # Cache files written before entries kept their headers
+        if "headers" not in {row[1] for row in conn.execute("PRAGMA table_info(results)")}:
+            conn.execute("ALTER TABLE results ADD COLUMN headers TEXT NOT NULL DEFAULT '[]'")
+        _local.conn, _local.pid = conn, os.getpid()
+    return conn
+
+
+def cache_get(key):
+    """(body, mimetype, [(header, value)]) of a live entry, else None."""
+    conn = _connection()
+    now = time.time()
+    row = conn.execute("SELECT body, mimetype, headers FROM results WHERE key = ? AND expires_at > ?",
+                       (key, now)).fetchone()
+    if row is None:
+        return None
+    conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+    return row[0], row[1], json.loads(row[2])
+
+
+def cache_put(key, endpoint, version, body, mimetype, headers=(), ttl=None):
+    if len(body) > RESULT_CACHE_MAX_BYTES:
+        return
+    conn = _connection()
+    now = time.time()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        # Entries of older dataset versions can never be hit again.
+        conn.execute("DELETE FROM results WHERE version != ? OR expires_at <= ?", (version, now))
+        conn.execute("""
+            INSERT OR REPLACE INTO results
+                (key, endpoint, version, mimetype, body, headers, size, expires_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (key, endpoint, version, mimetype, body, json.dumps(list(headers)), len(body),
+              now + (ttl or RESULT_CACHE_TTL), now))
+        # LRU: drop the least recently used entries beyond the size budget.
+        conn.execute("""
+            DELETE FROM results WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS running
+                    FROM results
+                ) WHERE running > ?
+            )
+        """, (RESULT_CACHE_MAX_BYTES,))
+
+
+def acquire_lease(key):
+    """True if this worker should compute ``key`` (nobody else holds a live lease)."""
+    conn = _connection()
+    now = time.time()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+        inserted = conn.execute("INSERT OR IGNORE INTO leases VALUES (?, ?)",
+                                (key, now + RESULT_CACHE_LEASE_SECONDS)).rowcount
+    return inserted == 1
+
+
+def release_lease(key):
+    _connection().execute("DELETE FROM leases WHERE key = ?", (key,))
+
+
+def wait_for_entry(key):
+    """Poll for the entry another worker is computing; None if its lease ends without one."""
+    conn = _connection()
+    while True:
+        cached = cache_get(key)
+        if cached is not None:
+            return cached
+        if conn.execute("SELECT 1 FROM leases WHERE key = ? AND expires_at > ?",
+                        (key, time.time())).fetchone() is None:
+            return cache_get(key)
+        time.sleep(LEASE_POLL_SECONDS)
+
+
+def cache_stats():
+    """Entry count and bytes per endpoint."""
+    rows = _connection().execute(
+        "SELECT endpoint, COUNT(*), SUM(size) FROM results GROUP BY endpoint ORDER BY endpoint").fetchall()
+    return {endpoint: {"entries": count, "bytes": size} for endpoint, count, size in rows}
+
+
+def clear_cache():
+    _connection().execute("DELETE FROM results")
+
+
+def shared_result_cache(view):
+    """Serve a GET view's 200 responses from the cross-worker result cache."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not RESULT_CACHE_ENABLED or request.method != "GET":
+            return view(*args, **kwargs)
+        version = current_dataset_version()
+        if version is None:
+            return view(*args, **kwargs)
+        key = request_etag(version)
+        labels = {"endpoint": request.endpoint}
+        try:
+            cached = cache_get(key)
+            result = "hit"
+            leased = cached is None and acquire_lease(key)
+            if cached is None and not leased:
+                # Another worker is computing this key right now.
+                cached = wait_for_entry(key)
+                result = "coalesced"
+        except sqlite3.Error as e:
+            print(f"Result cache read failed: {e}")
+            return view(*args, **kwargs)
+        if cached is not None:
+            inc("result_cache_requests_total", dict(labels, result=result))
+            response = Response(cached[0], mimetype=cached[1], headers=cached[2])
+            response.headers["X-Result-Cache"] = result
+            return response
+
+        inc("result_cache_requests_total", dict(labels, result="miss"))
+        try:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                try:
+                    headers = [(k, v) for k, v in response.headers.items() if k.lower() not in UNCACHED_HEADERS]
+                    cache_put(key, request.endpoint, version, response.get_data(), response.mimetype, headers)
+                except sqlite3.Error as e:
+                    print(f"Result cache write failed: {e}")
+        finally:
+            if leased:
+                try:
+                    release_lease(key)
+                except sqlite3.Error:
+                    pass  # expires on its own
+        response.headers["X-Result-Cache"] = "miss"
+        return response
+    return wrapper
+
+
+def hit_ratios(counters):
+    """Per-endpoint share of lookups served without computing (hits and coalesced waits)."""
+    totals = {}
+    for (name, labels), value in counters.items():
+        if name != "result_cache_requests_total":
+            continue
+        labels = dict(labels)
+        hits, lookups = totals.get(labels["endpoint"], (0.0, 0.0))
+        totals[labels["endpoint"]] = (hits + (value if labels["result"] != "miss" else 0.0), lookups + value)
+    return [("result_cache_hit_ratio", {"endpoint": endpoint}, round(hits / lookups, 4))
+            for endpoint, (hits, lookups) in sorted(totals.items()) if lookups]
+
+
+add_collector(hit_ratios)
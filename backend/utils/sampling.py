@@ -0,0 +1,137 @@
+import math
+import os
+import time
+
+from flask import request
+from sqlalchemy import text
+
+# A uniform random sample of ais_data, redrawn at ingest. sample_id numbers
+# the sampled rows in random order, so the rows with sample_id <= k are
+# themselves a uniform sample of k rows: a query for a fraction f of the
+# data reads the first f * population rows of ais_sample instead of
+# ais_data. Fractions larger than the sample fall back to
+# TABLESAMPLE BERNOULLI on ais_data.
+#
+# seed_id numbers the rows usable as a form seed (mmsi, name and time
+# present) densely from 1, so a random seed is two index lookups instead of
+# ORDER BY RANDOM() over the whole table.
+SAMPLE_ROWS = int(os.getenv("AIS_SAMPLE_ROWS", 100_000))
+CONFIDENCE_Z = 1.96  # 95%
+
+SEEDABLE_SQL = """
+    mmsi IS NOT NULL
+    AND ship_name IS NOT NULL AND TRIM(ship_name) <> ''
+    AND rec_time IS NOT NULL AND TRIM(rec_time) <> ''
+"""
+
+CREATE_INFO_SQL = """
+    CREATE TABLE IF NOT EXISTS ais_sample_info (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        population BIGINT NOT NULL,
+        sample_rows BIGINT NOT NULL,
+        built_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def _sample_select(percent, rows):
+    # Utility statements (CREATE TABLE AS) take no bind parameters; both
+    # values are numbers computed here.
+    return f"""
+        WITH picked AS (
+            SELECT * FROM ais_data TABLESAMPLE BERNOULLI ({float(percent)})
+            ORDER BY RANDOM()
+            LIMIT {int(rows)}
+        ),
+        numbered AS (
+            SELECT ROW_NUMBER() OVER () AS sample_id, picked.* FROM picked
+        )
+        SELECT numbered.*,
+               CASE WHEN {SEEDABLE_SQL}
+                    THEN COUNT(*) FILTER (WHERE {SEEDABLE_SQL}) OVER (ORDER BY sample_id)
+               END AS seed_id
+        FROM numbered
+        ORDER BY sample_id
+    """
+
+
+def ensure_sample_tables(conn):
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS ais_sample AS {_sample_select(0, 0)} WITH NO DATA"))
+    conn.execute(text(CREATE_INFO_SQL))
+
+
+def build_sample(engine, rows=None):
+    """Draw a new sample of ``rows`` rows. Readers keep the old one until the swap."""
+    rows = SAMPLE_ROWS if rows is None else rows
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        ensure_sample_tables(conn)
+        population = conn.execute(text("SELECT COUNT(*) FROM ais_data")).scalar()
+        # Oversample 3x so BERNOULLI almost surely returns enough rows.
+        percent = min(100.0, 300.0 * rows / population) if population else 0.0
+        conn.execute(text("DROP TABLE IF EXISTS ais_sample_new"))
+        conn.execute(text(f"CREATE TABLE ais_sample_new AS {_sample_select(percent, rows)}"))
+        conn.execute(text("CREATE UNIQUE INDEX ais_sample_new_sample_id ON ais_sample_new (sample_id)"))
+        conn.execute(text("CREATE UNIQUE INDEX ais_sample_new_seed_id ON ais_sample_new (seed_id)"))
+        conn.execute(text("DROP TABLE ais_sample"))
+        conn.execute(text("ALTER TABLE ais_sample_new RENAME TO ais_sample"))
+        conn.execute(text("ALTER INDEX ais_sample_new_sample_id RENAME TO ais_sample_sample_id"))
+        conn.execute(text("ALTER INDEX ais_sample_new_seed_id RENAME TO ais_sample_seed_id"))
+        drawn = conn.execute(text("SELECT COUNT(*) FROM ais_sample")).scalar()
+        conn.execute(text("""
+            INSERT INTO ais_sample_info (id, population, sample_rows) VALUES (1, :population, :drawn)
+            ON CONFLICT (id) DO UPDATE
+            SET population = EXCLUDED.population, sample_rows = EXCLUDED.sample_rows,
+                built_at = CURRENT_TIMESTAMP
+        """), {"population": population, "drawn": drawn})
+        conn.execute(text("ANALYZE ais_sample"))
+    print(f"Sample: {drawn} of {population} rows in {time.perf_counter() - start:.2f}s")
+    return drawn
+
+
+def sample_info(session):
+    """(population, sample rows) of the current sample, or (0, 0)."""
+    row = session.execute(text("SELECT population, sample_rows FROM ais_sample_info WHERE id = 1")).fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def pick_random_seed(session):
+    """A random seedable row (mmsi, ship_name, rec_time) from the sample, else None."""
+    return session.execute(text("""
+        SELECT CAST(mmsi AS TEXT) AS mmsi, ship_name, rec_time
+        FROM ais_sample
+        WHERE seed_id = (SELECT 1 + FLOOR(RANDOM() * MAX(seed_id))::BIGINT FROM ais_sample)
+    """)).mappings().first()
+
+
+def requested_fraction():
+    """?sample=<fraction in (0, 1]> as (fraction or None, error message)."""
+    raw = request.args.get("sample")
+    if not raw:
+        return None, None
+    try:
+        fraction = float(raw)
+    except ValueError:
+        fraction = 0.0
+    if not 0 < fraction <= 1:
+        return None, "sample must be a fraction in (0, 1]"
+    return fraction, None
+
+
+def sampled_source(session, fraction):
+    """SQL relation (aliased ais_data) holding about ``fraction`` of the rows."""
+    if fraction >= 1:
+        return "ais_data"
+    population, sample_rows = sample_info(session)
+    wanted = int(math.ceil(fraction * population))
+    if population and wanted <= sample_rows:
+        return f"(SELECT * FROM ais_sample WHERE sample_id <= {wanted}) AS ais_data"
+    # Deterministic per dataset, like the sample, so cached responses agree.
+    return f"ais_data TABLESAMPLE BERNOULLI ({100.0 * fraction}) REPEATABLE (0)"
+
+
+def mean_error(stddev, count, fraction):
+    """95% confidence half-width of a sample mean (finite population corrected)."""
+    if stddev is None or count is None or count < 2:
+        return None
+    return CONFIDENCE_Z * float(stddev) / math.sqrt(count) * math.sqrt(max(0.0, 1.0 - fraction))
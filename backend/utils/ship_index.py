@@ -0,0 +1,174 @@
+import heapq
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from sqlalchemy import text
+
+from utils.dataset_version import current_dataset_version
+
+# In-memory autocomplete over (mmsi, latest ship_name), so a keystroke does
+# not scan ais_data. Vessels are numbered in result order (ship_name, mmsi);
+# a lower id always ranks first within a tier, so every lookup only has to
+# find the smallest matching ids:
+#
+#   tier 0  name starts with q     sorted lower-cased names + bisect
+#   tier 1  mmsi starts with q     sorted mmsi strings + bisect
+#   tier 2  name contains q        posting lists of 1-3 character n-grams
+#   tier 3  (fuzzy=true only)      trigram similarity, for misspellings
+#
+# Tiers 0-2 reproduce the CASE ordering of the SQL query. The index is
+# rebuilt when the dataset version changes; lookups keep using the previous
+# index while that happens.
+SHIP_SEARCH_INDEX = os.getenv("SHIP_SEARCH_INDEX", "true").lower() == "true"
+FUZZY_THRESHOLD = 0.3
+
+LATEST_NAMES_SQL = """
+    SELECT DISTINCT ON (mmsi)
+        CAST(mmsi AS TEXT) AS mmsi,
+        ship_name
+    FROM ais_data
+    WHERE mmsi IS NOT NULL
+      AND ship_name IS NOT NULL
+      AND TRIM(ship_name) <> ''
+    ORDER BY mmsi, rec_time DESC
+"""
+
+_lock = threading.Lock()
+_state = {"version": None, "index": None}
+
+
+def ngrams(value, sizes=(1, 2, 3)):
+    return {value[i:i + n] for n in sizes for i in range(len(value) - n + 1)}
+
+
+class ShipSearchIndex:
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda r: (r[1], r[0]))
+        self.mmsi = [m for m, _ in rows]
+        self.names = [n for _, n in rows]
+        self.lowered = [n.lower() for n in self.names]
+
+        by_name = sorted(range(len(rows)), key=self.lowered.__getitem__)
+        self._name_keys = [self.lowered[i] for i in by_name]
+        self._name_ids = array("I", by_name)
+        # True unless names differ from their lower-cased order (mixed case):
+        # then a prefix range is already in rank order.
+        self._name_ids_ranked = all(a < b for a, b in zip(by_name, by_name[1:]))
+        by_mmsi = sorted(range(len(rows)), key=self.mmsi.__getitem__)
+        self._mmsi_keys = [self.mmsi[i] for i in by_mmsi]
+        self._mmsi_ids = array("I", by_mmsi)
+
+        # Ascending ids, so every posting list comes out sorted.
+        grams = {}
+        trigram_counts = array("H")
+        for i, name in enumerate(self.lowered):
+            name_grams = ngrams(name)
+            for gram in name_grams:
+                postings = grams.get(gram)
+                if postings is None:
+                    grams[gram] = [i]
+                else:
+                    postings.append(i)
+            trigram_counts.append(min(sum(len(g) == 3 for g in name_grams), 65535))
+        self._grams = {gram: array("I", postings) for gram, postings in grams.items()}
+        self._trigram_counts = trigram_counts
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def _prefix(keys, ids, keys_by_id, prefix, count, ranked=False):
+        """The ``count`` smallest ids whose key starts with ``prefix``."""
+        lo = bisect_left(keys, prefix)
+        hi = bisect_left(keys, prefix + "\U0010ffff", lo)
+        size = hi - lo
+        if ranked:
+            return list(ids[lo:min(hi, lo + count)])
+        if keys_by_id is None or size * size <= count * len(ids):
+            return heapq.nsmallest(count, ids[lo:hi])
+        # Wide range (short mmsi prefix): mmsi order is unrelated to rank
+        # order, so walking ids in rank order meets ``count`` matches after
+        # about count * len(ids) / size steps.
+        found = []
+        for i, key in enumerate(keys_by_id):
+            if key.startswith(prefix):
+                found.append(i)
+                if len(found) == count:
+                    break
+        return found
+
+    def _contains(self, query, skip, count):
+        """Smallest ids whose name contains ``query`` and for which ``skip(id)`` is false."""
+        if len(query) <= 3:
+            candidates, verify = self._grams.get(query, ()), False
+        else:
+            postings = [self._grams.get(g, ()) for g in ngrams(query, (3,))]
+            candidates, verify = min(postings, key=len), True
+        found = []
+        for i in candidates:
+            if (not verify or query in self.lowered[i]) and not skip(i):
+                found.append(i)
+                if len(found) == count:
+                    break
+        return found
+
+    def _similar(self, query, skip, count):
+        """Names sharing enough trigrams with ``query`` (Jaccard >= FUZZY_THRESHOLD)."""
+        query_grams = ngrams(query, (3,))
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self._grams.get(gram, ()))
+        scored = []
+        for i, overlap in shared.items():
+            score = overlap / (len(query_grams) + self._trigram_counts[i] - overlap)
+            if score >= FUZZY_THRESHOLD and not skip(i):
+                scored.append((-score, i))
+        return [i for _, i in heapq.nsmallest(count, scored)]
+
+    def search(self, q, limit=6, fuzzy=False):
+        query = q.lower()
+        ids = self._prefix(self._name_keys, self._name_ids, None, query, limit, self._name_ids_ranked)
+        if len(ids) < limit:
+            # Fewer than limit name matches means ``ids`` holds all of them.
+            name_matches = set(ids)
+            by_mmsi = self._prefix(self._mmsi_keys, self._mmsi_ids, self.mmsi, q, limit + len(ids))
+            ids += [i for i in by_mmsi if i not in name_matches][:limit - len(ids)]
+        if len(ids) < limit:
+            ids += self._contains(
+                query, lambda i: self.lowered[i].startswith(query) or self.mmsi[i].startswith(q), limit - len(ids))
+        if fuzzy and len(ids) < limit and len(query) >= 3:
+            taken = set(ids)
+            ids += self._similar(query, lambda i: i in taken or query in self.lowered[i], limit - len(ids))
+        return [{"mmsi": self.mmsi[i], "ship_name": self.names[i],
+                 "label": f"{self.names[i]} ({self.mmsi[i]})"} for i in ids]
+
+
+def build_index(session):
+    start = time.perf_counter()
+    index = ShipSearchIndex(session.execute(text(LATEST_NAMES_SQL)).fetchall())
+    print(f"Ship search index: {len(index)} vessels in {time.perf_counter() - start:.2f}s")
+    return index
+
+
+def get_ship_index(session):
+    """The index for the current dataset version (built on first use), else None."""
+    if not SHIP_SEARCH_INDEX:
+        return None
+    version = current_dataset_version()
+    if version is None:
+        return None
+    if _state["version"] == version:
+        return _state["index"]
+    # One thread rebuilds; the others keep answering from the old index.
+    if not _lock.acquire(blocking=_state["index"] is None):
+        return _state["index"]
+    try:
+        if _state["version"] != version:
+            _state.update(index=build_index(session), version=version)
+        return _state["index"]
+    finally:
+        _lock.release()
@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import Response, make_response, request
+
+from utils.dataset_version import current_dataset_version
+from utils.http_cache import request_etag
+from utils.metrics import describe, inc
+
+# Request coalescing. While a GET for some URL is being computed in this
+# process, identical requests on other threads wait for it and get a copy of
+# its response instead of running the same queries again. Across workers the
+# shared result cache does the same with a lease (see utils/result_cache.py).
+#
+# A follower that waits longer than SINGLE_FLIGHT_TIMEOUT, or whose leader
+# failed or streamed its response, computes the result itself.
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT", "true").lower() == "true"
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", 60))
+
+describe("single_flight_requests_total", "counter", "Coalesced GETs by role (leader computed, follower shared)")
+describe("single_flight_saved_seconds_total", "counter", "Leader compute time reused by followers")
+
+_lock = threading.Lock()
+_inflight = {}  # key -> _Call
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None  # (body, status, headers) once finished
+        self.seconds = 0.0
+
+
+def _flight_key():
+    version = current_dataset_version()
+    return request_etag(version) if version is not None else request.full_path
+
+
+def single_flight(view):
+    """Let concurrent identical GETs in this process share one computation."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not SINGLE_FLIGHT_ENABLED or request.method != "GET":
+            return view(*args, **kwargs)
+        key = _flight_key()
+        labels = {"endpoint": request.endpoint}
+        with _lock:
+            call = _inflight.get(key)
+            leader = call is None
+            if leader:
+                call = _inflight[key] = _Call()
+
+        if not leader:
+            if call.done.wait(SINGLE_FLIGHT_TIMEOUT) and call.response is not None:
+                inc("single_flight_requests_total", dict(labels, role="follower"))
+                inc("single_flight_saved_seconds_total", labels, call.seconds)
+                body, status, headers = call.response
+                return Response(body, status=status, headers=headers)
+            return view(*args, **kwargs)
+
+        inc("single_flight_requests_total", dict(labels, role="leader"))
+        start = time.perf_counter()
+        try:
+            response = make_response(view(*args, **kwargs))
+            if not response.is_streamed:
+                call.seconds = time.perf_counter() - start
+                call.response = (response.get_data(), response.status_code, list(response.headers.items()))
+            return response
+        finally:
+            with _lock:
+                _inflight.pop(key, None)
+            call.done.set()
+    return wrapper
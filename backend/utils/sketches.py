@@ -0,0 +1,240 @@
+import math
+import time
+import zlib
+
+from flask import jsonify, request
+from sqlalchemy import text
+
+# HyperLogLog sketches of the distinct MMSIs seen per (hour, ship_type) and
+# (day, ship_type), written after each ingest into vessel_sketches. Sketches
+# merge by taking the register-wise maximum, so any range or combination of
+# ship types is answered from the stored sketches, without going back to
+# COUNT(DISTINCT mmsi) over ais_data. Endpoints use them when called with
+# ?approx=true.
+#
+# ship_type '*' holds the sketch of all ship types together, and '' holds
+# rows without a ship type. With P = 12 (4096 one-byte registers) the
+# standard error is 1.04 / sqrt(4096) = 1.6%. Responses report a ~95% bound
+# (two standard errors) per count.
+P = 12
+M = 1 << P
+RELATIVE_ERROR = 1.04 / math.sqrt(M)
+ALL_TYPES = "*"
+BUILD_CHUNK_ROWS = 200_000
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS vessel_sketches (
+        granularity VARCHAR(8) NOT NULL,
+        bucket TIMESTAMP NOT NULL,
+        ship_type VARCHAR(255) NOT NULL,
+        registers BYTEA NOT NULL,
+        PRIMARY KEY (granularity, bucket, ship_type)
+    )
+"""
+
+# One row per vessel, hour and ship type, in hour order so each hour is
+# complete once a later one shows up.
+SOURCE_SQL = """
+    SELECT DISTINCT
+        DATE_TRUNC('hour', rec_ts) AS hour,
+        COALESCE(ship_type, '') AS ship_type,
+        mmsi
+    FROM ais_data
+    WHERE rec_ts IS NOT NULL AND mmsi IS NOT NULL
+    ORDER BY hour
+"""
+
+
+def hash_ids(ids):
+    """64-bit splitmix64 hashes of integer ids (numpy uint64 array)."""
+    import numpy as np
+    z = np.asarray(ids, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def register_updates(ids):
+    """(register index, rank) per id: top P bits pick the register, the rank
+    is 1 + the number of trailing zeros in the remaining bits."""
+    import numpy as np
+    hashes = hash_ids(ids)
+    index = (hashes >> np.uint64(64 - P)).astype(np.int64)
+    rest = hashes & np.uint64((1 << (64 - P)) - 1)
+    lowest_bit = rest & (~rest + np.uint64(1))
+    with np.errstate(divide="ignore"):
+        rank = np.where(rest == 0, 64 - P, np.log2(lowest_bit.astype(np.float64))) + 1
+    return index, rank.astype(np.uint8)
+
+
+def empty_sketch():
+    import numpy as np
+    return np.zeros(M, dtype=np.uint8)
+
+
+def sketch_of(ids):
+    import numpy as np
+    registers = empty_sketch()
+    index, rank = register_updates(ids)
+    np.maximum.at(registers, index, rank)
+    return registers
+
+
+def merge_into(target, registers):
+    import numpy as np
+    np.maximum(target, registers, out=target)
+    return target
+
+
+def estimate(registers):
+    """Cardinality estimate of one sketch (linear counting for small ranges)."""
+    import numpy as np
+    alpha = 0.7213 / (1 + 1.079 / M)
+    raw = alpha * M * M / float(np.sum(np.ldexp(1.0, -registers.astype(np.int32))))
+    zeros = int(np.count_nonzero(registers == 0))
+    if raw <= 2.5 * M and zeros:
+        return int(round(M * math.log(M / zeros)))
+    return int(round(raw))
+
+
+def error_bound(count):
+    """~95% absolute error bound of an estimate."""
+    return int(math.ceil(2 * RELATIVE_ERROR * count))
+
+
+def pack(registers):
+    return zlib.compress(registers.tobytes(), 1)
+
+
+def unpack(blob):
+    import numpy as np
+    return np.frombuffer(zlib.decompress(blob), dtype=np.uint8)
+
+
+def ensure_sketch_table(conn):
+    conn.execute(text(CREATE_TABLE_SQL))
+
+
+def build_sketches(engine):
+    """Rebuild vessel_sketches from ais_data. Readers keep the old sketches
+    until the new ones are committed."""
+    import numpy as np
+    import pandas as pd
+
+    start = time.perf_counter()
+    rows = []
+    hours = {}  # hour -> {ship_type: registers}, still receiving rows
+    days = {}   # day -> {ship_type: registers}
+
+    def close_hour(hour):
+        by_type = hours.pop(hour)
+        by_type[ALL_TYPES] = empty_sketch()
+        day = days.setdefault(hour.normalize(), {})
+        for ship_type, registers in by_type.items():
+            if ship_type != ALL_TYPES:
+                merge_into(by_type[ALL_TYPES], registers)
+            merge_into(day.setdefault(ship_type, empty_sketch()), registers)
+            rows.append({"granularity": "hour", "bucket": hour.to_pydatetime(),
+                         "ship_type": ship_type, "registers": pack(registers)})
+
+    def close_day(day):
+        for ship_type, registers in days.pop(day).items():
+            rows.append({"granularity": "day", "bucket": day.to_pydatetime(),
+                         "ship_type": ship_type, "registers": pack(registers)})
+
+    with engine.connect() as conn:
+        ensure_sketch_table(conn)
+        conn.commit()
+        source = conn.execution_options(stream_results=True)
+        for chunk in pd.read_sql(text(SOURCE_SQL), source, chunksize=BUILD_CHUNK_ROWS):
+            index, rank = register_updates(chunk["mmsi"].to_numpy(dtype=np.int64).astype(np.uint64))
+            chunk = chunk.assign(index=index, rank=rank)
+            updates = chunk.groupby(["hour", "ship_type", "index"], sort=False)["rank"].max()
+            for (hour, ship_type), group in updates.groupby(level=[0, 1], sort=False):
+                registers = hours.setdefault(hour, {}).setdefault(ship_type, empty_sketch())
+                positions = group.index.get_level_values(2).to_numpy()
+                registers[positions] = np.maximum(registers[positions], group.to_numpy())
+            # The last hour may continue in the next chunk; earlier ones are done.
+            last_hour = chunk["hour"].iloc[-1]
+            for hour in sorted(h for h in hours if h < last_hour):
+                close_hour(hour)
+            for day in sorted(d for d in days if d < last_hour.normalize()):
+                close_day(day)
+        for hour in sorted(hours):
+            close_hour(hour)
+        for day in sorted(days):
+            close_day(day)
+
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM vessel_sketches"))
+        if rows:
+            conn.execute(text("""
+                INSERT INTO vessel_sketches (granularity, bucket, ship_type, registers)
+                VALUES (:granularity, :bucket, :ship_type, :registers)
+            """), rows)
+    print(f"Vessel sketches: {len(rows)} built in {time.perf_counter() - start:.2f}s")
+    return len(rows)
+
+
+def approx_requested():
+    return request.args.get("approx", "").lower() == "true"
+
+
+def fetch_sketches(session, granularity, ship_types=None, start=None, end=None, initcap=False):
+    """[(bucket, ship_type, registers)] of stored sketches.
+
+    ``ship_types`` None means the per-type sketches (not '*'); pass
+    [ALL_TYPES] for the all-types sketch. ``end`` is exclusive. With
+    ``initcap`` the ship type comes back as INITCAP(LOWER(ship_type)),
+    normalised by Postgres exactly as the exact queries do.
+    """
+    conditions = ["granularity = :granularity"]
+    params = {"granularity": granularity}
+    if ship_types is None:
+        conditions.append("ship_type <> :all_types")
+        params["all_types"] = ALL_TYPES
+    else:
+        conditions.append("ship_type = ANY(:ship_types)")
+        params["ship_types"] = list(ship_types)
+    if start is not None:
+        conditions.append("bucket >= :start")
+        params["start"] = start
+    if end is not None:
+        conditions.append("bucket < :end")
+        params["end"] = end
+    rows = session.execute(text(f"""
+        SELECT bucket, {"INITCAP(LOWER(ship_type))" if initcap else "ship_type"}, registers
+        FROM vessel_sketches
+        WHERE {' AND '.join(conditions)}
+        ORDER BY bucket
+    """), params).fetchall()
+    return [(bucket, ship_type, unpack(registers)) for bucket, ship_type, registers in rows]
+
+
+def merged_counts(sketches, key):
+    """{key(bucket, ship_type): estimate}, merging the sketches that share a
+    key (insertion order kept). Sketches with key None are skipped."""
+    merged = {}
+    for bucket, ship_type, registers in sketches:
+        k = key(bucket, ship_type)
+        if k is None:
+            continue
+        if k in merged:
+            merge_into(merged[k], registers)
+        else:
+            merged[k] = registers.copy()
+    return {k: estimate(registers) for k, registers in merged.items()}
+
+
+def approx_response(data):
+    """jsonify ``data`` and label it as an estimate."""
+    response = jsonify(data)
+    response.headers["X-Approximate"] = f"hyperloglog; relative-error={2 * RELATIVE_ERROR:.4f}"
+    return response
+
+
+def with_error(row, *fields):
+    """Add ``<field>_error`` (~95% bound) next to each estimated count."""
+    for field in fields:
+        row[f"{field}_error"] = error_bound(row[field])
+    return row
@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Importing metrics first guarantees its after_cursor_execute listener runs
+# before ours and has stored the statement duration in conn.info.
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Statements slower than SLOW_QUERY_MS are logged with their bound parameters
+# and calling endpoint. A SLOW_QUERY_EXPLAIN_SAMPLE fraction of slow read-only
+# statements issued by requests is re-run under EXPLAIN (ANALYZE, BUFFERS) on a
+# background thread so the request that triggered it is not delayed further.
+# ANALYZE executes the statement, so anything calling a function with side
+# effects (advisory locks, sequences) is never explained, and the connection
+# used is closed afterwards rather than returned to the pool.
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 500))
+EXPLAIN_SAMPLE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE", 0.1))
+LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", 200))
+# Optional JSON-lines file shared by all workers; otherwise entries are per process.
+# Once it holds LOG_SIZE entries it becomes LOG_FILE.1 (replacing the previous
+# one) and a new file is started, so the newest LOG_SIZE entries are always on
+# disk and the files never hold more than twice that. Writers serialise on
+# LOG_FILE.lock, which also holds the current file's entry count.
+LOG_FILE = os.getenv("SLOW_QUERY_LOG_FILE")
+TAIL_BLOCK_BYTES = 64 * 1024
+
+READ_ONLY_PREFIXES = ("SELECT", "WITH")
+SIDE_EFFECT_CALLS = re.compile(
+    r"\b(pg_(try_)?advisory\w*|pg_sleep\w*|pg_notify|pg_cancel_backend|pg_terminate_backend"
+    r"|setval|nextval|set_config|lo_\w+|dblink\w*)\s*\(", re.IGNORECASE)
+MAX_PARAM_CHARS = 2000
+
+metrics.describe("sql_slow_queries_total", "counter", "Statements slower than SLOW_QUERY_MS")
+
+_entries = deque(maxlen=LOG_SIZE)
+_file_lock = threading.Lock()
+_explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+_local = threading.local()
+
+
+def _is_read_only(statement):
+    return (statement.lstrip().upper().startswith(READ_ONLY_PREFIXES)
+            and not SIDE_EFFECT_CALLS.search(statement))
+
+
+def _store(entry):
+    _entries.append(entry)
+    if LOG_FILE:
+        _append_to_file(json.dumps(entry, default=str) + "\n")
+
+
+def _append_to_file(line):
+    import fcntl
+
+    os.makedirs(os.path.dirname(LOG_FILE) or ".", exist_ok=True)
+    with _file_lock, open(f"{LOG_FILE}.lock", "a+") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        lock.seek(0)
+        count = lock.read().strip()
+        count = int(count) if count.isdigit() else 0
+        with open(LOG_FILE, "a") as f:
+            f.write(line)
+        count += 1
+        if count >= LOG_SIZE:
+            os.replace(LOG_FILE, f"{LOG_FILE}.1")
+            count = 0
+        lock.seek(0)
+        lock.truncate()
+        lock.write(str(count))
+
+
+def _tail_lines(path, count):
+    """The last ``count`` lines of a file, read backwards in blocks."""
+    if count <= 0 or not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        data = b""
+        while end > 0 and data.count(b"\n") <= count:
+            step = min(TAIL_BLOCK_BYTES, end)
+            end -= step
+            f.seek(end)
+            data = f.read(step) + data
+    return [line for line in data.decode("utf-8", "replace").splitlines() if line.strip()][-count:]
+
+
+def _explain(engine, entry, statement, parameters):
+    _local.explaining = True
+    try:
+        with engine.connect() as conn:
+            try:
+                rows = conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters).fetchall()
+            finally:
+                # Drop the session: nothing it set up may leak into the pool
+                conn.invalidate()
+        entry["plan"] = "\n".join(row[0] for row in rows)
+    except Exception as e:
+        entry["plan_error"] = str(e)
+    finally:
+        _local.explaining = False
+    _store(entry)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_local, "explaining", False):
+        return
+    duration_ms = conn.info.get("last_query_seconds", 0.0) * 1000
+    if duration_ms < SLOW_QUERY_MS:
+        return
+
+    endpoint = request.endpoint if has_request_context() else threading.current_thread().name
+    entry = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "duration_ms": round(duration_ms, 2),
+        "endpoint": endpoint,
+        "pid": os.getpid(),
+        "statement": statement.strip(),
+        "parameters": repr(parameters)[:MAX_PARAM_CHARS],
+        "plan": None,
+    }
+    metrics.inc("sql_slow_queries_total", {"endpoint": endpoint or "-"})
+    logger.warning("Slow query (%.1f ms) from %s: %s | params=%s",
+                   duration_ms, endpoint, entry["statement"][:500], entry["parameters"][:500])
+
+    sampled = (not executemany and has_request_context() and _is_read_only(statement)
+               and conn.engine.dialect.name == "postgresql" and random.random() < EXPLAIN_SAMPLE)
+    if sampled:
+        _explainer.submit(_explain, conn.engine, entry, statement, parameters)
+    else:
+        _store(entry)
+
+
+def recent_slow_queries(limit=50):
+    """Most recent slow statements, newest first."""
+    if LOG_FILE and (os.path.exists(LOG_FILE) or os.path.exists(f"{LOG_FILE}.1")):
+        lines = _tail_lines(LOG_FILE, limit)
+        lines = _tail_lines(f"{LOG_FILE}.1", limit - len(lines)) + lines
+        entries = []
+        for line in reversed(lines):
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue  # a line still being written
+        return entries
+    return list(reversed(_entries))[:limit]
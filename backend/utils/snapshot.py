@@ -0,0 +1,237 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+from config import resolve_csv_path, resolve_snapshot_dir
+from utils.dataset import AIS_SCHEMA, read_ais_csv
+from utils.metrics import observe_dataset_load
+
+# Columnar copy of the AIS CSV, written at ingest:
+#
+#   <snapshot dir>/date=YYYY-MM-DD/part-0.parquet   (one file per day)
+#   <snapshot dir>/_manifest.json                   (source CSV size/mtime)
+#
+# <snapshot dir> is a symlink to the current build (<snapshot dir>.<time_ns>),
+# replaced atomically by a rebuild, so there is always a snapshot to open.
+#
+# Rows are sorted by (mmsi, rec_time) inside each day and written in small
+# row groups, so a filter on mmsi skips most of a file using the row-group
+# statistics, and a date range only opens the matching partitions. Files are
+# memory-mapped; the page cache is shared by every worker.
+#
+# The snapshot is only used while its manifest matches the current CSV;
+# otherwise readers fall back to the in-memory CSV frame. pyarrow is optional.
+SNAPSHOT_ENABLED = os.getenv("AIS_PARQUET_SNAPSHOT", "true").lower() == "true"
+ROW_GROUP_ROWS = int(os.getenv("AIS_SNAPSHOT_ROW_GROUP_ROWS", 8192))
+CHUNK_ROWS = 500_000
+MANIFEST = "_manifest.json"
+NULL_PARTITION = "unknown"
+
+_cache = {"key": None, "dataset": None}
+_lock = threading.Lock()
+
+
+def pyarrow_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _source_fingerprint(csv_path):
+    stat = os.stat(csv_path)
+    return {"csv_path": os.path.abspath(csv_path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def _read_manifest(snapshot_dir):
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def snapshot_is_fresh(csv_path=None, snapshot_dir=None):
+    """True when a snapshot exists and was built from the current CSV."""
+    csv_path = csv_path or resolve_csv_path()
+    snapshot_dir = snapshot_dir or resolve_snapshot_dir(csv_path)
+    manifest = _read_manifest(snapshot_dir)
+    if not manifest or not os.path.exists(csv_path):
+        return False
+    fingerprint = _source_fingerprint(csv_path)
+    return all(manifest.get(k) == v for k, v in fingerprint.items())
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    types = {
+        "Int64": pa.int64(), "Int32": pa.int32(), "float32": pa.float32(),
+        "category": pa.dictionary(pa.int32(), pa.string()), "datetime64[ns]": pa.timestamp("ns"),
+    }
+    return pa.schema([(col, types[dtype]) for col, dtype in AIS_SCHEMA.items()])
+
+
+def write_snapshot(csv_path, snapshot_dir=None):
+    """
+    Build the Parquet snapshot of ``csv_path``. Written to a staging directory
+    and swapped in, so readers never see a half-written snapshot. Returns the
+    number of rows written.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    snapshot_dir = snapshot_dir or resolve_snapshot_dir(csv_path)
+    staging = f"{snapshot_dir}.staging-{os.getpid()}"
+    unsorted = os.path.join(staging, "_unsorted")
+    shutil.rmtree(staging, ignore_errors=True)
+    start = time.perf_counter()
+    schema = _arrow_schema()
+
+    # Pass 1: stream the CSV in chunks into per-day files.
+    rows = 0
+    for index, chunk in enumerate(read_ais_csv(csv_path, chunksize=CHUNK_ROWS)):
+        columns = [col for col in schema.names if col in chunk.columns]
+        table = pa.Table.from_pandas(chunk[columns], schema=pa.schema([schema.field(c) for c in columns]),
+                                     preserve_index=False)
+        dates = chunk["rec_time"].dt.strftime("%Y-%m-%d").fillna(NULL_PARTITION)
+        table = table.append_column("date", pa.array(dates.to_numpy(dtype=object), pa.string()))
+        ds.write_dataset(table, unsorted, format="parquet", partitioning=["date"],
+                         partitioning_flavor="hive", basename_template=f"chunk-{index}-{{i}}.parquet",
+                         existing_data_behavior="overwrite_or_ignore")
+        rows += len(chunk)
+
+    # Pass 2: one file per day, sorted by vessel then time.
+    for name in sorted(os.listdir(unsorted)) if os.path.isdir(unsorted) else []:
+        day = pq.read_table(os.path.join(unsorted, name)).unify_dictionaries()
+        day = day.sort_by([("mmsi", "ascending"), ("rec_time", "ascending")]).combine_chunks()
+        os.makedirs(os.path.join(staging, name))
+        pq.write_table(day, os.path.join(staging, name, "part-0.parquet"), row_group_size=ROW_GROUP_ROWS)
+    shutil.rmtree(unsorted, ignore_errors=True)
+
+    manifest = dict(_source_fingerprint(csv_path), rows=rows,
+                    created_at=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()))
+    with open(os.path.join(staging, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    _swap_in(staging, snapshot_dir)
+    observe_dataset_load("parquet_write", time.perf_counter() - start, rows)
+    print(f"Parquet snapshot written: {rows} rows to {snapshot_dir} in {time.perf_counter() - start:.1f}s")
+    return rows
+
+
+def _swap_in(staging, snapshot_dir):
+    """Point the ``snapshot_dir`` symlink at ``staging`` and remove the build it replaces."""
+    build = f"{snapshot_dir}.{time.time_ns()}"
+    os.replace(staging, build)
+    retired = None
+    if os.path.islink(snapshot_dir):
+        retired = os.path.join(os.path.dirname(snapshot_dir), os.readlink(snapshot_dir))
+    elif os.path.exists(snapshot_dir):
+        # A plain directory from before the symlink layout: moved aside once,
+        # so readers see no snapshot for a moment.
+        retired = f"{snapshot_dir}.old-{os.getpid()}"
+        os.replace(snapshot_dir, retired)
+    link = f"{snapshot_dir}.link-{os.getpid()}"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(build), link)
+    os.replace(link, snapshot_dir)
+    if retired:
+        # Open (memory-mapped) files stay readable until closed.
+        shutil.rmtree(retired, ignore_errors=True)
+
+
+def ensure_snapshot(csv_path=None):
+    """Write the snapshot if enabled, possible and missing or stale."""
+    csv_path = csv_path or resolve_csv_path()
+    if not SNAPSHOT_ENABLED or not os.path.exists(csv_path):
+        return False
+    if not pyarrow_available():
+        print("pyarrow not installed; skipping Parquet snapshot.")
+        return False
+    if snapshot_is_fresh(csv_path):
+        return True
+    write_snapshot(csv_path)
+    return True
+
+
+def _dataset():
+    """The (cached) pyarrow dataset of a fresh snapshot, else None."""
+    if not SNAPSHOT_ENABLED or not pyarrow_available():
+        return None
+    csv_path = resolve_csv_path()
+    snapshot_dir = resolve_snapshot_dir(csv_path)
+    if not snapshot_is_fresh(csv_path, snapshot_dir):
+        return None
+    manifest_mtime = os.stat(os.path.join(snapshot_dir, MANIFEST)).st_mtime
+    key = (snapshot_dir, manifest_mtime)
+    with _lock:
+        if _cache["key"] != key:
+            import pyarrow as pa
+            import pyarrow.dataset as ds
+            from pyarrow import fs
+
+            dictionary_columns = [c for c, dtype in AIS_SCHEMA.items() if dtype == "category"]
+            file_format = ds.ParquetFileFormat(
+                read_options=ds.ParquetReadOptions(dictionary_columns=dictionary_columns))
+            _cache["dataset"] = ds.dataset(
+                snapshot_dir, format=file_format,
+                filesystem=fs.LocalFileSystem(use_mmap=True),
+                partitioning=ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive"),
+                exclude_invalid_files=False, ignore_prefixes=["_", "."])
+            _cache["key"] = key
+        return _cache["dataset"]
+
+
+def _expression(filters):
+    """Build a pyarrow expression from (column, op, value) tuples (AND) or a list of such lists (OR)."""
+    import pyarrow.parquet as pq
+
+    if filters and isinstance(filters[0], tuple):
+        filters = [filters]
+    return pq.filters_to_expression(filters)
+
+
+def read_snapshot(columns=None, start=None, end=None, filters=None, limit=None):
+    """
+    Read ``columns`` for days ``start``..``end`` (inclusive, YYYY-MM-DD) from the
+    snapshot, with ``filters`` pushed down to the row groups; with ``limit``
+    the scan stops after that many rows. Returns None when there is no usable
+    snapshot.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    dataset = _dataset()
+    if dataset is None:
+        return None
+    expression = None
+    if start is not None:
+        expression = ds.field("date") >= start
+    if end is not None:
+        upper = ds.field("date") <= end
+        expression = upper if expression is None else expression & upper
+    if start is not None or end is not None:
+        expression = expression & (ds.field("date") != NULL_PARTITION)
+    if filters:
+        pushed = _expression(filters)
+        expression = pushed if expression is None else expression & pushed
+
+    if columns is None:
+        columns = [name for name in dataset.schema.names if name != "date"]
+    if limit is not None:
+        table = dataset.head(limit, columns=columns, filter=expression)
+    else:
+        table = dataset.to_table(columns=columns, filter=expression)
+    nullable_ints = {pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype()}
+    return table.to_pandas(types_mapper=nullable_ints.get)
+
+
+if __name__ == "__main__":
+    ensure_snapshot()
@@ -0,0 +1,271 @@
+import os
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+
+def _process_start_time():
+    """Wall-clock time this process was started (Linux), else now."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 is the start time in clock ticks since boot; the command
+            # name (field 2) may contain spaces, so split after its closing ')'.
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return time.time()
+
+
+PROCESS_STARTED_AT = _process_start_time()
+
+# STARTUP_PROFILE=true records import time and RSS growth per blueprint.
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "false").lower() == "true"
+_import_profile = []
+
+# Arbitrary constant shared by every process so only one runs the data load.
+INIT_ADVISORY_LOCK_KEY = 724_310_026
+
+_lock = threading.Lock()
+_state = {
+    "pid": None,
+    "status": "pending",  # pending -> initialising -> ready | failed
+    "step": None,
+    "error": None,
+    "app_created_at": None,
+    "first_byte_at": None,
+    "ready_at": None,
+}
+
+
+def current_rss_bytes():
+    """Resident set size of this process (Linux), else peak RSS."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        # ru_maxrss is in KiB on Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def trim_heap():
+    """Hand freed heap memory back to the OS (glibc only, best effort)."""
+    import gc
+    gc.collect()
+    try:
+        import ctypes
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+@contextmanager
+def profile_import(name):
+    """Record wall time and RSS delta of the wrapped imports when profiling."""
+    if not STARTUP_PROFILE:
+        yield
+        return
+    rss_before = current_rss_bytes()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _import_profile.append({
+            "name": name,
+            "seconds": round(time.perf_counter() - start, 4),
+            "rss_delta_mb": round((current_rss_bytes() - rss_before) / 1048576, 2),
+        })
+
+
+def print_import_profile():
+    if not STARTUP_PROFILE:
+        return
+    print(f"{'blueprint':<28}{'import s':>10}{'RSS +MB':>10}")
+    for entry in _import_profile:
+        print(f"{entry['name']:<28}{entry['seconds']:>10.4f}{entry['rss_delta_mb']:>10.2f}")
+    print(f"{'process RSS':<28}{'':>10}{current_rss_bytes() / 1048576:>10.2f}")
+
+
+def _since_start(ts):
+    return round(ts - PROCESS_STARTED_AT, 3) if ts else None
+
+
+def mark_app_created():
+    _state["app_created_at"] = time.time()
+
+
+def mark_first_byte():
+    if _state["first_byte_at"] is None:
+        _state["first_byte_at"] = time.time()
+        print(f"Cold start: first response after {_since_start(_state['first_byte_at'])}s")
+
+
+def is_ready():
+    return _state["status"] == "ready" and _state["pid"] == os.getpid()
+
+
+def is_initialising():
+    # A state inherited through fork (pid mismatch) means this process has not
+    # started its own initialiser yet, which is still "not ready".
+    return _state["pid"] != os.getpid() or _state["status"] in ("pending", "initialising")
+
+
+def startup_report():
+    report = {
+        "status": _state["status"] if _state["pid"] == os.getpid() else "pending",
+        "step": _state["step"],
+        "error": _state["error"],
+        "pid": os.getpid(),
+        "seconds_since_process_start": {
+            "app_created": _since_start(_state["app_created_at"]),
+            "first_byte": _since_start(_state["first_byte_at"]),
+            "ready": _since_start(_state["ready_at"]),
+        },
+        "uptime_seconds": round(time.time() - PROCESS_STARTED_AT, 3),
+    }
+    if STARTUP_PROFILE:
+        report["import_profile"] = list(_import_profile)
+    return report
+
+
+def _step(name):
+    _state["step"] = name
+    print(f"[startup] {name}")
+
+
+def initialise_database(app):
+    """
+    Create missing tables, load the CSV if ais_data is empty and refresh the
+    Parquet snapshot, bumping the dataset version when either changes. Then
+    warm the ship autocomplete index.
+    """
+    from sqlalchemy import inspect, text
+    from config import db, resolve_csv_path
+    from utils.activity_cube import ensure_activity_cube_table
+    from utils.dataset_version import bump_dataset_version, ensure_version_table
+    from utils.db_loader import DERIVED_TABLES, build_derived_tables, ensure_database_exists, load_csv_to_db
+    from utils.fleet_stats import ensure_fleet_stats_tables
+    from utils.partitions import drop_expired_partitions, ensure_ais_table
+    from utils.port_calls import ensure_port_call_tables
+    from utils.sampling import ensure_sample_tables
+    from utils.sketches import ensure_sketch_table
+    from utils.snapshot import ensure_snapshot, snapshot_is_fresh
+    from utils.voyages import ensure_voyages_table
+
+    with app.app_context():
+        _step("ensure database")
+        # Optional DB creation is disabled by default for managed services (Render/Supabase).
+        ensure_database_exists()
+
+        engine = db.engine
+        with engine.connect() as lock_conn:
+            # Serialise initialisation across gunicorn workers: the first one in
+            # does the work, the others wait and then find everything in place.
+            _step("waiting for init lock")
+            lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": INIT_ADVISORY_LOCK_KEY})
+            try:
+                _step("check tables")
+                # Import models so SQLAlchemy knows about them
+                import models
+                existing_tables = inspect(engine).get_table_names()
+
+                # Partitioned on rec_ts; an older plain table is migrated once.
+                with engine.begin() as conn:
+                    ensure_ais_table(conn)
+
+                if "users" not in existing_tables:
+                    print("Creating users table...")
+                    with engine.begin() as conn:
+                        conn.execute(text("""
+                            CREATE TABLE users (
+                                id SERIAL PRIMARY KEY,
+                                username VARCHAR(50) UNIQUE NOT NULL,
+                                email VARCHAR(100) UNIQUE NOT NULL,
+                                password_hash VARCHAR(255) NOT NULL,
+                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                last_login TIMESTAMP
+                            );
+                        """))
+                    print("Users table created successfully.")
+
+                with engine.begin() as conn:
+                    ensure_version_table(conn)
+                    ensure_sketch_table(conn)
+                    ensure_sample_tables(conn)
+                    ensure_fleet_stats_tables(conn)
+                    ensure_activity_cube_table(conn)
+                    ensure_voyages_table(conn)
+                    ensure_port_call_tables(conn)
+
+                _step("check ais_data")
+                # EXISTS stops at the first row instead of counting the table.
+                has_rows = db.session.execute(text("SELECT EXISTS (SELECT 1 FROM ais_data)")).scalar()
+                db.session.remove()
+                if not has_rows:
+                    _step("load dataset")
+                    print("ais_data table is empty. Loading data...")
+                    load_csv_to_db(resolve_csv_path(), app=app)
+                else:
+                    print("ais_data table already contains data. Skipping data loading.")
+                    # Retention (AIS_RETENTION_DAYS) also applies on restart.
+                    with engine.begin() as conn:
+                        expired = drop_expired_partitions(conn)
+                        missing = [table for table, _, _ in DERIVED_TABLES
+                                   if not conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {table})")).scalar()]
+                    if expired or missing:
+                        _step("derived tables")
+                        build_derived_tables(engine, None if expired else missing)
+                    if expired:
+                        bump_dataset_version(engine)
+
+                # No-op when the snapshot already matches the CSV. A rebuild
+                # changes what the CSV-backed endpoints return.
+                _step("parquet snapshot")
+                try:
+                    was_fresh = snapshot_is_fresh(resolve_csv_path())
+                    if ensure_snapshot(resolve_csv_path()) and not was_fresh:
+                        bump_dataset_version(engine)
+                except Exception as e:
+                    print(f"Parquet snapshot failed; serving from the CSV instead: {e}")
+
+                _step("ship search index")
+                try:
+                    from utils.ship_index import get_ship_index
+                    get_ship_index(db.session)
+                except Exception as e:
+                    print(f"Ship search index failed; autocomplete falls back to SQL: {e}")
+                finally:
+                    db.session.remove()
+            finally:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": INIT_ADVISORY_LOCK_KEY})
+
+
+def _run(app):
+    try:
+        initialise_database(app)
+    except Exception as e:
+        traceback.print_exc()
+        _state["error"] = str(e)
+        _state["status"] = "failed"
+        return
+    _state["ready_at"] = time.time()
+    _state["status"] = "ready"
+    _state["step"] = None
+    print(f"[startup] ready after {_since_start(_state['ready_at'])}s")
+
+
+def start_background_init(app):
+    """
+    Start the database initialiser on a daemon thread, once per process.
+    Safe to call repeatedly (every request, gunicorn post_fork, ...).
+    """
+    if _state["pid"] == os.getpid():
+        return
+    with _lock:
+        if _state["pid"] == os.getpid():
+            return
+        _state.update(pid=os.getpid(), status="initialising", step=None, error=None, ready_at=None)
+        threading.Thread(target=_run, args=(app,), name="startup-init", daemon=True).start()
@@ -0,0 +1,239 @@
+import os
+import time
+
+from sqlalchemy import text
+
+# Splits each vessel's positions (ordered by rec_ts) into segments, written
+# to the voyages table after each load:
+#
+#   stay     a run of reports below VOYAGE_STOP_SOG knots lasting at least
+#            VOYAGE_MIN_STAY_HOURS (berthed, anchored)
+#   voyage   everything between stays. A voyage also ends where the
+#            reported destination changes, and any segment ends at a
+#            reporting gap over VOYAGE_MAX_GAP_HOURS.
+#
+# Shorter stops belong to the voyage around them. distance_nm sums the
+# great-circle legs between consecutive reports; a leg is counted for the
+# voyage it leads into or out of, and legs across reporting gaps are not
+# counted. Vessels are segmented in batches on VOYAGE_WORKERS processes,
+# while the parent streams ais_data once in (mmsi, rec_ts) order.
+VOYAGE_STOP_SOG = float(os.getenv("VOYAGE_STOP_SOG", 1.0))
+VOYAGE_MIN_STAY_HOURS = float(os.getenv("VOYAGE_MIN_STAY_HOURS", 2.0))
+VOYAGE_MAX_GAP_HOURS = float(os.getenv("VOYAGE_MAX_GAP_HOURS", 24.0))
+VOYAGE_WORKERS = int(os.getenv("VOYAGE_WORKERS", os.cpu_count() or 1))
+VOYAGE_CHUNK_ROWS = 200_000
+
+VOYAGE, STAY = "voyage", "stay"
+EARTH_RADIUS_NM = 3440.065
+
+# Destination values that do not name a port
+PLACEHOLDER_DESTINATIONS = {"", "0", "UNKNOWN", "TBA", "PORT_REACHED", "IN TRANSIT", "WAITING"}
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS voyages (
+        mmsi BIGINT NOT NULL,
+        segment_no INTEGER NOT NULL,
+        kind VARCHAR(8) NOT NULL,
+        start_time TIMESTAMP NOT NULL,
+        end_time TIMESTAMP NOT NULL,
+        start_lat DOUBLE PRECISION,
+        start_lon DOUBLE PRECISION,
+        end_lat DOUBLE PRECISION,
+        end_lon DOUBLE PRECISION,
+        distance_nm DOUBLE PRECISION NOT NULL,
+        duration_hours DOUBLE PRECISION NOT NULL,
+        points INTEGER NOT NULL,
+        avg_sog DOUBLE PRECISION,
+        destination VARCHAR(255),
+        PRIMARY KEY (mmsi, segment_no)
+    );
+    CREATE INDEX IF NOT EXISTS voyages_start_time ON voyages (start_time);
+"""
+
+SOURCE_SQL = """
+    SELECT mmsi, rec_ts, latitude, longitude, sog, destination
+    FROM ais_data
+    WHERE mmsi IS NOT NULL AND {where}
+    ORDER BY mmsi, rec_ts
+"""
+
+COLUMNS = ("mmsi", "segment_no", "kind", "start_time", "end_time", "start_lat", "start_lon",
+           "end_lat", "end_lon", "distance_nm", "duration_hours", "points", "avg_sog", "destination")
+
+
+def normalise_destination(value):
+    if value is None or value != value:
+        return None
+    value = str(value).strip().upper()
+    return None if value in PLACEHOLDER_DESTINATIONS else value
+
+
+def leg_distances(lat, lon):
+    """Great-circle distance (nm) from each point to the next, len(lat) - 1 values."""
+    import numpy as np
+    lat, lon = np.radians(lat), np.radians(lon)
+    a = (np.sin(np.diff(lat) / 2) ** 2
+         + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2)
+    return 2 * EARTH_RADIUS_NM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def stationary_runs(times, sog):
+    """
+    One vessel's reports (ordered datetime64 times, sog) as runs of
+    stationary or moving reports, cut at reporting gaps. Returns (hours since
+    the first report, gap after each report, run start and end indices,
+    whether each run is a stay).
+    """
+    import numpy as np
+    hours = (times - times[0]) / np.timedelta64(1, "h")
+    gap = np.diff(hours) > VOYAGE_MAX_GAP_HOURS
+    stationary = np.nan_to_num(sog, nan=np.inf) < VOYAGE_STOP_SOG
+    starts = np.flatnonzero(np.r_[True, (stationary[1:] != stationary[:-1]) | gap])
+    ends = np.r_[starts[1:], len(times)] - 1
+    is_stay = stationary[starts] & (hours[ends] - hours[starts] >= VOYAGE_MIN_STAY_HOURS)
+    return hours, gap, starts, ends, is_stay
+
+
+def segment_vessel(mmsi, times, lat, lon, sog, destinations):
+    """
+    Segment rows (tuples in COLUMNS order) of one vessel's positions, given as
+    arrays ordered by time (datetime64 times, float lat/lon/sog, object
+    destinations).
+    """
+    import numpy as np
+    n = len(times)
+    hours, gap, starts, ends, run_is_stay = stationary_runs(times, sog)
+    is_stay = np.repeat(run_is_stay, ends - starts + 1)
+
+    # Destination changes split voyages (not stays: vessels update the
+    # destination in port before leaving).
+    dest = np.array([normalise_destination(d) for d in destinations], dtype=object)
+    known = np.array([d is not None for d in dest], dtype=bool)
+    last_known = np.maximum.accumulate(np.where(known, np.arange(n), -1))
+    previous = np.r_[-1, last_known[:-1]]  # last named destination before each point
+    changed = known & (previous >= 0) & (dest != dest[np.maximum(previous, 0)])
+
+    boundary = np.r_[True, (is_stay[1:] != is_stay[:-1]) | gap] | (changed & ~is_stay)
+    segment = np.cumsum(boundary) - 1
+
+    # Leg i -> i+1 inside a segment belongs to it; a leg between segments
+    # belongs to the voyage it leads into, else to the one it leaves.
+    legs = leg_distances(lat, lon)
+    leg_segment = np.where((segment[1:] == segment[:-1]) | ~is_stay[1:] | is_stay[:-1],
+                           segment[1:], segment[:-1])
+    valid = ~gap & np.isfinite(legs)
+    distance = np.bincount(leg_segment[valid], weights=legs[valid], minlength=segment[-1] + 1)
+
+    seg_starts = np.flatnonzero(boundary)
+    seg_ends = np.r_[seg_starts[1:], n] - 1
+    rows = []
+    for no, (first, last) in enumerate(zip(seg_starts, seg_ends)):
+        stay = bool(is_stay[first])
+        named = [d for d in dest[first:last + 1] if d is not None]
+        speeds = sog[first:last + 1]
+        speeds = speeds[np.isfinite(speeds)]
+        rows.append((
+            int(mmsi), no, STAY if stay else VOYAGE,
+            times[first].astype("datetime64[us]").item(), times[last].astype("datetime64[us]").item(),
+            float(lat[first]), float(lon[first]), float(lat[last]), float(lon[last]),
+            round(float(distance[no]), 3), round(float(hours[last] - hours[first]), 4),
+            int(last - first + 1),
+            round(float(speeds.mean()), 3) if len(speeds) else None,
+            # Port reached for a stay, last announced destination for a voyage
+            (named[0] if stay else named[-1]) if named else None,
+        ))
+    return rows
+
+
+def segment_batch(vessels):
+    """segment_vessel() over [(mmsi, times, lat, lon, sog, destinations)]."""
+    rows = []
+    for vessel in vessels:
+        rows.extend(segment_vessel(*vessel))
+    return rows
+
+
+def vessel_batches(conn, where="rec_ts IS NOT NULL", params=None):
+    """
+    Streams the ais_data rows matching ``where`` once and yields lists of
+    complete vessels, see _split_vessels().
+    """
+    import pandas as pd
+
+    carry = None
+    source = conn.execution_options(stream_results=True)
+    for chunk in pd.read_sql(text(SOURCE_SQL.format(where=where)), source, params=params or {},
+                             chunksize=VOYAGE_CHUNK_ROWS):
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        # The last vessel may continue in the next chunk.
+        last = chunk["mmsi"].iloc[-1]
+        carry = chunk[chunk["mmsi"] == last]
+        complete = chunk[chunk["mmsi"] != last]
+        if not complete.empty:
+            yield _split_vessels(complete)
+    if carry is not None and not carry.empty:
+        yield _split_vessels(carry)
+
+
+def _split_vessels(frame):
+    """[(mmsi, times, lat, lon, sog, destinations)] per vessel of a frame in (mmsi, rec_ts) order."""
+    import numpy as np
+    mmsi = frame["mmsi"].to_numpy(dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, mmsi[1:] != mmsi[:-1]])
+    ends = np.r_[starts[1:], len(mmsi)]
+    times = frame["rec_ts"].to_numpy(dtype="datetime64[ns]")
+    lat = frame["latitude"].to_numpy(dtype=np.float64)
+    lon = frame["longitude"].to_numpy(dtype=np.float64)
+    sog = frame["sog"].to_numpy(dtype=np.float64)
+    destinations = frame["destination"].to_numpy(dtype=object)
+    return [(mmsi[a], times[a:b], lat[a:b], lon[a:b], sog[a:b], destinations[a:b])
+            for a, b in zip(starts, ends)]
+
+
+def ensure_voyages_table(conn):
+    conn.execute(text(CREATE_TABLE_SQL))
+
+
+def build_voyages(engine, workers=None):
+    """Rebuild the voyages table. Readers keep the old segments until the
+    new ones are committed."""
+    workers = VOYAGE_WORKERS if workers is None else workers
+    start = time.perf_counter()
+    rows = []
+    with engine.connect() as conn:
+        ensure_voyages_table(conn)
+        conn.commit()
+        if workers <= 1:
+            for vessels in vessel_batches(conn):
+                rows.extend(segment_batch(vessels))
+        else:
+            import multiprocessing
+            from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+            # spawn: the web process has threads, which fork does not copy safely
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                # At most 2 batches per worker in flight, so the parent does not
+                # hold (and pickle) the whole table while the workers catch up
+                pending = set()
+                for vessels in vessel_batches(conn):
+                    if len(pending) >= 2 * workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            rows.extend(future.result())
+                    pending.add(pool.submit(segment_batch, vessels))
+                for future in pending:
+                    rows.extend(future.result())
+
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM voyages"))
+        if rows:
+            conn.execute(text(f"""
+                INSERT INTO voyages ({', '.join(COLUMNS)})
+                VALUES ({', '.join(':' + c for c in COLUMNS)})
+            """), [dict(zip(COLUMNS, row)) for row in rows])
+        conn.execute(text("ANALYZE voyages"))
+    voyages = sum(1 for row in rows if row[2] == VOYAGE)
+    print(f"Voyages: {voyages} voyages and {len(rows) - voyages} stays "
+          f"in {time.perf_counter() - start:.2f}s ({workers} workers)")
+    return len(rows)